@@ -0,0 +1,340 @@
+"""
+Headless in-cab monitoring agent.
+
+    python agent.py --driver alice --start-point Depot --destination Port
+    python agent.py --driver alice --trip-id <id> --fps 10 --phone-every 5 --backend mongo
+
+Runs the camera, FaceMesh/EAR/yawn/phone pipeline and the audible alarms
+without Streamlit, so monitoring keeps going when no browser is open. Instead
+of one ride document per frame, detections are collapsed into episodes that
+are spooled to disk and uploaded in batches; a failed upload is retried on
+the next flush, including after a restart.
+
+The agent writes its live status to --status-file; point the web app at the
+same file with DMS_AGENT_STATUS to follow the agent from the driver dashboard.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+from pymongo.errors import BulkWriteError
+
+from batch_analyze import make_writer
+from detector.alerts import ALERT_TYPES, AlertTimers
+from detector.episodes import EpisodeTracker
+from detector.motion import MotionGate
+from detector.pipeline import MonitoringPipeline
+from detector.quality import QualityController, QualityLevel
+from detector.resolution import ResolutionPolicy
+from evidence import EvidenceRecorder, make_clip_store
+from risk import RiskStore
+from telemetry import TelemetryRecorder
+from metrics import registry as metrics_registry, start_exporters
+
+DEFAULT_STATUS_FILE = os.path.join(tempfile.gettempdir(), "dms_agent_status.json")
+STATUS_INTERVAL = 1.0
+DUPLICATE_KEY = 11000
+
+
+class Uploader:
+    """
+    Batches episode events to the backend from a background thread. Events are
+    appended to a JSONL spool as they arrive and the spool is rewritten after
+    each successful upload, so nothing is lost if the backend is unreachable.
+    """
+
+    def __init__(self, writer, spool_path, interval=10.0):
+        self.writer = writer
+        self.spool_path = spool_path
+        self.interval = interval
+        self.pending = []
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if os.path.exists(spool_path):
+            with open(spool_path) as f:
+                self.pending = [json.loads(line) for line in f if line.strip()]
+        self._thread = threading.Thread(target=self._run, name="uploader", daemon=True)
+        self._thread.start()
+
+    def add(self, events):
+        if not events:
+            return
+        with self._lock:
+            self.pending.extend(events)
+            with open(self.spool_path, "a") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+
+    def flush(self):
+        with self._lock:
+            batch = list(self.pending)
+        if not batch:
+            return True
+        failed = []
+        try:
+            # Copies: pymongo adds _id to the documents it inserts
+            self.writer.write([dict(e) for e in batch])
+        except BulkWriteError as e:
+            # An unordered insert_many stores every event it can; only retry the ones it couldn't,
+            # or the rest would be stored again under new ObjectIds
+            indices = {err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != DUPLICATE_KEY}
+            failed = [event for i, event in enumerate(batch) if i in indices]
+            print(f"Upload of {len(failed)} of {len(batch)} events failed, will retry: {e}")
+        except Exception as e:
+            print(f"Upload of {len(batch)} events failed, will retry: {e}")
+            return False
+        with self._lock:
+            self.pending[:len(batch)] = failed
+            self.sent += len(batch) - len(failed)
+            self._write_spool()
+        return not failed
+
+    def _write_spool(self):
+        # Replace the spool atomically, so a crash mid-write can't lose queued events
+        tmp = f"{self.spool_path}.tmp"
+        with open(tmp, "w") as f:
+            for event in self.pending:
+                f.write(json.dumps(event) + "\n")
+        os.replace(tmp, self.spool_path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self.writer.close()
+
+
+class StatusWriter:
+    """Atomically replaces a small JSON status file for viewers to poll."""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_write = 0.0
+
+    def write(self, status, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_write < STATUS_INTERVAL:
+            return
+        self.last_write = now
+        status['updated'] = time.time()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp, self.path)
+
+
+def read_status(path=DEFAULT_STATUS_FILE):
+    """Latest agent status, or None if the agent has not written one."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def start_trip(driver, start_point, destination):
+    from db import log_trip
+    return log_trip({
+        'driver': driver,
+        'start_point': start_point,
+        'destination': destination,
+        'start_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+
+def end_trip(trip_id):
+    from db import end_trip
+    end_trip(trip_id)
+
+
+def _uses_mongo():
+    from db import uses_mongo
+    return uses_mongo()
+
+
+def run(args):
+    if args.no_audio:
+        os.environ["DMS_AUDIO"] = "0"
+    from alarm import get_alarm_engine
+    import mediapipe as mp
+
+    created_trip = args.trip_id is None
+    trip_id = args.trip_id or start_trip(args.driver, args.start_point, args.destination)
+    print(f"Monitoring {args.driver} on trip {trip_id}")
+
+    stopping = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopping.set())
+
+    start_exporters()
+    metrics = metrics_registry.session("agent", driver=args.driver)
+    engine = get_alarm_engine()
+    alerts = AlertTimers()
+    episodes = EpisodeTracker(args.driver, trip_id, gap_seconds=args.episode_gap)
+    uploader = Uploader(make_writer(args.backend), args.spool, args.flush_interval)
+    status = StatusWriter(args.status_file)
+    # Telemetry buckets and risk scores go straight to MongoDB; the file backends and the
+    # SQLite/memory storage backends are for events only
+    with_mongo = args.backend == "mongo" and _uses_mongo()
+    telemetry = (TelemetryRecorder(args.driver, trip_id, rate=args.telemetry_hz)
+                 if args.telemetry_hz and with_mongo else None)
+    risk = RiskStore() if with_mongo else None
+    alarms = dict.fromkeys(ALERT_TYPES, 0)
+    evidence = EvidenceRecorder(make_clip_store(args.evidence), pre_seconds=args.evidence_seconds,
+                                metrics=metrics) if args.evidence else None
+
+    phone_detector = None
+    if not args.no_phone:
+        from detector.phone_detector import detect_phone_scored
+        phone_detector = detect_phone_scored
+
+    cap = cv2.VideoCapture(args.camera)
+    if args.width:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, args.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, args.width * 3 // 4)
+    frame_interval = 1.0 / args.fps if args.fps else 0.0
+    failures = 0
+
+    with mp.solutions.face_mesh.FaceMesh(refine_landmarks=True) as face_mesh:
+        pipeline = MonitoringPipeline(face_mesh, phone_detector, detect_phones=not args.no_phone, reuse_landmarks=True,
+                                      resolution=ResolutionPolicy(args.face_width, args.phone_width),
+                                      motion_gate=MotionGate(args.motion_threshold, max_age=args.max_reuse_age)
+                                      if args.motion_threshold else None)
+        pipeline.phone_every = args.phone_every
+        configured = QualityLevel('configured', phone_every=args.phone_every, face_width=args.face_width,
+                                  phone_width=args.phone_width)
+        quality = QualityController(args.fps, metrics=metrics) if args.adaptive and args.fps else None
+        if quality:
+            quality.apply(pipeline, configured)
+        frame = None
+        while not stopping.is_set():
+            started = time.monotonic()
+            timer = metrics.start_frame()
+            ret, frame = cap.read(frame)
+            if not ret:
+                metrics.increment('dropped_frames')
+                failures += 1
+                if failures > 50:
+                    print("Camera stopped delivering frames")
+                    break
+                time.sleep(0.1)
+                continue
+            failures = 0
+            timer.lap('capture')
+            # Never reuse results while an eye-closure or yawn episode is open
+            result = pipeline.process(frame, timer=timer, force='drowsiness' in episodes.open or 'yawning' in episodes.open)
+            if result.reused:
+                metrics.increment('reused_frames')
+
+            now = time.time()
+            if evidence:
+                evidence.add(frame, now)
+            if telemetry:
+                telemetry.add(result, metrics.fps, now)
+            detected = {'drowsiness': result.drowsy, 'yawning': result.yawning, 'phone': result.phone}
+            fired = []
+            for alert_type in ALERT_TYPES:
+                if alerts.update(alert_type, detected[alert_type], now):
+                    engine.trigger(alert_type)
+                    alarms[alert_type] += 1
+                    fired.append(alert_type)
+            closed = episodes.update(result, now)
+            uploader.add(closed)
+            if risk:
+                risk.record_async(closed)
+            for alert_type in fired:
+                ref = evidence and evidence.trigger(alert_type, args.driver, trip_id, now)
+                if ref:
+                    episodes.annotate(alert_type, evidence=ref)
+            timer.lap('alerts')
+
+            status.write({
+                'running': True,
+                'driver': args.driver,
+                'trip_id': trip_id,
+                'fps': round(metrics.fps, 1),
+                'quality': quality.level.name if quality else None,
+                'has_face': result.has_face,
+                'ear': round(float(result.ear), 3) if result.ear is not None else None,
+                'drowsy': bool(result.drowsy),
+                'yawning': bool(result.yawning),
+                'phone': bool(result.phone),
+                'active_episodes': sorted(episodes.open),
+                'alarms': alarms,
+                'events_sent': uploader.sent,
+                'events_pending': len(uploader.pending),
+            })
+            frame_seconds = timer.done()
+            if quality and quality.update(frame_seconds):
+                quality.apply(pipeline, configured)
+
+            # Cap the frame rate: the remaining time is CPU the cab box gets back
+            idle = frame_interval - (time.monotonic() - started)
+            if idle > 0:
+                stopping.wait(idle)
+
+    cap.release()
+    closed = episodes.close()
+    uploader.add(closed)
+    if risk:
+        risk.record_async(closed)
+        risk.close()
+    uploader.close()
+    engine.close()
+    if evidence:
+        evidence.close()
+    if telemetry:
+        telemetry.close()
+    status.write({'running': False, 'driver': args.driver, 'trip_id': trip_id, 'alarms': alarms,
+                  'events_sent': uploader.sent, 'events_pending': len(uploader.pending)}, force=True)
+    if created_trip and not args.keep_trip_open:
+        end_trip(trip_id)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--driver", required=True, help="driver username")
+    parser.add_argument("--trip-id", help="existing trip to attach to (default: start a new trip)")
+    parser.add_argument("--start-point", default="")
+    parser.add_argument("--destination", default="")
+    parser.add_argument("--keep-trip-open", action="store_true", help="don't set end_time on the trip at exit")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--width", type=int, default=640, help="requested capture width (0 keeps the camera default)")
+    parser.add_argument("--fps", type=float, default=15.0, help="maximum frames per second to analyse (0 = unlimited)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="degrade phone rate and inference size when the loop cannot keep up with --fps")
+    parser.add_argument("--face-width", type=int, help="downscale frames to this width for face mesh")
+    parser.add_argument("--phone-width", type=int, help="downscale frames to this width for phone detection")
+    parser.add_argument("--phone-every", type=int, default=3, help="run phone detection on every Nth frame")
+    parser.add_argument("--no-phone", action="store_true", help="skip phone detection")
+    parser.add_argument("--motion-threshold", type=float, default=3.0,
+                        help="mean grey-level change below which the last result is reused (0 = always analyse)")
+    parser.add_argument("--max-reuse-age", type=float, default=0.5, help="longest a result may be reused, in seconds")
+    parser.add_argument("--no-audio", action="store_true", help="don't sound alarms")
+    parser.add_argument("--episode-gap", type=float, default=1.0, help="seconds without detection that end an episode")
+    parser.add_argument("--evidence", help="keep alert video clips in this directory, or 'gridfs'")
+    parser.add_argument("--evidence-seconds", type=float, default=5.0, help="seconds of video before an alert in its clip")
+    parser.add_argument("--telemetry-hz", type=float, default=2.0,
+                        help="EAR/mouth/phone/FPS samples per second stored for trip charts (0 = off)")
+    parser.add_argument("--backend", default="mongo", help="'mongo', or a .jsonl/.parquet path")
+    parser.add_argument("--flush-interval", type=float, default=10.0, help="seconds between uploads")
+    parser.add_argument("--spool", default="agent_spool.jsonl", help="local file holding events not yet uploaded")
+    parser.add_argument("--status-file", default=os.environ.get("DMS_AGENT_STATUS", DEFAULT_STATUS_FILE))
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
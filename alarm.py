@@ -0,0 +1,156 @@
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from tones import SAMPLE_RATE, alert_tone
+
+try:
+    import pygame
+except ImportError:  # headless installs without pygame
+    pygame = None
+
+# Default sound per alert type. A missing per-type file falls back to alert.wav,
+# and without either the tone for that alert type is synthesized at start-up.
+DEFAULT_ALERT_PATH = "alert.wav"
+DEFAULT_SOUNDS = {
+    'drowsiness': "alert_drowsiness.wav",
+    'yawning': "alert_yawning.wav",
+    'phone': "alert_phone.wav",
+}
+
+
+def init_mixer() -> bool:
+    """Initialise the pygame mixer, returning False when no audio device is usable."""
+    if pygame is None or os.environ.get("DMS_AUDIO", "1") == "0":
+        return False
+    try:
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(frequency=SAMPLE_RATE, size=-16, channels=1)
+        return True
+    except pygame.error:
+        return False
+
+
+class AlarmEngine:
+    """
+    Plays alert sounds from a single background thread fed by a command queue.
+    Sounds are decoded once; a trigger for an alert that is already sounding
+    only extends its deadline instead of restarting playback.
+    """
+
+    def __init__(self, sounds: Optional[Dict[str, str]] = None, duration: float = 3.0):
+        self.duration = duration
+        self.enabled = init_mixer()
+        self._sounds = {}
+        self._channels = {}
+        self._deadlines = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._commands = queue.Queue()
+        if self.enabled:
+            self._load_sounds(sounds or DEFAULT_SOUNDS)
+            self._worker = threading.Thread(target=self._run, name="alarm-engine", daemon=True)
+            self._worker.start()
+
+    def _load_sounds(self, sounds: Dict[str, str]) -> None:
+        decoded = {}
+        for alert_type, path in sounds.items():
+            if not os.path.exists(path):
+                path = DEFAULT_ALERT_PATH
+            if not os.path.exists(path):
+                self._sounds[alert_type] = self._synthesized(alert_type)
+                continue
+            if path not in decoded:
+                try:
+                    decoded[path] = pygame.mixer.Sound(path)
+                except pygame.error:
+                    self._sounds[alert_type] = self._synthesized(alert_type)
+                    continue
+            self._sounds[alert_type] = decoded[path]
+
+    def _synthesized(self, alert_type: str):
+        frequency, _, channels = pygame.mixer.get_init()
+        pcm = alert_tone(alert_type, sample_rate=frequency)
+        if channels > 1:
+            pcm = np.repeat(pcm[:, None], channels, axis=1)
+        return pygame.mixer.Sound(buffer=pcm.tobytes())
+
+    def trigger(self, alert_type: str) -> bool:
+        """Queue an alarm for alert_type. Returns False when collapsed or muted."""
+        if not self.enabled or alert_type not in self._sounds:
+            return False
+        with self._lock:
+            if alert_type in self._pending:
+                return False
+            self._pending.add(alert_type)
+        self._commands.put(("play", alert_type))
+        return True
+
+    def stop(self, alert_type: Optional[str] = None) -> None:
+        if self.enabled:
+            self._commands.put(("stop", alert_type))
+
+    def close(self) -> None:
+        if self.enabled:
+            self._commands.put(("close", None))
+            self._worker.join(timeout=1.0)
+
+    def _run(self) -> None:
+        while True:
+            timeout = None
+            if self._deadlines:
+                timeout = max(0.0, min(self._deadlines.values()) - time.monotonic())
+            try:
+                command, alert_type = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                command, alert_type = None, None
+
+            if command == "play":
+                with self._lock:
+                    self._pending.discard(alert_type)
+                self._play(alert_type)
+            elif command == "stop":
+                for name in [alert_type] if alert_type else list(self._deadlines):
+                    self._halt(name)
+            elif command == "close":
+                for name in list(self._deadlines):
+                    self._halt(name)
+                return
+
+            now = time.monotonic()
+            for name, deadline in list(self._deadlines.items()):
+                if deadline <= now:
+                    self._halt(name)
+
+    def _play(self, alert_type: str) -> None:
+        deadline = time.monotonic() + self.duration
+        channel = self._channels.get(alert_type)
+        if channel is None or not channel.get_busy():
+            channel = self._sounds[alert_type].play(loops=-1)
+            if channel is None:
+                return
+            self._channels[alert_type] = channel
+        self._deadlines[alert_type] = deadline
+
+    def _halt(self, alert_type: str) -> None:
+        self._deadlines.pop(alert_type, None)
+        channel = self._channels.pop(alert_type, None)
+        if channel is not None:
+            channel.stop()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_alarm_engine() -> AlarmEngine:
+    """Process-wide engine, shared across Streamlit reruns like the YOLO model."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AlarmEngine()
+        return _engine
@@ -1,165 +1,30 @@
 import streamlit as st
 import cv2
-import mediapipe as mp
-import numpy as np
-from detector.drowsiness import get_ear
-from detector.yawn import is_yawning
-from detector.phone_detector import detect_phone
+from detector.pipeline import build_events, draw_overlays
+from detector.alerts import AlertTimers
+from detector.episodes import EVENT_TYPES
+from detector.recording import LandmarkRecorder
 import pandas as pd
 from datetime import datetime
-import time
-import pygame
-import threading
 import os
+import time
+import uuid
 import streamlit_authenticator as stauth
 from db import (
     get_user, create_user, update_user, get_all_drivers, get_all_managers,
     get_unassigned_drivers, assign_driver_to_manager, get_drivers_for_manager,
-    log_ride, get_rides_for_driver, get_all_rides, log_trip, get_trips_for_driver
+    log_ride, get_rides_for_driver, log_trip, get_trips_for_driver, end_trip, uses_mongo
 )
-from bson import ObjectId
-from fpdf import FPDF
-
-# Initialize pygame mixer for sound
-pygame.mixer.init()
-
-# Alert sound path - using relative path
-alert_path = "alert.wav"
-
-# --- PDF GENERATION ---
-def generate_trip_pdf(trip, events):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Set up colors (RGB values)
-    pdf.set_fill_color(102, 126, 234)  # Primary blue
-    pdf.set_text_color(255, 255, 255)  # White text
-    
-    # Header with gradient-like effect
-    pdf.set_font("Arial", 'B', 20)
-    pdf.cell(0, 15, txt="Driver Monitoring Trip Report", ln=True, align='C', fill=True)
-    
-    # Reset colors for content
-    pdf.set_fill_color(245, 245, 245)  # Light gray background
-    pdf.set_text_color(51, 51, 51)     # Dark gray text
-    
-    # Trip information section with colored background
-    pdf.ln(10)
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_fill_color(240, 248, 255)  # Alice blue background
-    pdf.cell(0, 10, txt="Trip Information", ln=True, fill=True)
-    pdf.ln(5)
-    
-    # Trip details with alternating row colors
-    pdf.set_font("Arial", '', 11)
-    details = [
-        ("Driver", trip['driver']),
-        ("Start Point", trip['start_point']),
-        ("Destination", trip['destination']),
-        ("Start Time", trip['start_time'])
-    ]
-    
-    if 'end_time' in trip:
-        details.append(("End Time", trip['end_time']))
-    
-    for i, (label, value) in enumerate(details):
-        # Alternate row colors
-        if i % 2 == 0:
-            pdf.set_fill_color(248, 250, 252)  # Very light blue
-        else:
-            pdf.set_fill_color(255, 255, 255)  # White
-        
-        pdf.cell(50, 8, txt=f"{label}:", ln=0, fill=True)
-        pdf.cell(0, 8, txt=value, ln=True, fill=True)
-    
-    # Events section
-    pdf.ln(10)
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_fill_color(255, 193, 7)  # Warning yellow background
-    pdf.set_text_color(51, 51, 51)   # Dark text
-    pdf.cell(0, 10, txt="Monitoring Events", ln=True, fill=True)
-    pdf.ln(5)
-    
-    if not events:
-        pdf.set_font("Arial", '', 11)
-        pdf.set_fill_color(240, 248, 255)  # Light blue background
-        pdf.cell(0, 8, txt="No events recorded - Safe driving!", ln=True, fill=True)
-    else:
-        # Event type color mapping
-        event_colors = {
-            'Drowsiness': (255, 99, 71),    # Tomato red
-            'Yawning': (255, 165, 0),       # Orange
-            'Phone Usage': (220, 20, 60),   # Crimson
-            'Lane Change': (138, 43, 226),  # Blue violet
-            'Speed': (255, 215, 0)          # Gold
-        }
-        
-        pdf.set_font("Arial", '', 10)
-        
-        for i, event in enumerate(events):
-            event_type = event.get('event_type', 'Unknown')
-            
-            # Get color for event type
-            if event_type in event_colors:
-                r, g, b = event_colors[event_type]
-                pdf.set_fill_color(r, g, b)
-                pdf.set_text_color(255, 255, 255)  # White text for colored backgrounds
-            else:
-                pdf.set_fill_color(200, 200, 200)  # Gray for unknown events
-                pdf.set_text_color(51, 51, 51)     # Dark text
-            
-            # Event header
-            timestamp = event.get('timestamp', '')
-            pdf.cell(0, 8, txt=f"* {event_type} - {timestamp}", ln=True, fill=True)
-            
-            # Event details
-            pdf.set_fill_color(255, 255, 255)  # White background for details
-            pdf.set_text_color(51, 51, 51)     # Dark text
-            
-            details_text = ""
-            if 'details' in event:
-                details_text += f"Details: {event['details']}"
-            if 'ear_value' in event:
-                if details_text:
-                    details_text += " | "
-                details_text += f"EAR: {event['ear_value']}"
-            
-            if details_text:
-                pdf.cell(0, 6, txt=details_text, ln=True, fill=True)
-            
-            pdf.ln(2)  # Small spacing between events
-    
-    # Summary section
-    pdf.ln(10)
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_fill_color(76, 175, 80)  # Green background
-    pdf.set_text_color(255, 255, 255)  # White text
-    pdf.cell(0, 10, txt="Trip Summary", ln=True, fill=True)
-    pdf.ln(5)
-    
-    pdf.set_font("Arial", '', 11)
-    pdf.set_fill_color(240, 248, 255)  # Light blue background
-    pdf.set_text_color(51, 51, 51)     # Dark text
-    
-    total_events = len(events)
-    event_counts = {}
-    for event in events:
-        event_type = event.get('event_type', 'Unknown')
-        event_counts[event_type] = event_counts.get(event_type, 0) + 1
-    
-    pdf.cell(0, 8, txt=f"Total Events: {total_events}", ln=True, fill=True)
-    
-    for event_type, count in event_counts.items():
-        pdf.cell(0, 8, txt=f"- {event_type}: {count} occurrence(s)", ln=True, fill=True)
-    
-    # Footer
-    pdf.ln(10)
-    pdf.set_font("Arial", '', 8)
-    pdf.set_text_color(128, 128, 128)  # Gray text
-    pdf.cell(0, 5, txt=f"Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align='C')
-    pdf.cell(0, 5, txt="Real-Time Driver Monitoring System", ln=True, align='C')
-    
-    return pdf.output(dest='S').encode('latin1')
+from report import generate_trip_pdf
+from preview import AlertCards, PreviewRenderer
+from monitor_session import MonitorSession
+from timeline import trip_timeline
+from risk import RiskStore
+from fleet_board import FleetBoard
+from event_log import DISPLAY_ROWS, EventLog, format_event_type
+from agent import read_status as read_agent_status
+from alarm import get_alarm_engine
+from metrics import registry as metrics_registry, start_exporters
 
 # --- NAVIGATION STACK ---
 if 'nav_stack' not in st.session_state:
@@ -917,6 +782,9 @@ if st.session_state.current_page == 'dashboard':
         col1, col2, col3 = st.columns([1, 4, 1])
         with col1:
             if st.button('⬅️ Back to Login', key='driver_main_back_btn'):
+                monitor = st.session_state.pop('monitor_session', None)
+                if monitor:
+                    monitor.close()
                 st.session_state.logged_in = False
                 st.session_state.role = None
                 st.session_state.username = None
@@ -969,16 +837,19 @@ if st.session_state.current_page == 'dashboard':
                             trip_id = log_trip(trip)
                             st.session_state.trip_started = True
                             st.session_state.current_trip_id = trip_id
+                            st.session_state.current_trip = trip
                             st.success(f"✅ Trip started from {start_point} to {destination}!")
                             st.rerun()
             else:
-                # Fetch current trip details
-                trips = get_trips_for_driver(st.session_state.username)
-                current_trip = None
-                for t in trips:
-                    if str(t['_id']) == st.session_state.current_trip_id:
-                        current_trip = t
-                        break
+                # Fetch current trip details (kept from Start Monitoring, so reruns don't query trips)
+                current_trip = st.session_state.get('current_trip')
+                if current_trip is None or str(current_trip.get('_id')) != st.session_state.current_trip_id:
+                    current_trip = None
+                    trips = get_trips_for_driver(st.session_state.username)
+                    for t in trips:
+                        if str(t['_id']) == st.session_state.current_trip_id:
+                            current_trip = st.session_state.current_trip = t
+                            break
                 
                 st.markdown(f"""
                 <div class="trip-card">
@@ -992,216 +863,185 @@ if st.session_state.current_page == 'dashboard':
                 """, unsafe_allow_html=True)
                 
                 # --- ALERT FUNCTIONS (KEEPING ALL FUNCTIONALITY INTACT) ---
-                def play_alarm_for_duration():
-                    if os.path.exists(alert_path):
-                        try:
-                            alarm_sound = pygame.mixer.Sound(alert_path)
-                            alarm_sound.play()
-                            def stop_alarm():
-                                time.sleep(3)
-                                alarm_sound.stop()
-                            threading.Thread(target=stop_alarm, daemon=True).start()
-                        except Exception as e:
-                            st.error(f"Error playing alert sound: {str(e)}")
-                
                 def check_alert_duration(alert_type, is_detected):
                     current_time = time.time()
-                    timer = st.session_state.alert_timers[alert_type]
-                    if is_detected:
-                        if timer['start_time'] is None:
-                            timer['start_time'] = current_time
-                            timer['alert_played'] = False
-                        elif not timer['alert_played'] or (current_time - timer['start_time']) >= 4:
-                            play_alarm_for_duration()
-                            timer['alert_played'] = True
-                            timer['start_time'] = current_time
-                            # EMAIL ALERT LOGIC
-                            if (current_time - timer['start_time']) >= 5 and not st.session_state.alert_email_sent[alert_type]:
-                                # Get manager email for this driver
-                                driver_user = get_user(st.session_state.username)
-                                manager_username = driver_user.get('fleet_manager')
-                                if manager_username:
-                                    manager_user = get_user(manager_username)
-                                    manager_email = manager_user.get('email')
-                                    if manager_email:
-                                        subject = f"ALERT: {alert_type.capitalize()} detected for driver {st.session_state.username}"
-                                        body = f"Continuous {alert_type} detected for driver {st.session_state.username} during trip. Please check the dashboard for details."
-                                        send_alert_email(
-                                            to_email=manager_email,
-                                            subject=subject,
-                                            body=body,
-                                            smtp_server=SMTP_SERVER,
-                                            smtp_port=SMTP_PORT,
-                                            smtp_user=SMTP_USER,
-                                            smtp_password=SMTP_PASSWORD
-                                        )
-                                        st.session_state.alert_email_sent[alert_type] = True
-                    else:
-                        timer['start_time'] = None
-                        timer['alert_played'] = False
+                    if st.session_state.alert_tracker.update(alert_type, is_detected, current_time):
+                        timer = st.session_state.alert_tracker.timers[alert_type]
+                        get_alarm_engine().trigger(alert_type)
+                        # EMAIL ALERT LOGIC
+                        if (current_time - timer['start_time']) >= 5 and not st.session_state.alert_email_sent[alert_type]:
+                            # Get manager email for this driver
+                            driver_user = get_user(st.session_state.username)
+                            manager_username = driver_user.get('fleet_manager')
+                            if manager_username:
+                                manager_user = get_user(manager_username)
+                                manager_email = manager_user.get('email')
+                                if manager_email:
+                                    subject = f"ALERT: {alert_type.capitalize()} detected for driver {st.session_state.username}"
+                                    body = f"Continuous {alert_type} detected for driver {st.session_state.username} during trip. Please check the dashboard for details."
+                                    send_alert_email(
+                                        to_email=manager_email,
+                                        subject=subject,
+                                        body=body,
+                                        smtp_server=SMTP_SERVER,
+                                        smtp_port=SMTP_PORT,
+                                        smtp_user=SMTP_USER,
+                                        smtp_password=SMTP_PASSWORD
+                                    )
+                                    st.session_state.alert_email_sent[alert_type] = True
+                        return True
+                    elif not is_detected:
                         st.session_state.alert_email_sent[alert_type] = False
+                    return False
                 
                 # Monitoring UI
-                if 'alert_timers' not in st.session_state:
-                    st.session_state.alert_timers = {
-                        'drowsiness': {'start_time': None, 'alert_played': False},
-                        'yawning': {'start_time': None, 'alert_played': False},
-                        'phone': {'start_time': None, 'alert_played': False}
-                    }
-                
-                # Enhanced Alert Display
-                st.markdown('<div class="section-header">📊 Real-Time Monitoring</div>', unsafe_allow_html=True)
-                
-                col1, col2, col3 = st.columns(3)
-                drowsiness_alert = col1.empty()
-                yawn_alert = col2.empty()
-                phone_alert = col3.empty()
+                if 'alert_tracker' not in st.session_state:
+                    st.session_state.alert_tracker = AlertTimers()
+                if 'metrics_session_id' not in st.session_state:
+                    st.session_state.metrics_session_id = uuid.uuid4().hex[:12]
                 
-                
-                
-                run = st.checkbox('🎥 Start Camera', key='camera_checkbox')
-                
-                # KEEPING ALL CAMERA FUNCTIONALITY INTACT
-                mp_face_mesh = mp.solutions.face_mesh
-                LEFT_EYE = [362, 385, 387, 263, 373, 380]
-                RIGHT_EYE = [33, 160, 158, 133, 153, 144]
-                
-                if run:
-                    cap = cv2.VideoCapture(0)
-                    stframe = st.empty()
-                    with mp_face_mesh.FaceMesh(refine_landmarks=True) as face_mesh:
-                        while cap.isOpened():
-                            ret, frame = cap.read()
-                            if not ret:
-                                break
-                            frame = cv2.flip(frame, 1)
-                            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                            results = face_mesh.process(rgb)
-                            drowsiness_detected = False
-                            yawning_detected = False
-                            phone_detected = False
-                            if results.multi_face_landmarks:
-                                for face_landmarks in results.multi_face_landmarks:
-                                    h, w, _ = frame.shape
-                                    landmarks = np.array([(lm.x * w, lm.y * h) for lm in face_landmarks.landmark])
-                                    left_eye = landmarks[LEFT_EYE]
-                                    right_eye = landmarks[RIGHT_EYE]
-                                    ear = (get_ear(left_eye) + get_ear(right_eye)) / 2.0
-                                    if ear < 0.20:
-                                        drowsiness_detected = True
-                                        cv2.putText(frame, "DROWSINESS ALERT", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
-                                        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                        log_ride({
-                                            'timestamp': current_time,
-                                            'event_type': 'Drowsiness',
-                                            'ear_value': round(ear, 3),
-                                            'driver': st.session_state.username,
-                                            'trip_id': st.session_state.current_trip_id
-                                        })
-                                    # Yawn detection with debug
-                                    if st.session_state.get('debug_yawn', False):
-                                        is_yawn, mouth_ratio, mouth_distance, face_width = is_yawning(landmarks, debug=True)
-                                        st.sidebar.write(f"Yawn debug: ratio={mouth_ratio:.3f}, dist={mouth_distance:.1f}, width={face_width:.1f}")
-                                        if is_yawn:
-                                            yawning_detected = True
-                                            cv2.putText(frame, "YAWNING", (20, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 0, 0), 3)
-                                            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                            log_ride({
-                                                'timestamp': current_time,
-                                                'event_type': 'Yawning',
-                                                'details': f'Mouth ratio: {mouth_ratio:.3f}, dist: {mouth_distance:.1f}, width: {face_width:.1f}',
-                                                'driver': st.session_state.username,
-                                                'trip_id': st.session_state.current_trip_id
-                                            })
-                                    else:
-                                        if is_yawning(landmarks):
-                                            yawning_detected = True
-                                            cv2.putText(frame, "YAWNING", (20, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 0, 0), 3)
-                                            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                            log_ride({
-                                                'timestamp': current_time,
-                                                'event_type': 'Yawning',
-                                                'details': 'Mouth distance exceeded threshold',
-                                                'driver': st.session_state.username,
-                                                'trip_id': st.session_state.current_trip_id
-                                            })
-                            if detect_phone(frame):
-                                phone_detected = True
-                                cv2.putText(frame, "MOBILE PHONE DETECTED", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 255), 3)
-                                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                log_ride({
-                                    'timestamp': current_time,
-                                    'event_type': 'Phone Usage',
-                                    'details': 'Mobile phone detected in frame',
-                                    'driver': st.session_state.username,
-                                    'trip_id': st.session_state.current_trip_id
-                                })
-                            check_alert_duration('drowsiness', drowsiness_detected)
-                            check_alert_duration('yawning', yawning_detected)
-                            check_alert_duration('phone', phone_detected)
-                            
-                            # Enhanced Alert Display
-                            if drowsiness_detected:
-                                drowsiness_alert.markdown("""
-                                <div class="alert-card">
-                                    <h3 style="margin: 0;">😴 Drowsiness Detected</h3>
-                                    <p style="margin: 0.5rem 0; opacity: 0.9;">Please stay alert!</p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            else:
-                                drowsiness_alert.markdown("""
-                                <div class="safe-card">
-                                    <h3 style="margin: 0;">✅ Alert</h3>
-                                    <p style="margin: 0.5rem 0; opacity: 0.9;">Stay focused!</p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            
-                            if yawning_detected:
-                                yawn_alert.markdown("""
-                                <div class="alert-card">
-                                    <h3 style="margin: 0;">🥱 Yawning Detected</h3>
-                                    <p style="margin: 0.5rem 0; opacity: 0.9;">Take a break if needed!</p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            else:
-                                yawn_alert.markdown("""
-                                <div class="safe-card">
-                                    <h3 style="margin: 0;">✅ Alert</h3>
-                                    <p style="margin: 0.5rem 0; opacity: 0.9;">Stay focused!</p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            
-                            if phone_detected:
-                                phone_alert.markdown("""
-                                <div class="alert-card">
-                                    <h3 style="margin: 0;">📱 Phone Detected</h3>
-                                    <p style="margin: 0.5rem 0; opacity: 0.9;">Focus on driving!</p>
-                                </div>
-                                """, unsafe_allow_html=True)
+                # The live panel is a fragment: the camera checkbox and the agent view rerun only this
+                # function, and the camera and models persist in st.session_state.monitor_session
+                @st.fragment
+                def monitoring_panel():
+                    # Enhanced Alert Display
+                    st.markdown('<div class="section-header">📊 Real-Time Monitoring</div>', unsafe_allow_html=True)
+                    
+                    col1, col2, col3 = st.columns(3)
+                    drowsiness_alert = col1.empty()
+                    yawn_alert = col2.empty()
+                    phone_alert = col3.empty()
+                    
+                    # Cards are re-sent to the browser only when their state changes
+                    alert_cards = AlertCards({'drowsiness': drowsiness_alert, 'yawning': yawn_alert, 'phone': phone_alert})
+                    
+                    run = st.checkbox('🎥 Start Camera', key='camera_checkbox')
+                    monitor = st.session_state.get('monitor_session')
+                    if not run and monitor:
+                        monitor.release_camera()  # models stay loaded for the next start
+                    
+                    # Follow a headless agent (agent.py) running in the cab instead of the local camera
+                    agent_status_path = os.environ.get("DMS_AGENT_STATUS")
+                    if agent_status_path and not run and st.checkbox('📡 Follow Edge Agent', key='agent_checkbox'):
+                        agent_panel = st.empty()
+                        while True:
+                            status = read_agent_status(agent_status_path)
+                            if status is None:
+                                agent_panel.info("Waiting for the edge agent to report...")
+                            elif not status.get('running'):
+                                agent_panel.warning(f"Edge agent stopped. Alarms: {status.get('alarms')}")
                             else:
-                                phone_alert.markdown("""
-                                <div class="safe-card">
-                                    <h3 style="margin: 0;">✅ Alert</h3>
-                                    <p style="margin: 0.5rem 0; opacity: 0.9;">Stay focused!</p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                            
-                            stframe.image(frame, channels="BGR")
-                    cap.release()
+                                alert_cards.update(drowsiness=status['drowsy'], yawning=status['yawning'], phone=status['phone'])
+                                age = time.time() - status['updated']
+                                agent_panel.markdown(
+                                    f"**Edge agent** · {status['fps']} fps · updated {age:.0f}s ago · "
+                                    f"alarms {status['alarms']} · events sent {status['events_sent']}, pending {status['events_pending']}"
+                                )
+                            time.sleep(1)
+                    
+                    # KEEPING ALL CAMERA FUNCTIONALITY INTACT
+                    if run:
+                        stframe = st.empty()
+                        # Fragments can't write to the sidebar, so the yawn debug line lives in the panel
+                        debug_panel = st.empty()
+                        start_exporters()
+                        if monitor is None:
+                            session_metrics = metrics_registry.session(st.session_state.metrics_session_id, driver=st.session_state.username)
+                            monitor = st.session_state.monitor_session = MonitorSession(st.session_state.metrics_session_id, session_metrics)
+                        session_metrics = monitor.metrics
+                        cap = monitor.open_camera()
+                        recorder = None
+                        if os.environ.get("DMS_RECORD_DIR"):
+                            os.makedirs(os.environ["DMS_RECORD_DIR"], exist_ok=True)
+                            record_path = os.path.join(os.environ["DMS_RECORD_DIR"], f"{st.session_state.username}_{st.session_state.current_trip_id}_{int(time.time())}.lmk")
+                            recorder = LandmarkRecorder(record_path, frame_size=(cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                        quality = monitor.quality
+                        telemetry = monitor.telemetry(st.session_state.username, st.session_state.current_trip_id)
+                        risk = monitor.risk(st.session_state.username, st.session_state.current_trip_id)
+                        # DMS_PREVIEW_FPS / DMS_PREVIEW_WIDTH / DMS_PREVIEW_QUALITY: the preview is capped and JPEG-encoded on its own
+                        preview = PreviewRenderer.from_env(stframe, metrics=session_metrics)
+                        frame = None
+                        try:
+                            while cap.isOpened():
+                                frame_timer = session_metrics.start_frame()
+                                ret, frame = cap.read(frame)  # decodes into last frame's buffer
+                                if not ret:
+                                    session_metrics.increment('dropped_frames')
+                                    break
+                                frame_timer.lap('capture')
+                                # Frames the preview will not send are neither flipped nor drawn on
+                                show_preview = preview.due() and (quality is None or quality.display_due())
+                                # Detectors see the unmirrored frame; only the displayed copy is flipped
+                                rgb, display = monitor.preprocess(frame, display=show_preview)
+                                frame_timer.lap('preprocess')
+                                tracker = st.session_state.alert_tracker
+                                result = monitor.analyse(frame, rgb, frame_timer,
+                                                         force=tracker.active('drowsiness') or tracker.active('yawning'))
+                                if result is None:
+                                    continue  # superseded by a newer frame from this session
+                                if recorder:
+                                    recorder.write(time.time(), result)
+                                if telemetry:
+                                    telemetry.add(result, session_metrics.fps)
+                                if risk:
+                                    risk.update(result)
+                                debug_yawn = st.session_state.get('debug_yawn', False)
+                                show_overlays = quality is None or quality.level.overlays
+                                if debug_yawn and result.has_face and show_overlays:
+                                    debug_panel.write(f"Yawn debug: ratio={result.mouth_ratio:.3f}, dist={result.mouth_distance:.1f}, width={result.face_width:.1f}")
+                                if show_overlays and show_preview:
+                                    draw_overlays(display, result, mirror=True)
+                                drowsiness_detected = result.drowsy
+                                yawning_detected = result.yawning
+                                phone_detected = result.phone
+                                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                                events = build_events(result, st.session_state.username, st.session_state.current_trip_id, current_time, detailed_yawn=debug_yawn)
+                                session_metrics.set_gauge('pending_events', len(events))
+                                fired = {
+                                    'drowsiness': check_alert_duration('drowsiness', drowsiness_detected),
+                                    'yawning': check_alert_duration('yawning', yawning_detected),
+                                    'phone': check_alert_duration('phone', phone_detected),
+                                }
+                                
+                                alert_cards.update(drowsiness=drowsiness_detected, yawning=yawning_detected, phone=phone_detected)
+                                
+                                # DMS_EVIDENCE: the alert's ride document points at a clip of the seconds around it
+                                if monitor.evidence:
+                                    monitor.evidence.add(frame)
+                                    for alert_type, alert_fired in fired.items():
+                                        ref = alert_fired and monitor.evidence.trigger(alert_type, st.session_state.username, st.session_state.current_trip_id)
+                                        for event in events:
+                                            if ref and event['event_type'] == EVENT_TYPES[alert_type]:
+                                                event['evidence'] = ref
+                                frame_timer.lap('alerts')
+                                for event in events:
+                                    log_ride(event)
+                                frame_timer.lap('log_ride')
+                                
+                                if show_preview:
+                                    preview.show(display)
+                                frame_timer.lap('display')
+                                monitor.frame_done(frame_timer.done())
+                        finally:
+                            # Also runs when a rerun interrupts the loop; the camera itself stays with the session
+                            if recorder:
+                                recorder.close()
                 
-                # End Trip Button
+                # End Trip Button (above the panel, which blocks while the camera runs)
                 col1, col2, col3 = st.columns([1, 2, 1])
                 with col2:
                     if st.button('🏁 End Trip', key='end_trip_btn', use_container_width=True):
                         # Mark trip as ended (KEEPING FUNCTIONALITY INTACT)
-                        from pymongo import MongoClient
-                        client = MongoClient("mongodb://localhost:27017/IDP")
-                        db = client["IDP"]
-                        db["trips"].update_one({'_id': ObjectId(st.session_state.current_trip_id)}, {"$set": {"end_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}})
+                        end_trip(st.session_state.current_trip_id)
+                        monitor = st.session_state.pop('monitor_session', None)
+                        if monitor:
+                            monitor.close()
                         st.session_state.trip_started = False
                         st.session_state.current_trip_id = None
                         st.success("✅ Trip ended successfully!")
                         st.rerun()
+                
+                monitoring_panel()
             
             if not st.session_state.get('trip_started', False) and st.session_state.get('current_trip_id'):
                 # Show trip summary and download PDF
@@ -1294,6 +1134,14 @@ if st.session_state.current_page == 'dashboard':
                             key=f"driver_download_pdf_{trip['_id']}",
                             use_container_width=True
                         )
+                    
+                    # Sampled EAR / mouth ratio curve for the whole trip, only loaded when asked for
+                    if st.checkbox("📈 Show trip timeline", key=f"driver_telemetry_{trip['_id']}"):
+                        chart = trip_timeline(str(trip['_id']), trip_events)
+                        if chart is not None:
+                            st.altair_chart(chart, use_container_width=True)
+                        else:
+                            st.info("No telemetry was recorded for this trip.")
     elif st.session_state.role == 'manager':
         # Enhanced Fleet Manager Dashboard with beautiful styling
         st.markdown("""
@@ -1513,21 +1361,54 @@ if st.session_state.current_page == 'dashboard':
             </div>
             """, unsafe_allow_html=True)
         
+        # Session-cached event table: each rerun only reads rides newer than its watermark
+        event_log = st.session_state.get('event_log')
+        if event_log is None:
+            event_log = st.session_state.event_log = EventLog()
+        event_log.refresh()
+        
         with col4:
-            all_rides = get_all_rides()
             st.markdown(f"""
             <div class="stats-card" style="background: linear-gradient(135deg, #f59e0b 0%, #d97706 100%);">
                 <h3 style="color: white; margin: 0; font-size: 1.2rem;">Total Events</h3>
-                <p style="font-size: 2.5rem; font-weight: 700; color: white; margin: 0.5rem 0;">{len(all_rides)}</p>
+                <p style="font-size: 2.5rem; font-weight: 700; color: white; margin: 0.5rem 0;">{len(event_log)}</p>
             </div>
             """, unsafe_allow_html=True)
         
+        # Live Fleet Board: a fragment that polls on its own timer, reading only rides newer than its watermark
+        st.markdown('<div class="section-header">🟢 Live Fleet</div>', unsafe_allow_html=True)
+        
+        @st.fragment(run_every=float(os.environ.get("DMS_BOARD_REFRESH", 5)))
+        def live_fleet_board():
+            board = st.session_state.get('fleet_board')
+            if board is None or board.drivers != my_drivers:
+                board = st.session_state.fleet_board = FleetBoard(my_drivers)
+            board.refresh()
+            tiles = board.tiles()
+            if not tiles:
+                st.info("None of your drivers is on a trip right now.")
+                return
+            columns = st.columns(3)
+            for i, tile in enumerate(tiles):
+                counts = ' · '.join(f"{k}: {v}" for k, v in tile['counts'].items()) or 'No events yet'
+                last = f"{tile['last_event']} at {tile['last_time']}" if tile['last_event'] else '—'
+                columns[i % 3].markdown(f"""
+                <div class="driver-card">
+                    <h4 style="margin: 0 0 0.5rem 0;">🚗 {tile['driver']}</h4>
+                    <p style="margin: 0; opacity: 0.9;">{tile['route']} · since {tile['start_time']}</p>
+                    <p style="margin: 0.5rem 0 0 0; opacity: 0.9;">Last event: {last}</p>
+                    <p style="margin: 0; opacity: 0.9;">{counts}</p>
+                </div>
+                """, unsafe_allow_html=True)
+        
+        live_fleet_board()
+        
         # Driver Management Section
         st.markdown('<div class="section-header">👥 Driver Management</div>', unsafe_allow_html=True)
         
         section = st.radio(
             'Select an action:',
-            ['Show & Assign Unassigned Drivers', 'Show My Drivers'],
+            ['Show & Assign Unassigned Drivers', 'Show My Drivers', 'Riskiest Drivers'],
             key='manager_section',
             horizontal=True
         )
@@ -1591,47 +1472,37 @@ if st.session_state.current_page == 'dashboard':
                 </div>
                 """, unsafe_allow_html=True)
         
+        elif section == 'Riskiest Drivers':
+            st.markdown('<h4 style="color: #4f46e5; margin: 1rem 0;">Riskiest Drivers</h4>', unsafe_allow_html=True)
+            
+            # Precomputed decayed scores: one document per driver, however long their history
+            ranked = RiskStore().scores(my_drivers) if uses_mongo() else None
+            if ranked is None:
+                st.info("Risk scores are kept in MongoDB and aren't available with this storage backend.")
+            elif ranked:
+                st.dataframe(pd.DataFrame([{
+                    'Driver': r['driver'],
+                    'Risk Score': round(r['score'], 1),
+                    '😴 Drowsiness': r['counts'].get('Drowsiness', 0),
+                    '🥱 Yawning': r['counts'].get('Yawning', 0),
+                    '📱 Phone Usage': r['counts'].get('Phone Usage', 0),
+                } for r in ranked]), use_container_width=True, hide_index=True)
+                st.caption("Scores weigh episodes by type, length and time of day, and halve every week without new events.")
+            else:
+                st.info("No risk scores yet. They update as your drivers' episodes are recorded; run `python risk.py --backfill` to compute them from history.")
+        
         # Event Logs Section
         st.markdown('<div class="section-header">📈 Driver Event Logs</div>', unsafe_allow_html=True)
         
-        if all_rides:
-            # Enhanced dataframe display with better styling
-            df = pd.DataFrame(all_rides)
-            
-            # Clean and format the dataframe
-            if not df.empty:
-                # Format timestamp column if it exists
-                if 'timestamp' in df.columns:
-                    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # Add event type icons and color coding
-                def format_event_type(event_type):
-                    event_icons = {
-                        'Drowsiness': '😴',
-                        'Yawning': '🥱',
-                        'Phone Usage': '📱',
-                        'Lane Change': '🛣️',
-                        'Speed': '⚡'
-                    }
-                    return f"{event_icons.get(event_type, '⚠️')} {event_type}"
-                
-                if 'event_type' in df.columns:
-                    df['Event Type'] = df['event_type'].apply(format_event_type)
-                    df = df.drop('event_type', axis=1)
-                
-                # Reorder columns for better readability
-                column_order = ['timestamp', 'Event Type', 'driver', 'details', 'ear_value', 'trip_id']
-                existing_columns = [col for col in column_order if col in df.columns]
-                df = df[existing_columns + [col for col in df.columns if col not in existing_columns]]
-                
-                # Rename columns for better display
-                df = df.rename(columns={
-                    'timestamp': '📅 Timestamp',
-                    'driver': '👤 Driver',
-                    'details': '📝 Details',
-                    'ear_value': '👁️ EAR Value',
-                    'trip_id': '🚗 Trip ID'
-                })
+        if len(event_log):
+            filter_col1, filter_col2 = st.columns([1, 1])
+            with filter_col1:
+                driver_filter = st.multiselect("Drivers", event_log.labels('driver'), key='event_log_drivers',
+                                               on_change=lambda: st.session_state.pop('event_log_csv', None))
+            with filter_col2:
+                type_filter = st.multiselect("Event types", event_log.labels('event_type'), format_func=format_event_type,
+                                             key='event_log_types', on_change=lambda: st.session_state.pop('event_log_csv', None))
+            counts = event_log.counts(driver_filter, type_filter)
             
             # Enhanced table styling
             st.markdown("""
@@ -1654,42 +1525,35 @@ if st.session_state.current_page == 'dashboard':
             """, unsafe_allow_html=True)
             
             # Show summary statistics
-            if not df.empty:
-                col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
-                
-                with col1:
-                    st.metric(
-                        label="Total Events",
-                        value=len(df),
-                        delta=None
-                    )
-                
-                with col2:
-                    if 'Event Type' in df.columns:
-                        drowsiness_count = len(df[df['Event Type'].str.contains('😴', na=False)])
-                        st.metric(
-                            label="Drowsiness Events",
-                            value=drowsiness_count,
-                            delta=None
-                        )
-                
-                with col3:
-                    if 'Event Type' in df.columns:
-                        phone_count = len(df[df['Event Type'].str.contains('📱', na=False)])
-                        st.metric(
-                            label="Phone Usage",
-                            value=phone_count,
-                            delta=None
-                        )
-                
-                with col4:
-                    if 'Event Type' in df.columns:
-                        yawn_count = len(df[df['Event Type'].str.contains('🥱', na=False)])
-                        st.metric(
-                            label="Yawning Events",
-                            value=yawn_count,
-                            delta=None
-                        )
+            col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+            
+            with col1:
+                st.metric(
+                    label="Total Events",
+                    value=sum(counts.values()),
+                    delta=None
+                )
+            
+            with col2:
+                st.metric(
+                    label="Drowsiness Events",
+                    value=counts.get('Drowsiness', 0),
+                    delta=None
+                )
+            
+            with col3:
+                st.metric(
+                    label="Phone Usage",
+                    value=counts.get('Phone Usage', 0),
+                    delta=None
+                )
+            
+            with col4:
+                st.metric(
+                    label="Yawning Events",
+                    value=counts.get('Yawning', 0),
+                    delta=None
+                )
             
             st.markdown("</div>", unsafe_allow_html=True)
             
@@ -1712,18 +1576,18 @@ if st.session_state.current_page == 'dashboard':
                 ">📋 Detailed Event Log</h4>
             """, unsafe_allow_html=True)
             
-            # Display the dataframe with enhanced styling
+            # Only the newest rows go to the browser; the CSV export has all of them
             st.dataframe(
-                df,
+                EventLog.display(event_log.latest(DISPLAY_ROWS, driver_filter, type_filter)),
                 use_container_width=True,
                 hide_index=True,
                 height=400
             )
             
-            st.markdown("</div>", unsafe_allow_html=True)
+            if sum(counts.values()) > DISPLAY_ROWS:
+                st.caption(f"Showing the newest {DISPLAY_ROWS:,} of {sum(counts.values()):,} matching events.")
             
-            # Enhanced download section
-            csv = df.to_csv(index=False)
+            st.markdown("</div>", unsafe_allow_html=True)
             
             st.markdown("""
             <div style="
@@ -1744,13 +1608,18 @@ if st.session_state.current_page == 'dashboard':
             """, unsafe_allow_html=True)
             
             with col2:
-                st.download_button(
-                    label="📊 Download CSV Report",
-                    data=csv,
-                    file_name=f"fleet_event_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
+                # The CSV covers every matching event, so it is built only on request
+                if st.button("📊 Prepare CSV Report", key='event_log_prepare_csv', use_container_width=True):
+                    st.session_state.event_log_csv = EventLog.display(event_log.filtered(driver_filter, type_filter)).to_csv(index=False)
+                if st.session_state.get('event_log_csv') is not None:
+                    st.download_button(
+                        label="📥 Download CSV Report",
+                        data=st.session_state.event_log_csv,
+                        file_name=f"fleet_event_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                        mime="text/csv",
+                        use_container_width=True,
+                        on_click=lambda: st.session_state.pop('event_log_csv', None)
+                    )
             
             st.markdown("</div>", unsafe_allow_html=True)
         else:
@@ -1998,6 +1867,13 @@ if st.session_state.current_page.startswith('driver_dashboard_'):
                         key=f"download_pdf_{trip['_id']}",
                         use_container_width=True
                     )
+            # EAR / mouth ratio over the whole trip with event markers, downsampled server-side
+            if st.checkbox("📈 Show timeline", key=f"timeline_{trip['_id']}"):
+                chart = trip_timeline(str(trip['_id']), trip_events)
+                if chart is not None:
+                    st.altair_chart(chart, use_container_width=True)
+                else:
+                    st.info("No telemetry or events were recorded for this trip.")
     
     st.stop()
 
@@ -0,0 +1,199 @@
+"""
+Re-run the drowsiness, yawn and phone detectors over recorded dashcam footage.
+
+    python batch_analyze.py recordings/ --output events.jsonl
+    python batch_analyze.py recordings/ --output events.parquet --workers 8
+    python batch_analyze.py recordings/ --output mongo --driver alice --trip-id <id>
+
+Files are sharded across a process pool; each worker owns one FaceMesh and one
+phone detector and runs the same MonitoringPipeline as the live app.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import cv2
+
+from detector.pipeline import MonitoringPipeline, build_events
+from detector.recording import LandmarkRecorder
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.webm')
+EVENT_COLUMNS = ['timestamp', 'event_type', 'driver', 'trip_id', 'ear_value', 'details',
+                 'source_file', 'frame_index', 'frame_time']
+
+_pipeline = None
+
+
+def _init_worker(detect_phones):
+    global _pipeline
+    # One process per core: keep each library single-threaded so workers don't contend
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+    import mediapipe
+    face_mesh = mediapipe.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+    _pipeline = MonitoringPipeline(face_mesh, detect_phones=detect_phones)
+
+
+def analyze_file(task):
+    """Run the pipeline over one video file and return its events and timing."""
+    path, driver, trip_id, stride, detailed_yawn, record_dir = task
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return {'file': path, 'frames': 0, 'seconds': 0.0, 'events': [], 'error': 'could not open video'}
+
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    # Recording start is estimated as the file's modification time minus its length
+    recording_start = datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=total_frames / source_fps)
+
+    events = []
+    processed = 0
+    index = -1
+    source_file = os.path.basename(path)
+    recorder = None
+    if record_dir:
+        frame_size = (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        recorder = LandmarkRecorder(os.path.join(record_dir, os.path.splitext(source_file)[0] + ".lmk"), frame_size)
+    while True:
+        for _ in range(stride - 1):
+            if not cap.grab():
+                break
+            index += 1
+        ret, frame = cap.read()
+        if not ret:
+            break
+        index += 1
+        processed += 1
+        frame_time = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 or index / source_fps
+        result = _pipeline.process(frame)
+        if recorder:
+            recorder.write(frame_time, result)
+        timestamp = (recording_start + timedelta(seconds=frame_time)).strftime('%Y-%m-%d %H:%M:%S')
+        for event in build_events(result, driver, trip_id, timestamp, detailed_yawn=detailed_yawn):
+            event['source_file'] = source_file
+            event['frame_index'] = index
+            event['frame_time'] = round(frame_time, 3)
+            events.append(event)
+    cap.release()
+    if recorder:
+        recorder.close()
+    return {'file': path, 'frames': processed, 'seconds': time.perf_counter() - started, 'events': events, 'error': None}
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, events):
+        for event in events:
+            self.file.write(json.dumps(event, default=float) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        import pandas as pd  # noqa: F401 - fail early when pandas/pyarrow are missing
+        import pyarrow  # noqa: F401
+        self.path = path
+        self.events = []
+
+    def write(self, events):
+        self.events.extend(events)
+
+    def close(self):
+        import pandas as pd
+        df = pd.DataFrame(self.events, columns=EVENT_COLUMNS)
+        df.to_parquet(self.path, index=False)
+
+
+class MongoWriter:
+    def write(self, events):
+        from db import log_rides
+        log_rides(events)
+
+    def close(self):
+        pass
+
+
+def make_writer(output):
+    if output == "mongo":
+        return MongoWriter()
+    if output.endswith(".parquet"):
+        return ParquetWriter(output)
+    return JsonlWriter(output)
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(path):
+            videos.append(path)
+    # Largest first so the long files don't end up running alone at the tail
+    return sorted(set(videos), key=os.path.getsize, reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files or directories")
+    parser.add_argument("--output", default="events.jsonl", help="a .jsonl or .parquet path, or 'mongo'")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--driver", default="batch", help="driver username to tag events with")
+    parser.add_argument("--trip-id", default=None)
+    parser.add_argument("--stride", type=int, default=1, help="analyse every Nth frame")
+    parser.add_argument("--no-phone", action="store_true", help="skip phone detection")
+    parser.add_argument("--detailed-yawn", action="store_true", help="store mouth ratio details on yawn events")
+    parser.add_argument("--record-dir", help="also save a landmark recording per file for replay_session.py")
+    args = parser.parse_args(argv)
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No video files found.")
+        return 1
+
+    writer = make_writer(args.output)
+    if args.record_dir:
+        os.makedirs(args.record_dir, exist_ok=True)
+    tasks = [(path, args.driver, args.trip_id, max(1, args.stride), args.detailed_yawn, args.record_dir) for path in videos]
+    workers = max(1, min(args.workers, len(tasks)))
+    started = time.perf_counter()
+    total_frames = total_events = 0
+    failed = 0
+
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(not args.no_phone,)) as pool:
+        for done, result in enumerate(pool.imap_unordered(analyze_file, tasks), 1):
+            name = os.path.basename(result['file'])
+            if result['error']:
+                failed += 1
+                print(f"[{done}/{len(tasks)}] {name}: {result['error']}")
+                continue
+            writer.write(result['events'])
+            total_frames += result['frames']
+            total_events += len(result['events'])
+            fps = result['frames'] / result['seconds'] if result['seconds'] else 0.0
+            print(f"[{done}/{len(tasks)}] {name}: {result['frames']} frames in {result['seconds']:.1f}s "
+                  f"({fps:.1f} fps), {len(result['events'])} events")
+    writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Processed {total_frames} frames from {len(tasks) - failed} files in {elapsed:.1f}s "
+          f"({total_frames / elapsed if elapsed else 0:.1f} fps across {workers} workers), {total_events} events")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,511 @@
+"""
+Microbenchmarks for the detectors and data paths.
+
+    python -m bench.run                      # run everything, compare to bench/baseline.json
+    python -m bench.run --filter ear         # only benchmarks whose name contains "ear"
+    python -m bench.run --save-baseline      # store this run as the new baseline
+    python -m bench.run --require-baseline   # CI: also fail without a baseline to compare to
+
+Results are written as JSON, including the peak memory each call allocates
+(tracemalloc). The run fails (exit code 1) when a benchmark's median is slower
+than the baseline by more than --tolerance. Without --require-baseline, a
+missing baseline (or a benchmark missing from it) is reported but not a failure.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from bench import synthetic
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+PDF_EVENT_COUNTS = (0, 10, 100, 1000)
+
+# name -> setup(); setup returns a zero-argument callable to time, or raises
+# Skip when a dependency (model weights, mongod, ...) is unavailable.
+BENCHMARKS = {}
+_teardowns = []
+
+
+class Skip(Exception):
+    pass
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# --- LANDMARKS AND KERNELS ---
+@benchmark("landmarks.to_array")
+def _landmarks_to_array():
+    from detector.landmarks import landmarks_to_array
+    face = synthetic.face_landmarks()
+    return lambda: landmarks_to_array(face, 640, 480)
+
+
+@benchmark("ear.get_ear_pair")
+def _get_ear():
+    from detector.drowsiness import get_ear
+    from detector.landmarks import LEFT_EYE, RIGHT_EYE
+    landmarks = synthetic.landmark_array()
+    return lambda: (get_ear(landmarks[LEFT_EYE]) + get_ear(landmarks[RIGHT_EYE])) / 2.0
+
+
+@benchmark("yawn.is_yawning")
+def _is_yawning():
+    from detector.yawn import is_yawning
+    landmarks = synthetic.landmark_array(mouth_open=True)
+    return lambda: is_yawning(landmarks)
+
+
+@benchmark("yawn.is_yawning_debug")
+def _is_yawning_debug():
+    from detector.yawn import is_yawning
+    landmarks = synthetic.landmark_array(mouth_open=True)
+    return lambda: is_yawning(landmarks, debug=True)
+
+
+# --- FRAME PREPROCESSING ---
+@benchmark("preprocess.allocating")
+def _preprocess_allocating():
+    import cv2
+    from detector.landmarks import landmarks_to_array
+    frame, face = synthetic.frames()[0], synthetic.face_landmarks()
+    h, w = frame.shape[:2]
+
+    def step():
+        rgb = cv2.cvtColor(cv2.flip(frame, 1), cv2.COLOR_BGR2RGB)
+        return rgb, landmarks_to_array(face, w, h)
+    return step
+
+
+@benchmark("preprocess.buffered")
+def _preprocess_buffered():
+    import numpy as np
+    from detector.landmarks import NUM_LANDMARKS, landmarks_to_array
+    from detector.preprocess import FramePreprocessor
+    frame, face = synthetic.frames()[0], synthetic.face_landmarks()
+    h, w = frame.shape[:2]
+    preprocess = FramePreprocessor()
+    landmarks = np.empty((NUM_LANDMARKS, 2))
+
+    def step():
+        rgb, display = preprocess(frame)
+        return rgb, landmarks_to_array(face, w, h, out=landmarks)
+    return step
+
+
+@benchmark("motion.gate[1080p]")
+def _motion_gate():
+    import cv2
+    from detector.motion import MotionGate
+    frame = cv2.resize(synthetic.frames()[0], (1920, 1080))
+    gate = MotionGate()
+    gate.check(frame)
+    gate.set_face(frame, (800, 300, 1120, 720))
+    return lambda: gate.check(frame, now=0.0)
+
+
+# --- PREVIEW ---
+@benchmark("preview.png_full")
+def _preview_png_full():
+    import cv2
+    frame = synthetic.frames()[0]
+    return lambda: cv2.imencode(".png", frame)
+
+
+@benchmark("preview.jpeg_scaled")
+def _preview_jpeg_scaled():
+    from preview import PreviewRenderer
+
+    class Sink:
+        def image(self, data, output_format=None):
+            self.size = len(data)
+    renderer = PreviewRenderer(Sink(), max_fps=0)
+    frame = synthetic.frames()[0]
+    return lambda: renderer.show(frame)
+
+
+# --- CHARTS ---
+def _ten_hour_series():
+    import numpy as np
+    rng = np.random.default_rng(0)
+    n = 10 * 3600 * 2  # ten hours of 2 Hz telemetry
+    return np.arange(n) / 2.0, (0.3 + 0.02 * rng.standard_normal(n)).astype(np.float32)
+
+
+@benchmark("downsample.minmax[10h]")
+def _downsample_minmax():
+    from downsample import downsample
+    x, y = _ten_hour_series()
+    return lambda: downsample(x, y, 2000, "minmax")
+
+
+@benchmark("downsample.lttb[10h]")
+def _downsample_lttb():
+    from downsample import downsample
+    x, y = _ten_hour_series()
+    return lambda: downsample(x, y, 2000, "lttb")
+
+
+# --- RISK ---
+@benchmark("risk.compute_scores[100k]")
+def _risk_compute_scores():
+    import pandas as pd
+    from risk import compute_scores
+    rides = pd.DataFrame(synthetic.events(100_000))
+    rides['driver'] = [f"driver_{i % 50}" for i in range(len(rides))]
+    return lambda: compute_scores(rides, now=1.7e9)
+
+
+# --- EVENT SCHEMA ---
+@benchmark("event_schema.encode[1000]")
+def _event_schema_encode():
+    from event_schema import DriverCodes, encode
+    rides = synthetic.rides(1000)
+    codes = DriverCodes()
+    return lambda: [encode(ride, codes) for ride in rides]
+
+
+@benchmark("event_schema.decode[1000]")
+def _event_schema_decode():
+    from event_schema import DriverCodes, decode_many, encode
+    codes = DriverCodes()
+    docs = [encode(ride, codes) for ride in synthetic.rides(1000)]
+    return lambda: decode_many(docs, codes)
+
+
+# --- EVENT LOG ---
+@benchmark("event_log.rerun[1M]")
+def _event_log_rerun():
+    from event_log import DISPLAY_ROWS, EventLog, rides_frame
+    rides = synthetic.events(1_000_000)
+    for i, ride in enumerate(rides):
+        ride['driver'] = f"driver_{i % 300}"
+    log = EventLog()
+    log._append(rides_frame(rides))
+    new = rides_frame(rides[:20])
+    drivers = ['driver_1', 'driver_2']
+
+    def rerun():
+        # What a manager page rerun does once 20 new rides have arrived
+        log._append(new.copy())
+        log.counts()
+        log.counts(drivers)
+        EventLog.display(log.latest(DISPLAY_ROWS, drivers))
+    return rerun
+
+
+# --- MODELS ---
+def _frame_cycle():
+    frames = synthetic.frames()
+    state = {'i': 0}
+
+    def next_frame():
+        state['i'] = (state['i'] + 1) % len(frames)
+        return frames[state['i']]
+    return next_frame
+
+
+@benchmark("face_mesh.process")
+def _face_mesh():
+    try:
+        import mediapipe as mp
+    except ImportError as e:
+        raise Skip(str(e))
+    face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+    _teardowns.append(face_mesh.close)
+    next_frame = _frame_cycle()
+    return lambda: face_mesh.process(next_frame()[:, :, ::-1])
+
+
+@benchmark("phone.yolov8n")
+def _detect_phone():
+    try:
+        from detector.phone_detector import detect_phone
+    except Exception as e:  # missing ultralytics or model weights
+        raise Skip(str(e))
+    next_frame = _frame_cycle()
+    return lambda: detect_phone(next_frame())
+
+
+# --- REPORTS ---
+def _pdf_benchmark(count):
+    def setup():
+        try:
+            from report import generate_trip_pdf
+        except ImportError as e:
+            raise Skip(str(e))
+        trip, events = synthetic.trip(), synthetic.events(count)
+        return lambda: generate_trip_pdf(trip, events)
+    return setup
+
+
+for _count in PDF_EVENT_COUNTS:
+    benchmark(f"report.trip_pdf[{_count}]")(_pdf_benchmark(_count))
+
+
+# --- DATABASE (local mongod, throwaway database) ---
+_db_unavailable = None
+
+
+def _bench_db():
+    global _db_unavailable
+    if _db_unavailable:
+        raise Skip(_db_unavailable)
+    os.environ.setdefault("DMS_DB_NAME", "IDP_bench")
+    uri = os.environ.get("DMS_MONGO_URI", "mongodb://localhost:27017/IDP")
+    try:
+        import pymongo
+        from pymongo.errors import PyMongoError
+        pymongo.MongoClient(uri, serverSelectionTimeoutMS=500).admin.command("ping")
+        import db
+    except ImportError as e:
+        _db_unavailable = str(e)
+        raise Skip(_db_unavailable)
+    except PyMongoError:
+        _db_unavailable = f"mongod unavailable at {uri}"
+        raise Skip(_db_unavailable)
+    if not db.uses_mongo():
+        raise Skip("the db.* benchmarks need DMS_STORAGE=mongo; see storage.* for the other backends")
+    if db.DB_NAME == "IDP":
+        raise Skip("refusing to benchmark against the production database")
+    if _drop_bench_db not in _teardowns:
+        db.client.drop_database(db.DB_NAME)
+        _teardowns.append(_drop_bench_db)
+    return db
+
+
+def _drop_bench_db():
+    import db
+    db.client.drop_database(db.DB_NAME)
+
+
+@benchmark("db.log_ride")
+def _db_log_ride():
+    db = _bench_db()
+    events = synthetic.events(1)
+    return lambda: db.log_ride(dict(events[0]))
+
+
+@benchmark("db.get_rides_for_driver[1000]")
+def _db_get_rides():
+    db = _bench_db()
+    db.log_rides(synthetic.events(1000, driver='bench_reader'))
+    return lambda: db.get_rides_for_driver('bench_reader')
+
+
+@benchmark("db.get_trips_for_driver")
+def _db_get_trips():
+    db = _bench_db()
+    db.trips_col.insert_many([{k: v for k, v in synthetic.trip('bench_trips').items() if k != '_id'} for _ in range(50)])
+    return lambda: db.get_trips_for_driver('bench_trips')
+
+
+@benchmark("db.get_user")
+def _db_get_user():
+    db = _bench_db()
+    db.create_user({'username': 'bench_user', 'role': 'driver', 'fleet_manager': None})
+    return lambda: db.get_user('bench_user')
+
+
+# --- STORAGE BACKENDS (the same workload on each, fresh store per benchmark) ---
+STORAGE_BACKENDS = ('memory', 'sqlite', 'mongo')
+STORAGE_PRELOAD = 20_000
+
+
+def _bench_store(kind):
+    import shutil
+    import tempfile
+    from storage.conformance import fresh_store
+    workdir = tempfile.mkdtemp()
+    try:
+        store, dispose = fresh_store(kind, workdir)
+    except (ImportError, LookupError) as e:
+        shutil.rmtree(workdir)
+        raise Skip(str(e))
+    _teardowns.append(lambda: (dispose(), shutil.rmtree(workdir, ignore_errors=True)))
+    store.log_rides(synthetic.rides(STORAGE_PRELOAD))
+    return store
+
+
+def _storage_benchmarks(kind):
+    @benchmark(f"storage.{kind}.log_ride")
+    def _log_ride():
+        store = _bench_store(kind)
+        ride = synthetic.rides(1)[0]
+        return lambda: store.log_rides([ride])
+
+    @benchmark(f"storage.{kind}.log_rides[500]")
+    def _log_rides():
+        store = _bench_store(kind)
+        rides = synthetic.rides(500)
+        return lambda: store.log_rides(rides)
+
+    @benchmark(f"storage.{kind}.rides_for_driver")
+    def _rides_for_driver():
+        store = _bench_store(kind)
+        return lambda: store.find_rides(['driver_007'])
+
+    @benchmark(f"storage.{kind}.rides_since[50 drivers]")
+    def _rides_since():
+        # A fleet board refresh: 50 drivers, the last 200 rides are new
+        store = _bench_store(kind)
+        watermark = store.find_rides(limit=200, newest_first=True)[-1]['_id']
+        drivers = [f"driver_{i:03d}" for i in range(50)]
+        return lambda: store.find_rides(drivers, watermark, 1000)
+
+    @benchmark(f"storage.{kind}.active_trips")
+    def _active_trips():
+        store = _bench_store(kind)
+        trips = [{k: v for k, v in synthetic.trip(f"driver_{i % 300:03d}").items() if k != '_id'} for i in range(3000)]
+        trip_ids = [store.log_trip(dict(trip, active=True)) for trip in trips]
+        for trip_id in trip_ids[:-50]:
+            store.update_trip(trip_id, unset=('active',))
+        drivers = [f"driver_{i:03d}" for i in range(300)]
+        return lambda: store.find_trips(drivers, active=True)
+
+
+for _kind in STORAGE_BACKENDS:
+    _storage_benchmarks(_kind)
+
+
+# --- RUNNER ---
+def measure(fn, repeat=7, min_time=0.05):
+    """Time fn like timeit.autorange: calibrate loops, then take `repeat` samples."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return {
+        'median_us': round(statistics.median(samples) * 1e6, 3),
+        'min_us': round(min(samples) * 1e6, 3),
+        'stdev_us': round(statistics.stdev(samples) * 1e6, 3) if len(samples) > 1 else 0.0,
+        'loops': loops,
+        'repeat': repeat,
+    }
+
+
+def allocations(fn, calls=5):
+    """Peak bytes allocated (and not yet freed) during one call, worst of `calls`."""
+    fn()  # let lazily created buffers and caches settle first
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run(name_filter=None, repeat=7):
+    results = {}
+    try:
+        for name, setup in BENCHMARKS.items():
+            if name_filter and name_filter not in name:
+                continue
+            try:
+                fn = setup()
+            except Skip as e:
+                results[name] = {'skipped': str(e)}
+                continue
+            results[name] = measure(fn, repeat=repeat)
+            results[name]['alloc_kb'] = round(allocations(fn) / 1024, 1)
+    finally:
+        while _teardowns:
+            _teardowns.pop()()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return (name, baseline_us, current_us, ratio) for every regressed benchmark."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or 'median_us' not in base or 'median_us' not in current:
+            continue
+        ratio = current['median_us'] / base['median_us'] if base['median_us'] else 1.0
+        if ratio > 1.0 + tolerance:
+            regressions.append((name, base['median_us'], current['median_us'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--output", default="bench_output.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="fail when there is no baseline, or it lacks a benchmark that ran")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    results = run(args.filter, args.repeat)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, r in results.items():
+        if 'skipped' in r:
+            print(f"{name:<32} skipped ({r['skipped']})")
+        else:
+            print(f"{name:<32} {r['median_us']:>12.2f} us  (min {r['min_us']:.2f}, {r['loops']} loops, "
+                  f"{r['alloc_kb']:.1f} KiB allocated)")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline found at {args.baseline}; run with --save-baseline to create one.")
+        return 1 if args.require_baseline else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    unmeasured = [name for name, r in results.items()
+                  if 'median_us' in r and 'median_us' not in baseline.get(name, {})]
+    for name in unmeasured:
+        print(f"NO BASELINE {name}")
+    regressions = compare(results, baseline, args.tolerance)
+    for name, base, current, ratio in regressions:
+        print(f"REGRESSION {name}: {base:.2f} us -> {current:.2f} us ({ratio:.2f}x)")
+    return 1 if regressions or (unmeasured and args.require_baseline) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from detector.landmarks import LEFT_EYE, RIGHT_EYE
+
+NUM_LANDMARKS = 478
+FRAME_SHAPE = (480, 640, 3)
+EVENT_TYPES = ['Drowsiness', 'Yawning', 'Phone Usage']
+
+
+class _Landmark:
+    __slots__ = ('x', 'y', 'z')
+
+    def __init__(self, x, y, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+class _FaceLandmarks:
+    """Stand-in for a MediaPipe NormalizedLandmarkList."""
+
+    def __init__(self, points):
+        self.landmark = [_Landmark(float(x), float(y)) for x, y in points]
+
+
+def _eye(center, width, openness):
+    cx, cy = center
+    h = width * openness / 2
+    return np.array([
+        (cx - width / 2, cy), (cx - width / 6, cy - h), (cx + width / 6, cy - h),
+        (cx + width / 2, cy), (cx + width / 6, cy + h), (cx - width / 6, cy + h),
+    ])
+
+
+def landmark_array(seed=0, eyes_open=True, mouth_open=False, size=(640, 480)):
+    """(NUM_LANDMARKS, 2) pixel landmarks with controllable eye and mouth state."""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    points = rng.uniform((0.35 * w, 0.25 * h), (0.65 * w, 0.75 * h), size=(NUM_LANDMARKS, 2))
+    openness = 0.3 if eyes_open else 0.12
+    points[LEFT_EYE] = _eye((0.58 * w, 0.42 * h), 0.06 * w, openness)
+    points[RIGHT_EYE] = _eye((0.42 * w, 0.42 * h), 0.06 * w, openness)
+    # Cheek points used for face width and the lip points used by is_yawning
+    points[9] = (0.38 * w, 0.55 * h)
+    points[10] = (0.62 * w, 0.55 * h)
+    gap = 0.12 * h if mouth_open else 0.01 * h
+    points[[13, 14, 15, 16]] = (0.5 * w, 0.62 * h)
+    points[[17, 18, 19, 20]] = (0.5 * w, 0.62 * h + gap)
+    return points
+
+
+def face_landmarks(seed=0, **kwargs):
+    """Synthetic MediaPipe-style landmark list (normalised coordinates)."""
+    size = kwargs.get('size', (640, 480))
+    return _FaceLandmarks(landmark_array(seed, **kwargs) / np.array(size))
+
+
+def frames(count=8, shape=FRAME_SHAPE, seed=0):
+    """
+    Deterministic BGR test frames: a smooth gradient with a few solid
+    blocks and sensor-like noise, so encoders and detectors see real texture.
+    """
+    rng = np.random.default_rng(seed)
+    h, w, _ = shape
+    gradient = np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+    result = []
+    for _ in range(count):
+        frame = np.broadcast_to(gradient, shape).copy()
+        for _ in range(4):
+            y, x = rng.integers(0, h - 60), rng.integers(0, w - 60)
+            frame[y:y + 60, x:x + 60] = rng.integers(0, 255, 3)
+        frame += rng.normal(0, 6, shape)
+        result.append(np.clip(frame, 0, 255).astype(np.uint8))
+    return result
+
+
+def trip(driver='bench_driver'):
+    return {
+        '_id': 'bench_trip',
+        'driver': driver,
+        'start_point': 'Depot',
+        'destination': 'Warehouse',
+        'start_time': '2024-01-01 08:00:00',
+        'end_time': '2024-01-01 10:00:00',
+    }
+
+
+def events(count, driver='bench_driver', trip_id='bench_trip'):
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    result = []
+    for i in range(count):
+        event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+        event = {
+            'timestamp': (start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S'),
+            'event_type': event_type,
+            'driver': driver,
+            'trip_id': trip_id,
+        }
+        if event_type == 'Drowsiness':
+            event['ear_value'] = 0.15
+        elif event_type == 'Yawning':
+            event['details'] = 'Mouth distance exceeded threshold'
+        else:
+            event['details'] = 'Mobile phone detected in frame'
+        result.append(event)
+    return result
+
+
+def rides(count, drivers=300, trips=20_000, seed=0):
+    """A fleet's worth of ride documents as log_ride receives them: many drivers and trips, varied details."""
+    rng = np.random.default_rng(seed)
+    trip_ids = [f"{i:024x}" for i in rng.integers(0, 2**63, trips)]
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    offsets = np.sort(rng.integers(0, 90 * 86400, count))
+    kinds = rng.integers(0, 4, count)
+    values = rng.random((count, 3))
+    result = []
+    for i in range(count):
+        trip = int(kinds[i] * 7919 + i // 500) % trips
+        event = {
+            'timestamp': (start + timedelta(seconds=int(offsets[i]))).strftime('%Y-%m-%d %H:%M:%S'),
+            'event_type': EVENT_TYPES[kinds[i] % len(EVENT_TYPES)],
+            'driver': f"driver_{trip % drivers:03d}",
+            'trip_id': trip_ids[trip],
+        }
+        if kinds[i] == 0:
+            event['ear_value'] = round(0.1 + 0.1 * float(values[i, 0]), 3)
+        elif kinds[i] == 1:
+            event['details'] = (f'Mouth ratio: {0.3 + values[i, 0]:.3f}, dist: {20 + 20 * values[i, 1]:.1f}, '
+                                f'width: {100 + 50 * values[i, 2]:.1f}')
+        elif kinds[i] == 2:
+            event['details'] = 'Mobile phone detected in frame'
+        else:
+            # Agent episodes carry their extent
+            event['event_type'] = 'Yawning'
+            event['details'] = f'Max mouth ratio: {0.3 + values[i, 0]:.3f}'
+            event['end_time'] = event['timestamp']
+            event['duration'] = round(3 * float(values[i, 1]), 2)
+            event['frames'] = int(30 * values[i, 2]) + 1
+        result.append(event)
+    return result
@@ -1,58 +1,138 @@
-from pymongo import MongoClient
-from pymongo.collection import Collection
+import os
+from datetime import datetime
+
 from typing import Optional, Dict, Any, List
 
-# Use the provided MongoDB URI
-MONGO_URI = "mongodb://localhost:27017/IDP"
-DB_NAME = "IDP"
+from retention import with_archived
+from storage import make_store
+
+# DMS_STORAGE picks the backend: mongo (default), sqlite[:<path>] or memory; see storage/__init__.py
+STORAGE = os.environ.get("DMS_STORAGE", "mongo")
+store = make_store(STORAGE)
+
+# Handles that features built directly on MongoDB (risk scores, telemetry, GridFS clips, retention) import from here
+_MONGO_ATTRIBUTES = {'client': 'client', 'db': 'db', 'users_col': 'users_col', 'rides_col': 'rides_col',
+                     'trips_col': 'trips_col', 'driver_codes': 'driver_codes', 'MONGO_URI': 'uri', 'DB_NAME': 'db_name'}
+
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+def __getattr__(name: str) -> Any:
+    if name in _MONGO_ATTRIBUTES:
+        if store.kind != "mongo":
+            # Not AttributeError, which 'from db import ...' would turn into a bare ImportError
+            raise RuntimeError(f"db.{name} needs the MongoDB storage backend (DMS_STORAGE={STORAGE})")
+        return getattr(store, _MONGO_ATTRIBUTES[name])
+    raise AttributeError(f"module 'db' has no attribute {name!r}")
 
-# Collections
-users_col: Collection = db["users"]
-rides_col: Collection = db["rides"]
-trips_col: Collection = db["trips"]
+
+def uses_mongo() -> bool:
+    return store.kind == "mongo"
 
 # --- USER OPERATIONS ---
 def get_user(username: str) -> Optional[Dict[str, Any]]:
-    return users_col.find_one({"username": username})
+    return store.get_user(username)
 
 def create_user(user: Dict[str, Any]) -> None:
-    users_col.insert_one(user)
+    store.create_user(user)
 
 def update_user(username: str, update: Dict[str, Any]) -> None:
-    users_col.update_one({"username": username}, {"$set": update})
+    store.update_user(username, update)
 
 def get_all_drivers() -> List[Dict[str, Any]]:
-    return list(users_col.find({"role": "driver"}))
+    return store.find_users(role="driver")
 
 def get_all_managers() -> List[Dict[str, Any]]:
-    return list(users_col.find({"role": "manager"}))
+    return store.find_users(role="manager")
 
 def get_unassigned_drivers() -> List[Dict[str, Any]]:
-    return list(users_col.find({"role": "driver", "fleet_manager": None}))
+    return store.find_users(role="driver", fleet_manager=None)
 
 def assign_driver_to_manager(driver_username: str, manager_username: str) -> None:
-    users_col.update_one({"username": driver_username}, {"$set": {"fleet_manager": manager_username}})
+    store.update_user(driver_username, {"fleet_manager": manager_username})
 
 def get_drivers_for_manager(manager_username: str) -> List[Dict[str, Any]]:
-    return list(users_col.find({"role": "driver", "fleet_manager": manager_username}))
+    return store.find_users(role="driver", fleet_manager=manager_username)
 
 # --- RIDE/EVENT OPERATIONS ---
 def log_ride(event: Dict[str, Any]) -> None:
-    rides_col.insert_one(event)
+    store.log_rides([event])
+
+def log_rides(events: List[Dict[str, Any]]) -> None:
+    if events:
+        store.log_rides(events)
 
+# These two include rides moved to the Parquet archive by retention.py; the live views below don't
 def get_rides_for_driver(driver_username: str) -> List[Dict[str, Any]]:
-    return list(rides_col.find({"driver": driver_username}))
+    return with_archived(store.find_rides([driver_username]), driver_username)
 
 def get_all_rides() -> List[Dict[str, Any]]:
-    return list(rides_col.find())
+    return with_archived(store.find_rides())
 
 # --- TRIP OPERATIONS ---
 def log_trip(trip: Dict[str, Any]) -> str:
-    result = trips_col.insert_one(trip)
-    return str(result.inserted_id)
+    # Running trips carry active=True (removed by end_trip), which the backends index separately
+    trip.setdefault('active', True)
+    return store.log_trip(trip)
+
+def end_trip(trip_id: str) -> None:
+    store.update_trip(trip_id, set={"end_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, unset=("active",))
 
 def get_trips_for_driver(driver_username: str) -> List[Dict[str, Any]]:
-    return list(trips_col.find({"driver": driver_username})) 
\ No newline at end of file
+    return store.find_trips([driver_username])
+
+def get_active_trips(driver_usernames: List[str]) -> List[Dict[str, Any]]:
+    return store.find_trips(driver_usernames, active=True)
+
+# --- LIVE POLLING ---
+# How far before its watermark a poller re-reads, for rides whose ids were made on another
+# machine or in another process (the agent, ingest_server) and sort below rides already seen
+POLL_OVERLAP_SECONDS = float(os.environ.get("DMS_POLL_OVERLAP", 30))
+
+class RidePoller:
+    """
+    Reads rides a live view hasn't seen yet. Each poll re-reads from
+    POLL_OVERLAP_SECONDS before the watermark and skips the ids it has
+    already returned, so late rides below the watermark still show up.
+    """
+
+    def __init__(self, driver_usernames: Optional[List[str]] = None, page_size: int = 1000):
+        self.drivers = driver_usernames
+        self.page_size = page_size
+        self.watermark = None
+        self.seen = set()
+
+    def mark_seen(self, rides: List[Dict[str, Any]]) -> None:
+        for ride in rides:
+            self.seen.add(ride['_id'])
+            if self.watermark is None or ride['_id'] > self.watermark:
+                self.watermark = ride['_id']
+
+    def pages(self):
+        """Unseen rides, oldest first, a page at a time; reads everything on the first poll."""
+        after = None if self.watermark is None else store.rewind(self.watermark, POLL_OVERLAP_SECONDS)
+        while True:
+            rides = store.find_rides(self.drivers, after, self.page_size)
+            new = [ride for ride in rides if ride['_id'] not in self.seen]
+            self.mark_seen(new)
+            if new:
+                yield new
+            if len(rides) < self.page_size:
+                break
+            after = rides[-1]['_id']
+        # Ids below the next poll's starting point can't be returned again
+        if self.watermark is not None:
+            cutoff = store.rewind(self.watermark, POLL_OVERLAP_SECONDS)
+            self.seen = {ride_id for ride_id in self.seen if ride_id > cutoff}
+
+def get_rides_since(driver_usernames: Optional[List[str]], after_id: Optional[Any] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+    """Rides newer than after_id (an _id watermark), oldest first; all drivers when driver_usernames is None, no limit when limit is 0."""
+    return store.find_rides(driver_usernames, after_id, limit)
+
+def get_latest_rides(driver_usernames: List[str], limit: int = 50) -> List[Dict[str, Any]]:
+    """The most recent rides, oldest first; used to seed a watermark."""
+    return store.find_rides(driver_usernames, limit=limit, newest_first=True)[::-1]
+
+# --- INDEXES ---
+def ensure_indexes() -> None:
+    """Create MongoDB's live-view indexes (other backends create theirs with the schema)."""
+    if uses_mongo():
+        store.ensure_indexes()
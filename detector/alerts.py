@@ -0,0 +1,34 @@
+ALERT_TYPES = ('drowsiness', 'yawning', 'phone')
+REPEAT_SECONDS = 4
+
+class AlertTimers:
+    """
+    Sustained-detection timers that decide when the audible alarm fires.
+    The alarm sounds on the second consecutive detection of an alert type and
+    repeats every REPEAT_SECONDS while it persists. Time is passed in by the
+    caller so recorded sessions can be replayed faster than real time.
+    """
+
+    def __init__(self, alert_types=ALERT_TYPES, repeat_seconds=REPEAT_SECONDS):
+        self.repeat_seconds = repeat_seconds
+        self.timers = {t: {'start_time': None, 'alert_played': False} for t in alert_types}
+
+    def update(self, alert_type, is_detected, now):
+        """Advance the timer for alert_type; returns True when the alarm should play."""
+        timer = self.timers[alert_type]
+        if is_detected:
+            if timer['start_time'] is None:
+                timer['start_time'] = now
+                timer['alert_played'] = False
+            elif not timer['alert_played'] or (now - timer['start_time']) >= self.repeat_seconds:
+                timer['alert_played'] = True
+                timer['start_time'] = now
+                return True
+        else:
+            timer['start_time'] = None
+            timer['alert_played'] = False
+        return False
+
+    def active(self, alert_type):
+        """True while an episode of alert_type is open (detected on the last update)."""
+        return self.timers[alert_type]['start_time'] is not None
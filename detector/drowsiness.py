@@ -6,4 +6,10 @@ def get_ear(eye):
     C = np.linalg.norm(eye[0] - eye[3])
     ear = (A + B) / (2.0 * C)
     return ear
-  
\ No newline at end of file
+
+def get_ear_batch(eyes):
+    """Vectorised get_ear over an (N, 6, 2) array of eyes."""
+    A = np.linalg.norm(eyes[:, 1] - eyes[:, 5], axis=-1)
+    B = np.linalg.norm(eyes[:, 2] - eyes[:, 4], axis=-1)
+    C = np.linalg.norm(eyes[:, 0] - eyes[:, 3], axis=-1)
+    return (A + B) / (2.0 * C)
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+from detector.pipeline import FrameResult
+
+EVENT_TYPES = {'drowsiness': 'Drowsiness', 'yawning': 'Yawning', 'phone': 'Phone Usage'}
+
+
+def _format(ts):
+    return datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class EpisodeTracker:
+    """
+    Collapses per-frame detections into one event per episode. An episode
+    ends once its detector has been quiet for gap_seconds, so a few missed
+    frames in the middle of a long eye closure don't split it. Episodes are
+    shaped like the per-frame ride documents (timestamp, event_type, driver,
+    trip_id, ...) with the episode's end, duration and frame count added.
+    """
+
+    def __init__(self, driver, trip_id, gap_seconds=1.0):
+        self.driver = driver
+        self.trip_id = trip_id
+        self.gap_seconds = gap_seconds
+        self.open = {}
+
+    def update(self, result: FrameResult, now):
+        """Advance with one frame; returns the episodes that closed."""
+        closed = []
+        detected = {'drowsiness': result.drowsy, 'yawning': result.yawning, 'phone': result.phone}
+        for alert_type, is_detected in detected.items():
+            episode = self.open.get(alert_type)
+            if is_detected:
+                if episode is None:
+                    episode = self.open[alert_type] = {'start': now, 'frames': 0, 'min_ear': None, 'max_mouth_ratio': 0.0}
+                episode['last'] = now
+                episode['frames'] += 1
+                if result.ear is not None and (episode['min_ear'] is None or result.ear < episode['min_ear']):
+                    episode['min_ear'] = float(result.ear)
+                episode['max_mouth_ratio'] = max(episode['max_mouth_ratio'], float(result.mouth_ratio))
+            elif episode is not None and now - episode['last'] >= self.gap_seconds:
+                closed.append(self._event(alert_type, self.open.pop(alert_type)))
+        return closed
+
+    def annotate(self, alert_type, **fields):
+        """Extra fields for the open episode's event, e.g. a reference to an evidence clip."""
+        episode = self.open.get(alert_type)
+        if episode is not None:
+            episode.setdefault('fields', {}).update(fields)
+
+    def close(self):
+        """End every open episode, e.g. at the end of a trip."""
+        closed = [self._event(alert_type, episode) for alert_type, episode in self.open.items()]
+        self.open.clear()
+        return closed
+
+    def _event(self, alert_type, episode):
+        event = {
+            'timestamp': _format(episode['start']),
+            'event_type': EVENT_TYPES[alert_type],
+            'driver': self.driver,
+            'trip_id': self.trip_id,
+            'end_time': _format(episode['last']),
+            'duration': round(episode['last'] - episode['start'], 2),
+            'frames': episode['frames'],
+        }
+        if alert_type == 'drowsiness':
+            if episode['min_ear'] is not None:
+                event['ear_value'] = round(episode['min_ear'], 3)
+        elif alert_type == 'yawning':
+            event['details'] = f"Max mouth ratio: {episode['max_mouth_ratio']:.3f}"
+        elif alert_type == 'phone':
+            event['details'] = 'Mobile phone detected in frame'
+        event.update(episode.get('fields', {}))
+        return event
@@ -0,0 +1,288 @@
+"""
+In-process inference service shared by every monitoring session.
+
+The server owns the models: one tracking FaceMesh per client (evicted when the
+client goes idle) run by a small worker pool, and the single YOLO model fed by
+one batching thread. Requests from many clients are served round-robin, so a
+client that submits faster than it is served only delays itself; when a client
+has more than max_pending frames queued its oldest requests are cancelled.
+"""
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+
+from detector.landmarks import landmarks_to_array
+from detector.pipeline import FrameResult, MonitoringPipeline
+from metrics import registry as metrics_registry
+
+SERVER_SESSION = "inference-server"
+
+
+class FairQueue:
+    """Per-client FIFO queues drained round-robin across clients."""
+
+    def __init__(self, max_pending=2, on_drop=None):
+        self.max_pending = max_pending
+        self.on_drop = on_drop
+        self._queues = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, client_id, item):
+        with self._cond:
+            queue = self._queues.get(client_id)
+            if queue is None:
+                queue = self._queues[client_id] = collections.deque()
+            queue.append(item)
+            while len(queue) > self.max_pending:
+                dropped = queue.popleft()
+                if self.on_drop:
+                    self.on_drop(dropped)
+            self._cond.notify()
+
+    def get_batch(self, max_items, wait=0.0, timeout=None):
+        """
+        Block until at least one item is available, then keep collecting for up
+        to `wait` seconds until max_items are gathered, one per client per round.
+        Returns [] on timeout or close.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._queues, timeout):
+                return []
+            batch = self._take(max_items)
+            deadline = time.monotonic() + wait
+            while len(batch) < max_items and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    break
+                batch.extend(self._take(max_items - len(batch)))
+            return batch
+
+    def _take(self, max_items):
+        batch = []
+        while self._queues and len(batch) < max_items:
+            # Rotate: serve the first client, then move it to the back
+            client_id, queue = next(iter(self._queues.items()))
+            batch.append(queue.popleft())
+            if queue:
+                self._queues.move_to_end(client_id)
+            else:
+                del self._queues[client_id]
+        return batch
+
+    def depth(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _Request:
+    __slots__ = ('client_id', 'frame', 'rgb', 'future', 'result', 'remaining', 'submitted', 'lock')
+
+    def __init__(self, client_id, frame, rgb, stages):
+        self.client_id = client_id
+        self.frame = frame
+        self.rgb = rgb
+        self.future = Future()
+        self.result = FrameResult()
+        self.remaining = stages
+        self.submitted = time.perf_counter_ns()
+        self.lock = threading.Lock()
+
+    def stage_done(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining != 0:
+                return
+        if self.future.set_running_or_notify_cancel():
+            self.future.set_result(self.result)
+
+    def fail(self, exc):
+        with self.lock:
+            if self.remaining <= 0:
+                return
+            self.remaining = -1
+        if self.future.set_running_or_notify_cancel():
+            self.future.set_exception(exc)
+
+
+class _ClientFaceMesh:
+    """A client's tracking FaceMesh; the lock keeps it on one worker at a time."""
+
+    def __init__(self, face_mesh):
+        self.face_mesh = face_mesh
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class InferenceServer:
+    def __init__(self, face_workers=2, max_batch=8, batch_wait=0.004, max_pending=2,
+                 idle_seconds=60.0, face_mesh_factory=None, phone_batch_detector=None, detect_phones=True):
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.idle_seconds = idle_seconds
+        self.metrics = metrics_registry.session(SERVER_SESSION)
+        self.scorer = MonitoringPipeline(None, detect_phones=False)
+        self._face_mesh_factory = face_mesh_factory or _default_face_mesh
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._face_queue = FairQueue(max_pending, on_drop=self._drop)
+        self._phone_queue = FairQueue(max_pending, on_drop=self._drop) if detect_phones else None
+        if detect_phones and phone_batch_detector is None:
+            from detector.phone_detector import detect_phone_batch as phone_batch_detector
+        self._detect_phone_batch = phone_batch_detector
+        self._threads = [threading.Thread(target=self._face_worker, name=f"face-mesh-{i}", daemon=True)
+                         for i in range(face_workers)]
+        if detect_phones:
+            self._threads.append(threading.Thread(target=self._phone_worker, name="phone-batch", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, client_id, frame, rgb=None) -> Future:
+        """Queue a BGR frame for client_id; the future resolves to a FrameResult."""
+        if rgb is None:
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        request = _Request(client_id, frame, rgb, 2 if self._phone_queue else 1)
+        self._face_queue.put(client_id, request)
+        if self._phone_queue:
+            self._phone_queue.put(client_id, request)
+        self.metrics.set_gauge('face_queue_depth', self._face_queue.depth())
+        if self._phone_queue:
+            self.metrics.set_gauge('phone_queue_depth', self._phone_queue.depth())
+        return request.future
+
+    def queue_depths(self):
+        return {'face': self._face_queue.depth(), 'phone': self._phone_queue.depth() if self._phone_queue else 0}
+
+    def release(self, client_id):
+        """Close a client's FaceMesh, e.g. when its camera is switched off."""
+        with self._clients_lock:
+            client = self._clients.pop(client_id, None)
+        if client:
+            with client.lock:
+                client.face_mesh.close()
+
+    def close(self):
+        self._face_queue.close()
+        if self._phone_queue:
+            self._phone_queue.close()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        for client_id in list(self._clients):
+            self.release(client_id)
+            metrics_registry.close_session(client_id)
+
+    def _drop(self, request):
+        # The same request sits in both queues; count it once
+        if not request.future.done() and request.future.cancel():
+            self.metrics.increment('dropped_frames')
+            metrics_registry.session(request.client_id).increment('dropped_frames')
+
+    def _queue_wait(self, request, stage):
+        waited = time.perf_counter_ns() - request.submitted
+        self.metrics.record(stage, waited)
+        metrics_registry.session(request.client_id).record(stage, waited)
+
+    def _client(self, client_id):
+        with self._clients_lock:
+            client = self._clients.get(client_id)
+            if client is None:
+                client = self._clients[client_id] = _ClientFaceMesh(self._face_mesh_factory())
+            client.last_used = time.monotonic()
+            return client
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._clients_lock:
+            idle = [cid for cid, c in self._clients.items() if c.last_used < cutoff]
+        for client_id in idle:
+            self.release(client_id)
+            metrics_registry.close_session(client_id)
+
+    def _face_worker(self):
+        next_eviction = time.monotonic() + self.idle_seconds
+        while True:
+            batch = self._face_queue.get_batch(1, timeout=self.idle_seconds)
+            if time.monotonic() >= next_eviction:
+                self._evict_idle()
+                next_eviction = time.monotonic() + self.idle_seconds
+            if not batch:
+                if self._face_queue.closed:
+                    return
+                continue
+            request = batch[0]
+            if request.future.cancelled():
+                continue
+            self._queue_wait(request, 'queue_face')
+            client = self._client(request.client_id)
+            started = time.perf_counter_ns()
+            try:
+                with client.lock:
+                    results = client.face_mesh.process(request.rgb)
+                if results.multi_face_landmarks:
+                    h, w = request.frame.shape[:2]
+                    for face_landmarks in results.multi_face_landmarks:
+                        self.scorer.score_landmarks(landmarks_to_array(face_landmarks, w, h), request.result)
+            except Exception as e:
+                request.fail(e)
+                continue
+            self.metrics.record('face_mesh', time.perf_counter_ns() - started)
+            request.stage_done()
+
+    def _phone_worker(self):
+        while True:
+            batch = self._phone_queue.get_batch(self.max_batch, wait=self.batch_wait, timeout=1.0)
+            if not batch:
+                if self._phone_queue.closed:
+                    return
+                continue
+            batch = [r for r in batch if not r.future.cancelled()]
+            if not batch:
+                continue
+            for request in batch:
+                self._queue_wait(request, 'queue_phone')
+            started = time.perf_counter_ns()
+            try:
+                detections = self._detect_phone_batch([r.frame for r in batch])
+            except Exception as e:
+                for request in batch:
+                    request.fail(e)
+                continue
+            self.metrics.record('phone_batch', time.perf_counter_ns() - started)
+            self.metrics.set_gauge('phone_batch_size', len(batch))
+            for request, phone in zip(batch, detections):
+                request.result.phone = bool(phone)
+                request.stage_done()
+
+
+def _default_face_mesh():
+    import mediapipe as mp
+    return mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_inference_server() -> InferenceServer:
+    """Process-wide server shared by all Streamlit sessions."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = InferenceServer(
+                face_workers=int(os.environ.get("DMS_FACE_WORKERS", 2)),
+                max_batch=int(os.environ.get("DMS_PHONE_BATCH", 8)),
+            )
+        return _server
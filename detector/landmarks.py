@@ -0,0 +1,21 @@
+import numpy as np
+
+# FaceMesh with refine_landmarks=True (468 mesh points + 10 iris points)
+NUM_LANDMARKS = 478
+
+# MediaPipe face mesh indices used for the eye aspect ratio
+LEFT_EYE = [362, 385, 387, 263, 373, 380]
+RIGHT_EYE = [33, 160, 158, 133, 153, 144]
+
+def landmarks_to_array(face_landmarks, width, height, out=None):
+    """
+    Convert normalised MediaPipe landmarks to an (N, 2) array of pixel coordinates.
+    When out is an (N, 2) float array it is filled in place and returned.
+    """
+    points = face_landmarks.landmark
+    if out is None or len(out) != len(points):
+        return np.array([(lm.x * width, lm.y * height) for lm in points])
+    for i, lm in enumerate(points):
+        out[i, 0] = lm.x * width
+        out[i, 1] = lm.y * height
+    return out
@@ -0,0 +1,97 @@
+import time
+
+import cv2
+import numpy as np
+
+
+def face_box(landmarks, frame_shape, margin=0.15):
+    """Integer (x1, y1, x2, y2) box around the landmarks, grown by margin and clipped to the frame."""
+    lo, hi = landmarks.min(axis=0), landmarks.max(axis=0)
+    pad = (hi - lo) * margin
+    h, w = frame_shape[:2]
+    x1, y1 = np.maximum(lo - pad, 0).astype(int)
+    x2, y2 = np.minimum(hi + pad, (w, h)).astype(int)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+class MotionGate:
+    """
+    Decides whether a frame differs enough from the last analysed one to be
+    worth running the detectors on. Frames are compared as small grayscale
+    thumbnails: one of the whole frame, and one of the face box when a face
+    is known, since a blink or yawn barely moves the whole-frame thumbnail.
+    Reuse is capped by max_frames and max_age so results are never stale
+    for long.
+    """
+
+    def __init__(self, threshold=3.0, face_threshold=2.0, max_frames=8, max_age=0.5,
+                 size=(64, 48), face_size=(32, 32)):
+        self.threshold = threshold
+        self.face_threshold = face_threshold
+        self.max_frames = max_frames
+        self.max_age = max_age
+        self.size = size
+        self.face_size = face_size
+        self._buffers = {}
+        self._reference = None
+        self._face_reference = None
+        self._box = None
+        self._time = 0.0
+        self.reused = 0
+        self.diff = 0.0
+        self.face_diff = 0.0
+
+    def _thumbnail(self, key, image, size):
+        color = self._buffers.get(key)
+        if color is None or color.shape[2:] != image.shape[2:]:
+            color = self._buffers[key] = np.empty((size[1], size[0]) + image.shape[2:], dtype=np.uint8)
+            self._buffers[key + '_gray'] = np.empty((size[1], size[0]), dtype=np.uint8)
+        gray = self._buffers[key + '_gray']
+        # Decimate to ~2x the thumbnail first: INTER_AREA over a full HD frame costs milliseconds
+        step = max(1, min(image.shape[0] // (2 * size[1]), image.shape[1] // (2 * size[0])))
+        cv2.resize(image[::step, ::step], size, dst=color, interpolation=cv2.INTER_AREA)
+        if color.ndim == 3:
+            cv2.cvtColor(color, cv2.COLOR_BGR2GRAY, dst=gray)
+        else:
+            np.copyto(gray, color)
+        return gray
+
+    def check(self, frame, force=False, now=None) -> bool:
+        """True when the detectors should run on frame."""
+        now = time.monotonic() if now is None else now
+        thumb = self._thumbnail('frame', frame, self.size)
+        if not (force or self._reference is None or self.reused >= self.max_frames or now - self._time >= self.max_age):
+            self.diff = cv2.norm(thumb, self._reference, cv2.NORM_L1) / thumb.size
+            self.face_diff = 0.0
+            if self._box is not None:
+                face = self._face_thumbnail(frame, self._box)
+                self.face_diff = cv2.norm(face, self._face_reference, cv2.NORM_L1) / face.size
+            if self.diff <= self.threshold and self.face_diff <= self.face_threshold:
+                self.reused += 1
+                return False
+
+        if self._reference is None:
+            self._reference = np.empty_like(thumb)
+        np.copyto(self._reference, thumb)
+        self._time = now
+        self.reused = 0
+        return True
+
+    def set_face(self, frame, box):
+        """Record the face box found in the frame just analysed; None when there was no face."""
+        self._box = box
+        if box is not None:
+            face = self._face_thumbnail(frame, box)
+            if self._face_reference is None:
+                self._face_reference = np.empty_like(face)
+            np.copyto(self._face_reference, face)
+
+    def _face_thumbnail(self, frame, box):
+        x1, y1, x2, y2 = box
+        return self._thumbnail('face', frame[y1:y2, x1:x2], self.face_size)
+
+    def reset(self):
+        self._reference = None
+        self._box = None
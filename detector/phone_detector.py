@@ -1,11 +1,47 @@
+import threading
+
+import numpy as np
 from ultralytics import YOLO
 
 model = YOLO("models/yolov8n.pt")  # Use a fine-tuned version if possible
+# The model is shared by every Streamlit session thread; predict() is not thread-safe
+_model_lock = threading.Lock()
+
+def _has_phone(result):
+    for i in range(len(result.boxes.cls)):
+        if result.names[int(result.boxes.cls[i])] == 'cell phone':
+            return True
+    return False
+
+DEFAULT_IMGSZ = 640
 
-def detect_phone(frame):
-    results = model.predict(source=frame, conf=0.5, verbose=False)
+def _fit_imgsz(frame):
+    # YOLO upsamples anything smaller than imgsz, so cap it at the (possibly downscaled) input size
+    return min(DEFAULT_IMGSZ, -(-max(frame.shape[:2]) // 32) * 32)
+
+def detect_phone(frame, imgsz=None):
+    with _model_lock:
+        results = model.predict(source=frame, conf=0.5, imgsz=imgsz or _fit_imgsz(frame), verbose=False)
     for r in results:
-        for i in range(len(r.boxes.cls)):
-            if r.names[int(r.boxes.cls[i])] == 'cell phone':
-                return True
+        if _has_phone(r):
+            return True
     return False
+
+def detect_phone_scored(frame, imgsz=None):
+    """Cell phone boxes as an (N, 5) array: xyxy in the pixel coordinates of frame, then confidence."""
+    with _model_lock:
+        results = model.predict(source=frame, conf=0.5, imgsz=imgsz or _fit_imgsz(frame), verbose=False)
+    boxes = [r.boxes.xyxy[i].tolist() + [float(r.boxes.conf[i])] for r in results for i in range(len(r.boxes.cls))
+             if r.names[int(r.boxes.cls[i])] == 'cell phone']
+    return np.array(boxes, dtype=np.float32).reshape(-1, 5)
+
+def detect_phone_boxes(frame, imgsz=None):
+    """Cell phone boxes as an (N, 4) xyxy array in the pixel coordinates of frame."""
+    return detect_phone_scored(frame, imgsz)[:, :4]
+
+def detect_phone_batch(frames, imgsz=None):
+    """Run one batched YOLO call over several frames, returning a bool per frame."""
+    frames = list(frames)
+    with _model_lock:
+        results = model.predict(source=frames, conf=0.5, imgsz=imgsz or _fit_imgsz(frames[0]), verbose=False)
+    return [_has_phone(r) for r in results]
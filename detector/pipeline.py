@@ -0,0 +1,187 @@
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from detector.drowsiness import get_ear
+from detector.landmarks import LEFT_EYE, NUM_LANDMARKS, RIGHT_EYE, landmarks_to_array
+from detector.motion import face_box
+from detector.resolution import ResolutionPolicy
+from detector.yawn import YAWN_THRESHOLD, is_yawning
+
+EAR_THRESHOLD = 0.20
+
+
+@dataclass
+class FrameResult:
+    """Detector outputs for one frame."""
+    has_face: bool = False
+    ear: Optional[float] = None
+    mouth_ratio: float = 0.0
+    mouth_distance: float = 0.0
+    face_width: float = 0.0
+    drowsy: bool = False
+    yawning: bool = False
+    phone: bool = False
+    landmarks: Optional[np.ndarray] = None
+    phone_boxes: Optional[np.ndarray] = None
+    phone_confidence: Optional[float] = None  # best box's score, when the detector reports scores
+    reused: bool = False  # copied from the previous frame by the motion gate
+
+
+class MonitoringPipeline:
+    """
+    Face mesh -> EAR/yawn -> phone detection for a single frame, shared by the
+    live Streamlit loop and offline tools so they apply the same logic.
+    """
+
+    def __init__(self, face_mesh, phone_detector=None, ear_threshold=EAR_THRESHOLD, detect_phones=True,
+                 yawn_threshold=YAWN_THRESHOLD, reuse_landmarks=False, resolution=None, motion_gate=None):
+        self.face_mesh = face_mesh
+        self.resolution = resolution or ResolutionPolicy()
+        self.motion_gate = motion_gate
+        self._last = None
+        # With reuse_landmarks, result.landmarks is a buffer overwritten by the next process() call
+        self._landmarks = np.empty((NUM_LANDMARKS, 2)) if reuse_landmarks else None
+        if phone_detector is None and detect_phones:
+            from detector.phone_detector import detect_phone as phone_detector
+        self.phone_detector = phone_detector
+        self.phone_every = 1  # run phone detection on every Nth analysed frame, reusing the last answer between
+        self._phone_calls = 0
+        self._last_phone = (False, None, None)
+        self.ear_threshold = ear_threshold
+        self.yawn_threshold = yawn_threshold
+
+    @property
+    def phone_every(self):
+        return self._phone_every
+
+    @phone_every.setter
+    def phone_every(self, n):
+        # 0 or a negative value means every frame, as with the old EveryNth wrapper
+        self._phone_every = max(1, int(n))
+
+    def process(self, frame, rgb=None, timer=None, force=False) -> FrameResult:
+        """
+        Run all detectors on a BGR frame. rgb may be passed when the caller has
+        already converted it; timer is an optional metrics.FrameTimer. Results
+        are in the pixel coordinates of frame whatever the inference sizes.
+
+        With a motion gate, a frame that barely differs from the last analysed
+        one gets the previous result back (reused=True), unless force is set or
+        the last frame showed drowsiness or a yawn.
+        """
+        if self.motion_gate is None:
+            return self._detect(frame, rgb, timer)
+        last = self._last
+        episode_open = last is not None and (last.drowsy or last.yawning)
+        run = self.motion_gate.check(frame, force=force or episode_open)
+        if timer:
+            timer.lap('motion')
+        if not run:
+            return replace(last, reused=True)
+        result = self._last = self._detect(frame, rgb, timer)
+        self.motion_gate.set_face(frame, face_box(result.landmarks, frame.shape) if result.has_face else None)
+        return result
+
+    def _detect(self, frame, rgb, timer):
+        if rgb is None:
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = self.face_mesh.process(self.resolution.face_input(rgb))
+        if timer:
+            timer.lap('face_mesh')
+
+        result = FrameResult()
+        if results.multi_face_landmarks:
+            h, w = frame.shape[:2]
+            for face_landmarks in results.multi_face_landmarks:
+                self.score_landmarks(landmarks_to_array(face_landmarks, w, h, out=self._landmarks), result)
+        if timer:
+            timer.lap('ear_yawn')
+
+        if self.phone_detector is not None:
+            if self._phone_calls % self.phone_every == 0:
+                phone_frame, scale = self.resolution.phone_input(frame)
+                detection = self.phone_detector(phone_frame)
+                if isinstance(detection, np.ndarray):  # boxes from detect_phone_boxes, or with scores from detect_phone_scored
+                    scored = detection.shape[1] > 4
+                    confidence = (float(detection[:, 4].max()) if len(detection) else 0.0) if scored else None
+                    self._last_phone = (len(detection) > 0, detection[:, :4] * scale, confidence)
+                else:
+                    self._last_phone = (bool(detection), None, None)
+            self._phone_calls += 1
+            result.phone, result.phone_boxes, result.phone_confidence = self._last_phone
+        if timer:
+            timer.lap('phone')
+        return result
+
+    def score_landmarks(self, landmarks, result=None) -> FrameResult:
+        """
+        Apply the EAR and yawn detectors to one face's (N, 2) landmark array.
+        Called once per face on the same result, it keeps the lowest EAR and
+        the widest mouth, so the values match the alerts they raised.
+        """
+        result = result or FrameResult()
+        first_face = not result.has_face
+        result.has_face = True
+        result.landmarks = landmarks
+        ear = (get_ear(landmarks[LEFT_EYE]) + get_ear(landmarks[RIGHT_EYE])) / 2.0
+        if result.ear is None or ear < result.ear:
+            result.ear = ear
+        result.drowsy = result.drowsy or ear < self.ear_threshold
+        is_yawn, mouth_ratio, mouth_distance, face_width = is_yawning(landmarks, debug=True, threshold=self.yawn_threshold)
+        if first_face or mouth_ratio > result.mouth_ratio:
+            result.mouth_ratio, result.mouth_distance, result.face_width = mouth_ratio, mouth_distance, face_width
+        result.yawning = result.yawning or bool(is_yawn)
+        return result
+
+
+def draw_overlays(frame, result: FrameResult, mirror=False) -> None:
+    """Draw alert text and phone boxes; mirror=True when frame is the flipped display copy."""
+    if result.phone_boxes is not None:
+        w = frame.shape[1]
+        for x1, y1, x2, y2 in result.phone_boxes.astype(int):
+            if mirror:
+                x1, x2 = w - x2, w - x1
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
+    if result.drowsy:
+        cv2.putText(frame, "DROWSINESS ALERT", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
+    if result.yawning:
+        cv2.putText(frame, "YAWNING", (20, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 0, 0), 3)
+    if result.phone:
+        cv2.putText(frame, "MOBILE PHONE DETECTED", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 255), 3)
+
+
+def build_events(result: FrameResult, driver, trip_id, timestamp, detailed_yawn=False) -> List[Dict[str, Any]]:
+    """Ride documents for every detector that fired on this frame, as stored by log_ride."""
+    events = []
+    if result.drowsy:
+        events.append({
+            'timestamp': timestamp,
+            'event_type': 'Drowsiness',
+            'ear_value': round(result.ear, 3),
+            'driver': driver,
+            'trip_id': trip_id
+        })
+    if result.yawning:
+        if detailed_yawn:
+            details = f'Mouth ratio: {result.mouth_ratio:.3f}, dist: {result.mouth_distance:.1f}, width: {result.face_width:.1f}'
+        else:
+            details = 'Mouth distance exceeded threshold'
+        events.append({
+            'timestamp': timestamp,
+            'event_type': 'Yawning',
+            'details': details,
+            'driver': driver,
+            'trip_id': trip_id
+        })
+    if result.phone:
+        events.append({
+            'timestamp': timestamp,
+            'event_type': 'Phone Usage',
+            'details': 'Mobile phone detected in frame',
+            'driver': driver,
+            'trip_id': trip_id
+        })
+    return events
@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+
+class FramePreprocessor:
+    """
+    Per-frame colour conversion and display mirroring into buffers that are
+    allocated once and reused, so the steady-state loop does not allocate a
+    new image per frame. Detectors get the camera frame as captured (not
+    mirrored); only the display copy is flipped.
+    """
+
+    def __init__(self, mirror_display=True):
+        self.mirror_display = mirror_display
+        self._rgb = None
+        self._display = None
+
+    def _buffers(self, shape):
+        if self._rgb is None or self._rgb.shape != shape:
+            self._rgb = np.empty(shape, dtype=np.uint8)
+            self._display = np.empty(shape, dtype=np.uint8) if self.mirror_display else None
+
+    def __call__(self, frame, display=True):
+        """
+        Return (rgb, display) for a BGR frame; both stay valid until the next
+        call. With display=False the flip is skipped and display is None.
+        """
+        self._buffers(frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        if not display:
+            return self._rgb, None
+        if not self.mirror_display:
+            return self._rgb, frame
+        cv2.flip(frame, 1, dst=self._display)
+        return self._rgb, self._display
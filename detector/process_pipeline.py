@@ -0,0 +1,202 @@
+"""
+Multi-process variant of MonitoringPipeline.
+
+The capturing process copies each frame into a slot of a shared-memory ring
+and sends only the slot number to a face-mesh worker process and a phone
+worker process. Workers map the same ring and read the frame in place, so
+the two detectors run in parallel on separate cores, outside the GIL of the
+Streamlit process. Results come back on one queue as landmark arrays and
+booleans and are scored in the parent with the same EAR/yawn logic.
+"""
+import multiprocessing as mp
+import queue
+import weakref
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from detector.landmarks import landmarks_to_array
+from detector.pipeline import EAR_THRESHOLD, FrameResult, MonitoringPipeline
+from detector.yawn import YAWN_THRESHOLD
+
+
+class FrameRing:
+    """Fixed number of equally sized uint8 frame slots in one shared-memory block."""
+
+    def __init__(self, frame_shape, slots, name=None):
+        self.frame_shape = tuple(frame_shape)
+        self.slots = slots
+        size = slots * int(np.prod(self.frame_shape))
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.frames = np.ndarray((slots,) + self.frame_shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __getitem__(self, slot):
+        return self.frames[slot]
+
+    def close(self):
+        self.frames = None  # drop our view before closing the mapping
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # a caller still holds a slot view; the mapping goes when it does
+        if self.owner:
+            self.shm.unlink()
+
+
+def _default_face_mesh():
+    import mediapipe
+    return mediapipe.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+
+
+def _default_phone_detector():
+    from detector.phone_detector import detect_phone
+    return detect_phone
+
+
+def _face_worker(ring_name, frame_shape, slots, tasks, results, face_mesh_factory):
+    cv2.setNumThreads(1)
+    ring = FrameRing(frame_shape, slots, name=ring_name)
+    face_mesh = face_mesh_factory()
+    h, w = frame_shape[:2]
+    rgb = np.empty(frame_shape, dtype=np.uint8)
+    try:
+        for seq, slot in iter(tasks.get, None):
+            cv2.cvtColor(ring[slot], cv2.COLOR_BGR2RGB, dst=rgb)
+            output = face_mesh.process(rgb)
+            faces = [landmarks_to_array(f, w, h) for f in output.multi_face_landmarks or ()]
+            results.put((seq, 'face', faces))
+    finally:
+        ring.close()
+
+
+def _phone_worker(ring_name, frame_shape, slots, tasks, results, phone_detector_factory):
+    ring = FrameRing(frame_shape, slots, name=ring_name)
+    detect_phone = phone_detector_factory()
+    try:
+        for seq, slot in iter(tasks.get, None):
+            results.put((seq, 'phone', bool(detect_phone(ring[slot]))))
+    finally:
+        ring.close()
+
+
+def _shutdown(workers, task_queues, ring):
+    for tasks in task_queues:
+        tasks.put(None)
+    for worker in workers:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.terminate()
+    ring.close()
+
+
+class ProcessPipeline:
+    """
+    Drop-in for MonitoringPipeline.process() that runs face mesh and phone
+    detection in worker processes. For pipelining, submit() frames and get()
+    results in order; up to `slots` frames can be in flight.
+    """
+
+    def __init__(self, frame_shape, slots=4, detect_phones=True, ear_threshold=EAR_THRESHOLD,
+                 yawn_threshold=YAWN_THRESHOLD, face_mesh_factory=_default_face_mesh,
+                 phone_detector_factory=_default_phone_detector):
+        self.frame_shape = tuple(frame_shape)
+        self.scorer = MonitoringPipeline(None, ear_threshold=ear_threshold, yawn_threshold=yawn_threshold,
+                                         detect_phones=False)
+        self.ring = FrameRing(self.frame_shape, slots)
+        self.free = deque(range(slots))
+        self.pending = deque()  # (seq, slot) in submission order
+        self.partial = {}
+        self.held_slot = None
+        self.seq = 0
+        self.stages = ('face', 'phone') if detect_phones else ('face',)
+
+        ctx = mp.get_context("spawn")  # MediaPipe and torch are not fork-safe
+        self.results = ctx.Queue()
+        self.tasks = {stage: ctx.Queue() for stage in self.stages}
+        targets = {'face': (_face_worker, face_mesh_factory), 'phone': (_phone_worker, phone_detector_factory)}
+        self.workers = []
+        for stage in self.stages:
+            target, factory = targets[stage]
+            worker = ctx.Process(target=target, name=f"dms-{stage}", daemon=True,
+                                 args=(self.ring.name, self.frame_shape, slots, self.tasks[stage], self.results, factory))
+            worker.start()
+            self.workers.append(worker)
+        self._finalizer = weakref.finalize(self, _shutdown, self.workers, list(self.tasks.values()), self.ring)
+
+    def submit(self, frame) -> bool:
+        """Copy a BGR frame into a free slot and dispatch it; False if every slot is busy."""
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"frame shape {frame.shape} does not match the ring's {self.frame_shape}")
+        self._release_held()
+        if not self.free:
+            return False
+        slot = self.free.popleft()
+        np.copyto(self.ring[slot], frame)
+        self.seq += 1
+        self.pending.append((self.seq, slot))
+        self.partial[self.seq] = {}
+        for stage in self.stages:
+            self.tasks[stage].put((self.seq, slot))
+        return True
+
+    def get(self):
+        """
+        Result for the oldest submitted frame, as (frame, FrameResult). The frame
+        is a view of the ring slot and stays valid until the next submit() or get().
+        """
+        self._release_held()
+        seq, slot = self.pending[0]
+        while len(self.partial[seq]) < len(self.stages):
+            try:
+                done_seq, stage, value = self.results.get(timeout=1.0)
+            except queue.Empty:
+                dead = [w.name for w in self.workers if not w.is_alive()]
+                if dead:
+                    raise RuntimeError(f"inference worker(s) exited: {', '.join(dead)}")
+                continue
+            self.partial[done_seq][stage] = value
+        self.pending.popleft()
+        outputs = self.partial.pop(seq)
+        result = FrameResult()
+        for landmarks in outputs['face']:
+            self.scorer.score_landmarks(landmarks, result)
+        result.phone = outputs.get('phone', False)
+        self.held_slot = slot
+        return self.ring[slot], result
+
+    def process(self, frame, rgb=None, timer=None, force=False) -> FrameResult:
+        """Synchronous call with the same signature as MonitoringPipeline.process; every frame is analysed."""
+        while not self.submit(frame):
+            self.get()  # drain results nobody collected
+        while len(self.pending) > 1:
+            self.get()
+        _, result = self.get()
+        if timer:
+            timer.lap('inference')
+        return result
+
+    @property
+    def in_flight(self):
+        return len(self.pending)
+
+    def _release_held(self):
+        if self.held_slot is not None:
+            self.free.append(self.held_slot)
+            self.held_slot = None
+
+    def close(self):
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
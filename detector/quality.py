@@ -0,0 +1,126 @@
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    name: str
+    phone_every: int = 1                 # run phone detection on every Nth analysed frame
+    face_width: Optional[int] = None     # FaceMesh input width, None = full frame
+    phone_width: Optional[int] = None    # YOLO input width, None = full frame
+    display_fps: Optional[float] = None  # preview updates per second, None = every frame
+    overlays: bool = True                # alert text, phone boxes and debug output on the preview
+
+
+# Cheapest savings first: phone detection is the most expensive stage and the
+# least time-critical, the preview matters least of all.
+LEVELS = (
+    QualityLevel('full'),
+    QualityLevel('phone-every-3', phone_every=3),
+    QualityLevel('reduced-resolution', phone_every=3, face_width=480, phone_width=320),
+    QualityLevel('reduced-display', phone_every=3, face_width=480, phone_width=320, display_fps=5, overlays=False),
+    QualityLevel('minimal', phone_every=6, face_width=320, phone_width=320, display_fps=2, overlays=False),
+)
+
+
+def _narrower(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+class QualityController:
+    """
+    Steps through LEVELS to keep the monitoring loop at target_fps. The loop
+    reports how long each iteration took (excluding any deliberate idle time);
+    if the smoothed duration stays over the frame budget for degrade_after
+    seconds the controller drops a level, and once it has stayed under
+    headroom * budget for recover_after seconds it climbs back one. Climbing
+    back and immediately degrading again doubles the wait before the next
+    attempt, so the controller settles instead of oscillating.
+    """
+
+    def __init__(self, target_fps, levels=LEVELS, metrics=None, degrade_after=1.0, recover_after=5.0,
+                 headroom=0.7, max_recover_after=120.0):
+        self.budget = 1.0 / target_fps
+        self.levels = levels
+        self.metrics = metrics
+        self.degrade_after = degrade_after
+        self.base_recover_after = self.recover_after = recover_after
+        self.max_recover_after = max_recover_after
+        self.headroom = headroom
+        self.index = 0
+        self.smoothed = None
+        self._over_since = None
+        self._under_since = None
+        self._recovered_at = None
+        self._last_display = 0.0
+        self._publish()
+
+    @property
+    def level(self) -> QualityLevel:
+        return self.levels[self.index]
+
+    def update(self, frame_seconds, now=None) -> bool:
+        """Feed one loop iteration's duration; returns True when the level changed."""
+        now = time.monotonic() if now is None else now
+        self.smoothed = frame_seconds if self.smoothed is None else self.smoothed + 0.1 * (frame_seconds - self.smoothed)
+        if self.metrics:
+            self.metrics.set_gauge('loop_ms', round(self.smoothed * 1000, 2))
+
+        if self.smoothed > self.budget:
+            self._under_since = None
+            self._over_since = self._over_since or now
+            if now - self._over_since >= self.degrade_after and self.index < len(self.levels) - 1:
+                if self._recovered_at is not None and now - self._recovered_at < self.recover_after:
+                    self.recover_after = min(self.recover_after * 2, self.max_recover_after)
+                return self._step(+1, now)
+        elif self.smoothed < self.headroom * self.budget:
+            self._over_since = None
+            self._under_since = self._under_since or now
+            if now - self._under_since >= self.recover_after and self.index > 0:
+                self._recovered_at = now
+                return self._step(-1, now)
+        else:
+            self._over_since = self._under_since = None
+        if self._recovered_at is not None and now - self._recovered_at > self.max_recover_after:
+            self.recover_after = self.base_recover_after  # stable again: be quick to recover next time
+            self._recovered_at = None
+        return False
+
+    def _step(self, direction, now):
+        self.index += direction
+        self._over_since = self._under_since = None
+        self.smoothed = None  # judge the new level on its own frames
+        logger.info("Quality level %s -> %s (budget %.1f ms)", self.levels[self.index - direction].name,
+                    self.level.name, self.budget * 1000)
+        self._publish()
+        return True
+
+    def _publish(self):
+        if self.metrics:
+            self.metrics.set_gauge('quality_level', self.index)
+            self.metrics.labels['quality'] = self.level.name
+
+    def apply(self, pipeline, base: Optional[QualityLevel] = None):
+        """
+        Push the current level's detector settings into a MonitoringPipeline.
+        base holds the operator's own settings, which a level never makes
+        more expensive (e.g. a configured face width of 640 stays 640 at 'full').
+        """
+        level, base = self.level, base or self.levels[0]
+        pipeline.phone_every = max(level.phone_every, base.phone_every)
+        pipeline.resolution.face_width = _narrower(level.face_width, base.face_width)
+        pipeline.resolution.phone_width = _narrower(level.phone_width, base.phone_width)
+
+    def display_due(self, now=None) -> bool:
+        """Whether the preview should be refreshed this iteration under the current level."""
+        if self.level.display_fps is None:
+            return True
+        now = time.monotonic() if now is None else now
+        if now - self._last_display >= 1.0 / self.level.display_fps:
+            self._last_display = now
+            return True
+        return False
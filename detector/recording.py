@@ -0,0 +1,190 @@
+"""
+Compact landmark recordings for replaying detector sessions without video.
+
+File layout (little endian):
+    64-byte header   magic, version, landmark counts, frame count, frame size
+    uint16[n_stored] indices of the stored landmarks into the full mesh
+    padding to 8 bytes
+    records          one fixed-size record per frame (see record_dtype)
+
+Landmarks are stored as float16 offsets from the face centre divided by the
+face scale, so precision is relative to the face (~0.1 px) rather than the
+image. Fixed-size records make the whole file memory-mappable. The frame
+count in the header is only patched in on close; a recording whose writer
+crashed is read up to its last complete record.
+"""
+import os
+import struct
+
+import numpy as np
+
+from detector.landmarks import LEFT_EYE, RIGHT_EYE
+from detector.pipeline import FrameResult
+from detector.yawn import LOWER_LIP, UPPER_LIP
+
+MAGIC = b"DMSLMK1\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHHxxQff32x")
+NUM_MESH_LANDMARKS = 478
+# Just the points the EAR and yawn detectors read, for the smallest recordings
+DETECTOR_LANDMARKS = sorted(set(LEFT_EYE + RIGHT_EYE + UPPER_LIP + LOWER_LIP + [9, 10]))
+
+FLAG_FACE = 1
+FLAG_DROWSY = 2
+FLAG_YAWN = 4
+FLAG_PHONE = 8
+
+
+def record_dtype(n_stored):
+    return np.dtype([
+        ('t', '<f8'),
+        ('center', '<f4', (2,)),
+        ('scale', '<f4'),
+        ('landmarks', '<f2', (n_stored, 2)),
+        ('ear', '<f4'),
+        ('mouth_ratio', '<f4'),
+        ('flags', 'u1'),
+    ])
+
+
+def _data_offset(n_stored):
+    offset = HEADER.size + 2 * n_stored
+    return offset + (-offset) % 8
+
+
+class LandmarkRecorder:
+    """Append per-frame landmarks and detector outputs to a recording file."""
+
+    def __init__(self, path, frame_size=(0, 0), indices=None, n_landmarks=NUM_MESH_LANDMARKS, buffer_frames=256):
+        self.indices = np.arange(n_landmarks, dtype=np.uint16) if indices is None else np.asarray(indices, dtype=np.uint16)
+        self.n_landmarks = n_landmarks
+        self.frame_size = frame_size
+        self.dtype = record_dtype(len(self.indices))
+        self.buffer = np.zeros(buffer_frames, dtype=self.dtype)
+        self.buffered = 0
+        self.frames = 0
+        self.file = open(path, "wb")
+        self._write_header()
+        self.file.write(self.indices.tobytes())
+        self.file.write(b"\0" * (_data_offset(len(self.indices)) - HEADER.size - 2 * len(self.indices)))
+
+    def _write_header(self):
+        w, h = self.frame_size
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.n_landmarks, len(self.indices), self.frames, w, h))
+
+    def write(self, timestamp, result: FrameResult):
+        rec = self.buffer[self.buffered]
+        rec['t'] = timestamp
+        flags = 0
+        if result.has_face and result.landmarks is not None:
+            points = result.landmarks[self.indices]
+            lo, hi = points.min(axis=0), points.max(axis=0)
+            center = (lo + hi) / 2
+            scale = max(float((hi - lo).max()) / 2, 1e-6)
+            rec['center'] = center
+            rec['scale'] = scale
+            rec['landmarks'] = (points - center) / scale
+            rec['ear'] = result.ear
+            rec['mouth_ratio'] = result.mouth_ratio
+            flags |= FLAG_FACE
+        else:
+            rec['center'] = 0
+            rec['scale'] = 0
+            rec['landmarks'] = 0
+            rec['ear'] = np.nan
+            rec['mouth_ratio'] = 0
+        if result.drowsy:
+            flags |= FLAG_DROWSY
+        if result.yawning:
+            flags |= FLAG_YAWN
+        if result.phone:
+            flags |= FLAG_PHONE
+        rec['flags'] = flags
+        self.buffered += 1
+        self.frames += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        if self.buffered:
+            self.file.write(self.buffer[:self.buffered].tobytes())
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        # Patch the frame count now that it is known
+        self.file.seek(0)
+        self._write_header()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class LandmarkSession:
+    """Read-only, memory-mapped view of a recording."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, n_landmarks, n_stored, _frames, w, h = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a landmark recording")
+            if version != VERSION:
+                raise ValueError(f"Unsupported recording version {version}")
+            self.indices = np.frombuffer(f.read(2 * n_stored), dtype=np.uint16).astype(np.intp)
+        # Count the complete records on disk: a crashed writer's header still says 0 frames
+        # although its records were flushed, and a truncated file holds fewer than the header says
+        frames = max(0, os.path.getsize(path) - _data_offset(n_stored)) // record_dtype(n_stored).itemsize
+        self.path = path
+        self.n_landmarks = n_landmarks
+        self.frame_size = (w, h)
+        self.records = np.memmap(path, dtype=record_dtype(n_stored), mode="r",
+                                 offset=_data_offset(n_stored), shape=(frames,)) if frames else \
+            np.zeros(0, dtype=record_dtype(n_stored))
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def timestamps(self):
+        return self.records['t']
+
+    @property
+    def flags(self):
+        return self.records['flags']
+
+    @property
+    def has_face(self):
+        return (self.flags & FLAG_FACE) != 0
+
+    def landmarks(self, start=0, stop=None):
+        """
+        Pixel landmarks for frames [start, stop) as a float64 (n, n_landmarks, 2)
+        array. Landmarks that were not recorded are NaN.
+        """
+        rec = self.records[start:stop]
+        points = rec['landmarks'].astype(np.float64) * rec['scale'][:, None, None] + rec['center'][:, None, :]
+        if len(self.indices) == self.n_landmarks:
+            return points
+        full = np.full((len(rec), self.n_landmarks, 2), np.nan)
+        full[:, self.indices] = points
+        return full
+
+    def recorded_result(self, i) -> FrameResult:
+        rec = self.records[i]
+        flags = int(rec['flags'])
+        return FrameResult(
+            has_face=bool(flags & FLAG_FACE),
+            ear=float(rec['ear']) if flags & FLAG_FACE else None,
+            mouth_ratio=float(rec['mouth_ratio']),
+            drowsy=bool(flags & FLAG_DROWSY),
+            yawning=bool(flags & FLAG_YAWN),
+            phone=bool(flags & FLAG_PHONE),
+        )
@@ -0,0 +1,45 @@
+import os
+
+import cv2
+import numpy as np
+
+
+class ResolutionPolicy:
+    """
+    Inference widths for face mesh and phone detection (None = full frame).
+    Frames are downscaled with INTER_AREA into reusable buffers. FaceMesh
+    landmarks are normalised, so scaling them by the full frame size maps them
+    back to display coordinates for free; phone boxes are scaled back
+    explicitly.
+    """
+
+    def __init__(self, face_width=None, phone_width=None):
+        self.face_width = face_width
+        self.phone_width = phone_width
+        self._buffers = {}
+
+    @classmethod
+    def from_env(cls):
+        """DMS_FACE_WIDTH / DMS_PHONE_WIDTH, in pixels; unset or 0 keeps the full frame."""
+        return cls(int(os.environ.get("DMS_FACE_WIDTH", 0)) or None,
+                   int(os.environ.get("DMS_PHONE_WIDTH", 0)) or None)
+
+    def _resize(self, key, image, width):
+        h, w = image.shape[:2]
+        if not width or width >= w:
+            return image, np.ones(4)
+        size = (width, max(1, round(h * width / w)))
+        buffer = self._buffers.get(key)
+        if buffer is None or buffer.shape[:2] != (size[1], size[0]):
+            buffer = self._buffers[key] = np.empty((size[1], size[0]) + image.shape[2:], dtype=image.dtype)
+        cv2.resize(image, size, dst=buffer, interpolation=cv2.INTER_AREA)
+        sx, sy = w / size[0], h / size[1]
+        return buffer, np.array([sx, sy, sx, sy])
+
+    def face_input(self, rgb):
+        """The RGB image to give FaceMesh."""
+        return self._resize('face', rgb, self.face_width)[0]
+
+    def phone_input(self, frame):
+        """(image, scale): the BGR image for the phone detector, and the xyxy factor back to frame pixels."""
+        return self._resize('phone', frame, self.phone_width)
@@ -1,6 +1,10 @@
 import numpy as np
 
-def is_yawning(landmarks, debug=False):
+YAWN_THRESHOLD = 0.30
+UPPER_LIP = [13, 14, 15, 16]
+LOWER_LIP = [17, 18, 19, 20]
+
+def is_yawning(landmarks, debug=False, threshold=YAWN_THRESHOLD):
     """
     Robust yawn detection using MediaPipe face mesh landmarks.
     Uses the ratio of mouth opening to face size for better accuracy.
@@ -8,18 +12,16 @@ def is_yawning(landmarks, debug=False):
     """
     try:
         # Upper lip landmarks (average)
-        upper_lip_indices = [13, 14, 15, 16]
-        upper_lip = np.mean([landmarks[i] for i in upper_lip_indices], axis=0)
+        upper_lip = np.mean([landmarks[i] for i in UPPER_LIP], axis=0)
         # Lower lip landmarks (average)
-        lower_lip_indices = [17, 18, 19, 20]
-        lower_lip = np.mean([landmarks[i] for i in lower_lip_indices], axis=0)
+        lower_lip = np.mean([landmarks[i] for i in LOWER_LIP], axis=0)
         # Mouth opening
         mouth_distance = np.linalg.norm(upper_lip - lower_lip)
         # Face width for normalization (cheek to cheek)
         face_width = np.linalg.norm(landmarks[10] - landmarks[9])
         if face_width > 0:
             mouth_ratio = mouth_distance / face_width
-            is_yawn = mouth_ratio > 0.30
+            is_yawn = mouth_ratio > threshold
         else:
             mouth_ratio = 0
             is_yawn = mouth_distance > 50
@@ -29,4 +31,13 @@ def is_yawning(landmarks, debug=False):
     except (IndexError, ValueError, TypeError):
         if debug:
             return False, 0, 0, 0
-        return False
\ No newline at end of file
+        return False
+
+def mouth_ratio_batch(landmarks):
+    """Mouth ratio for an (N, L, 2) landmark array; 0 where the face width is 0."""
+    upper_lip = landmarks[:, UPPER_LIP].mean(axis=1)
+    lower_lip = landmarks[:, LOWER_LIP].mean(axis=1)
+    mouth_distance = np.linalg.norm(upper_lip - lower_lip, axis=-1)
+    face_width = np.linalg.norm(landmarks[:, 10] - landmarks[:, 9], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(face_width > 0, mouth_distance / face_width, 0.0)
@@ -0,0 +1,65 @@
+"""
+Series downsampling for charts, so long trips reach the browser as a few
+thousand points.
+
+minmax keeps the lowest and highest sample of every bucket, which preserves
+short spikes such as an EAR dip during a blink; all-NaN buckets stay NaN so
+gaps (no face) remain visible. lttb (Largest-Triangle-Three-Buckets) keeps
+the points that best preserve the visual shape of the curve.
+"""
+import numpy as np
+
+
+def minmax_indices(y, buckets):
+    """Sorted indices of each bucket's minimum and maximum of y."""
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    padded = np.full(size * buckets, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    missing = np.isnan(blocks)
+    base = np.arange(buckets) * size
+    lows = base + np.argmin(np.where(missing, np.inf, blocks), axis=1)
+    highs = base + np.argmax(np.where(missing, -np.inf, blocks), axis=1)
+    return np.unique(np.minimum(np.concatenate([lows, highs]), n - 1))
+
+
+def lttb_indices(x, y, threshold):
+    """Indices of the threshold points LTTB picks; NaN samples are never picked."""
+    valid = np.flatnonzero(np.isfinite(y))
+    if len(valid) < len(y):
+        return valid[lttb_indices(x[valid], y[valid], threshold)]
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket i covers [edges[i], edges[i + 1]); the first and last points are buckets of their own
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    counts = np.diff(np.append(edges, n))
+    # The third corner for bucket i is the mean of bucket i + 1 (the last point for the final bucket)
+    mean_x = np.add.reduceat(x, edges) / counts
+    mean_y = np.add.reduceat(y, edges) / counts
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        dx, dy = x[a] - mean_x[i + 1], mean_y[i + 1] - y[a]
+        area = np.abs(dx * (y[start:end] - y[a]) - (x[a] - x[start:end]) * dy)
+        a = indices[i + 1] = start + int(area.argmax())
+    return indices
+
+
+def downsample(x, y, points=2000, method="minmax"):
+    """(x, y) reduced to about `points` samples with 'minmax' or 'lttb'."""
+    if method == "lttb":
+        keep = lttb_indices(x, y, points)
+    elif method == "minmax":
+        keep = minmax_indices(y, max(1, points // 2))
+    else:
+        raise ValueError(f"unknown downsampling method {method!r}")
+    return x[keep], y[keep]
@@ -0,0 +1,161 @@
+"""
+The fleet manager's event table as a DataFrame that lives in the session.
+
+The first load reads every ride once. After that a refresh reads only the
+rides it hasn't seen since a short overlap before its _id watermark
+(db.RidePoller, so rides the agent or ingest_server logged late are not
+missed) into a small `recent` frame, which is folded into the large `base` frame only once it has grown
+to a tenth of its size, so a rerun costs about as much as the events logged
+since the previous one. event_type, driver and trip_id are categoricals
+shared by both frames: filters and counts work on their integer codes, and
+labels with icons are made per category instead of per row.
+"""
+import numpy as np
+import pandas as pd
+
+from db import RidePoller
+
+EVENT_ICONS = {
+    'Drowsiness': '😴',
+    'Yawning': '🥱',
+    'Phone Usage': '📱',
+    'Lane Change': '🛣️',
+    'Speed': '⚡'
+}
+CATEGORICAL = ('event_type', 'driver', 'trip_id')
+COLUMN_ORDER = ['timestamp', 'event_type', 'driver', 'details', 'ear_value', 'trip_id']
+DISPLAY_NAMES = {
+    'timestamp': '📅 Timestamp',
+    'event_type': 'Event Type',
+    'driver': '👤 Driver',
+    'details': '📝 Details',
+    'ear_value': '👁️ EAR Value',
+    'trip_id': '🚗 Trip ID'
+}
+PAGE_SIZE = 200_000
+DISPLAY_ROWS = 1000  # rows sent to the browser; the CSV export has every matching row
+MERGE_FRACTION = 0.1
+
+
+def format_event_type(event_type):
+    return f"{EVENT_ICONS.get(event_type, '⚠️')} {event_type}"
+
+
+def rides_frame(rides) -> pd.DataFrame:
+    """Typed frame for a list of ride documents: parsed timestamps and categorical labels."""
+    frame = pd.DataFrame(rides)
+    if '_id' in frame:
+        frame = frame.drop(columns='_id')
+    if 'timestamp' in frame:
+        frame['timestamp'] = pd.to_datetime(frame['timestamp'], format='%Y-%m-%d %H:%M:%S', errors='coerce')
+    for column in CATEGORICAL:
+        if column in frame:
+            frame[column] = frame[column].astype('string').astype('category')
+    return frame
+
+
+def _codes_mask(series, values):
+    # Compare integer codes instead of strings
+    wanted = series.cat.categories.get_indexer(list(values))
+    return np.isin(series.cat.codes.to_numpy(), wanted[wanted >= 0])
+
+
+class EventLog:
+    def __init__(self):
+        self.base = pd.DataFrame()
+        self.recent = pd.DataFrame()
+        self.poller = RidePoller(None, PAGE_SIZE)
+
+    def __len__(self):
+        return len(self.base) + len(self.recent)
+
+    @property
+    def parts(self):
+        return [part for part in (self.base, self.recent) if not part.empty]
+
+    def refresh(self):
+        """Read rides logged since the last refresh; returns how many were added."""
+        added = 0
+        for rides in self.poller.pages():
+            self._append(rides_frame(rides))
+            added += len(rides)
+        if len(self.recent) > MERGE_FRACTION * len(self.base):
+            self.base = self._concat(self.base, self.recent)
+            self.recent = pd.DataFrame()
+        return added
+
+    def _append(self, chunk):
+        reference = self.base if not self.base.empty else self.recent
+        for column in CATEGORICAL:
+            if column not in chunk or column not in reference:
+                continue
+            # New labels are appended to the categories, so existing codes stay valid and nothing is remapped
+            categories = reference[column].cat.categories
+            new = chunk[column].cat.categories.difference(categories)
+            if len(new):
+                categories = categories.append(new)
+                for part in (self.base, self.recent):
+                    if column in part:
+                        part[column] = part[column].cat.add_categories(new)
+            chunk[column] = chunk[column].cat.set_categories(categories)
+        self.recent = self._concat(self.recent, chunk)
+
+    @staticmethod
+    def _concat(first, second):
+        if first.empty:
+            return second
+        if second.empty:
+            return first
+        return pd.concat([first, second], ignore_index=True)
+
+    def labels(self, column):
+        """Sorted labels seen in a categorical column, for filter widgets."""
+        reference = self.base if not self.base.empty else self.recent
+        return sorted(reference[column].cat.categories) if column in reference else []
+
+    def _mask(self, part, drivers, event_types):
+        if not drivers and not event_types:
+            return slice(None)
+        mask = np.ones(len(part), dtype=bool)
+        if drivers and 'driver' in part:
+            mask &= _codes_mask(part['driver'], drivers)
+        if event_types and 'event_type' in part:
+            mask &= _codes_mask(part['event_type'], event_types)
+        return mask
+
+    def counts(self, drivers=None, event_types=None) -> dict:
+        """Matching events per event type."""
+        totals = {}
+        for part in self.parts:
+            if 'event_type' not in part:
+                continue
+            codes = part['event_type'].cat.codes.to_numpy()[self._mask(part, drivers, event_types)]
+            categories = part['event_type'].cat.categories
+            for name, count in zip(categories, np.bincount(codes[codes >= 0], minlength=len(categories))):
+                totals[name] = totals.get(name, 0) + int(count)
+        return totals
+
+    def filtered(self, drivers=None, event_types=None) -> pd.DataFrame:
+        """Every matching event, oldest first."""
+        parts = [part.iloc[self._mask(part, drivers, event_types)] for part in self.parts]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    def latest(self, rows, drivers=None, event_types=None) -> pd.DataFrame:
+        """Up to `rows` newest matching events, oldest first."""
+        taken = []
+        for part in reversed(self.parts):
+            matches = part.iloc[self._mask(part, drivers, event_types)].iloc[-(rows - sum(map(len, taken))):]
+            taken.insert(0, matches)
+            if sum(map(len, taken)) >= rows:
+                break
+        return pd.concat(taken, ignore_index=True) if taken else pd.DataFrame()
+
+    @staticmethod
+    def display(frame) -> pd.DataFrame:
+        """Newest first, with the dashboard's column order, names and icons."""
+        frame = frame.iloc[::-1]
+        existing = [c for c in COLUMN_ORDER if c in frame.columns]
+        frame = frame[existing + [c for c in frame.columns if c not in existing]]
+        if 'event_type' in frame:
+            frame = frame.assign(event_type=frame['event_type'].cat.rename_categories(format_event_type))
+        return frame.rename(columns=DISPLAY_NAMES)
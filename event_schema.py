@@ -0,0 +1,292 @@
+"""
+Compact storage format for ride documents.
+
+db.py encodes every ride it writes and decodes every ride it reads, so the
+rest of the app (generate_trip_pdf, the dashboards, risk scores) keeps
+seeing the familiar documents:
+
+    {'timestamp': '2024-01-01 08:00:00', 'event_type': 'Yawning', 'driver': 'alice',
+     'trip_id': '65a1...', 'details': 'Mouth ratio: 0.412, dist: 31.5, width: 120.2'}
+
+while MongoDB stores
+
+    {'t': datetime(2024, 1, 1, 8), 'e': 2, 'u': 7, 'r': ObjectId('65a1...'),
+     'dc': 3, 'mr': 0.412, 'md': 31.5, 'fw': 120.2}
+
+Event types and the fixed details texts become small integer codes, the
+formatted details are split into numbers and rebuilt on read, timestamps are
+BSON dates, trip ids are ObjectIds and drivers are integer codes kept in the
+'driver_codes' collection. Unknown fields are stored as they are, and
+documents written before this format (no 'e') are returned unchanged.
+
+    python event_schema.py --measure 1000000            # BSON sizes of both formats
+    python event_schema.py --measure 1000000 --mongo    # plus collection and index sizes from MongoDB
+    python event_schema.py --migrate                    # rewrite older rides in place
+"""
+import argparse
+import re
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import bson
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+EVENT_CODES = {'Drowsiness': 1, 'Yawning': 2, 'Phone Usage': 3, 'Lane Change': 4, 'Speed': 5}
+EVENT_NAMES = {code: name for name, code in EVENT_CODES.items()}
+
+# Plain renames; values are converted by the functions in _CONVERT
+FIELDS = {
+    'timestamp': 't',
+    'driver': 'u',
+    'trip_id': 'r',
+    'ear_value': 'ear',
+    'end_time': 'te',
+    'duration': 'du',
+    'frames': 'n',
+    'details': 'dt',
+}
+NAMES = {short: name for name, short in FIELDS.items()}
+
+_FLOAT = r'([-+]?(?:\d+(?:\.\d*)?|nan|inf))'
+# code -> (format, pattern, numeric fields); a details text that matches none is stored verbatim
+DETAILS = {
+    1: ('Mobile phone detected in frame', None, ()),
+    2: ('Mouth distance exceeded threshold', None, ()),
+    3: ('Mouth ratio: {mr:.3f}, dist: {md:.1f}, width: {fw:.1f}',
+        re.compile(rf'Mouth ratio: {_FLOAT}, dist: {_FLOAT}, width: {_FLOAT}'), ('mr', 'md', 'fw')),
+    4: ('Max mouth ratio: {mr:.3f}', re.compile(rf'Max mouth ratio: {_FLOAT}'), ('mr',)),
+}
+_FIXED_DETAILS = {text: code for code, (text, pattern, _) in DETAILS.items() if pattern is None}
+
+
+def _encode_time(value):
+    # fromisoformat is much faster than strptime; the length check keeps other layouts as strings
+    if isinstance(value, str) and len(value) == 19 and value[10] == ' ':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _decode_time(value):
+    # Same text as strftime('%Y-%m-%d %H:%M:%S'), several times faster
+    return value.isoformat(' ', 'seconds') if isinstance(value, datetime) else value
+
+
+# A trip's id repeats on all of its rides
+@lru_cache(maxsize=4096)
+def _encode_trip(value):
+    # Only ids that survive the round trip exactly; other trip ids ('batch', test names) stay strings
+    if isinstance(value, str) and len(value) == 24 and value == value.lower() and ObjectId.is_valid(value):
+        return ObjectId(value)
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _decode_trip(value):
+    return str(value) if isinstance(value, ObjectId) else value
+
+
+def _encode_details(text, doc):
+    code = _FIXED_DETAILS.get(text)
+    if code is not None:
+        doc['dc'] = code
+        return
+    for code, (template, pattern, keys) in DETAILS.items():
+        match = pattern and pattern.fullmatch(text)
+        if match:
+            values = dict(zip(keys, map(float, match.groups())))
+            if template.format(**values) == text:
+                doc['dc'] = code
+                doc.update(values)
+                return
+    doc['dt'] = text
+
+
+_CONVERT = {'t': (_encode_time, _decode_time), 'te': (_encode_time, _decode_time), 'r': (_encode_trip, _decode_trip)}
+
+
+class DriverCodes:
+    """
+    Two-way username <-> integer code map. Codes are handed out from a
+    counter and stored as {_id: code, username} in `collection`; with
+    collection=None they only live in memory (for measurements).
+    """
+
+    def __init__(self, collection=None):
+        self.collection = collection
+        self.codes = {}
+        self.names = {}
+        self._next = 1
+        self._indexed = False
+
+    def _remember(self, username, code):
+        self.codes[username] = code
+        self.names[code] = username
+        return code
+
+    def code(self, username):
+        """Code for a username, assigning a new one if it has none yet."""
+        code = self.codes.get(username)
+        if code is not None:
+            return code
+        if self.collection is None:
+            self._next += 1
+            return self._remember(username, self._next - 1)
+        if not self._indexed:
+            self.collection.create_index('username', unique=True)
+            self._indexed = True
+        doc = self.collection.find_one({'username': username})
+        if doc is None:
+            counter = self.collection.find_one_and_update({'_id': 'next'}, {'$inc': {'value': 1}}, upsert=True,
+                                                          return_document=ReturnDocument.AFTER)
+            try:
+                self.collection.insert_one({'_id': counter['value'], 'username': username})
+                return self._remember(username, counter['value'])
+            except DuplicateKeyError:
+                # Another process registered this driver first
+                doc = self.collection.find_one({'username': username})
+        return self._remember(username, doc['_id'])
+
+    def known_codes(self, usernames):
+        """Codes of the usernames that have one, without assigning new ones."""
+        missing = [u for u in usernames if u not in self.codes]
+        if missing and self.collection is not None:
+            for doc in self.collection.find({'username': {'$in': missing}}):
+                self._remember(doc['username'], doc['_id'])
+        return [self.codes[u] for u in usernames if u in self.codes]
+
+    def usernames(self, codes):
+        """Load the usernames of any codes not seen yet."""
+        missing = [c for c in set(codes) if c not in self.names]
+        if missing and self.collection is not None:
+            for doc in self.collection.find({'_id': {'$in': missing}}):
+                self._remember(doc['username'], doc['_id'])
+        return self.names
+
+
+def encode(event, driver_codes):
+    """Compact document for a ride in the familiar shape (which is left untouched)."""
+    if 'event_type' not in event or event['event_type'] not in EVENT_CODES:
+        return dict(event)
+    doc = {}
+    for key, value in event.items():
+        if key == 'event_type':
+            doc['e'] = EVENT_CODES[value]
+        elif key == 'driver' and isinstance(value, str):
+            doc['u'] = driver_codes.code(value)
+        elif key == 'details' and isinstance(value, str):
+            _encode_details(value, doc)
+        elif key in FIELDS:
+            short = FIELDS[key]
+            doc[short] = _CONVERT[short][0](value) if short in _CONVERT else value
+        else:
+            doc[key] = value
+    return doc
+
+
+def decode_many(docs, driver_codes):
+    """Rides in the familiar shape, in order; older documents pass through unchanged."""
+    docs = list(docs)
+    names = driver_codes.usernames([d['u'] for d in docs if 'e' in d and 'u' in d])
+    rides = []
+    for doc in docs:
+        if 'e' not in doc:
+            rides.append(doc)
+            continue
+        ride = {}
+        details = None
+        for key, value in doc.items():
+            if key == 'e':
+                ride['event_type'] = EVENT_NAMES.get(value, value)
+            elif key == 'u':
+                ride['driver'] = names.get(value, value)
+            elif key == 'dc':
+                details = value
+            elif key in ('mr', 'md', 'fw'):
+                continue
+            elif key in NAMES:
+                ride[NAMES[key]] = _CONVERT[key][1](value) if key in _CONVERT else value
+            else:
+                ride[key] = value
+        if details is not None:
+            template, _, keys = DETAILS[details]
+            ride['details'] = template.format(**{k: doc[k] for k in keys})
+        rides.append(ride)
+    return rides
+
+
+def driver_filter(driver_codes, usernames):
+    """Filter matching rides of these drivers in either format."""
+    return {'$or': [{'u': {'$in': driver_codes.known_codes(usernames)}}, {'driver': {'$in': list(usernames)}}]}
+
+
+def measure(count, mongo=False):
+    from bench import synthetic
+    rides = synthetic.rides(count)
+    codes = DriverCodes()
+    compact = [encode(ride, codes) for ride in rides]
+    for doc in rides + compact:
+        doc['_id'] = ObjectId()
+    legacy_bytes = sum(len(bson.encode(doc)) for doc in rides)
+    compact_bytes = sum(len(bson.encode(doc)) for doc in compact)
+    print(f"{count:,} rides, BSON bytes per document:")
+    print(f"  legacy  {legacy_bytes / count:7.1f}")
+    print(f"  compact {compact_bytes / count:7.1f}  ({1 - compact_bytes / legacy_bytes:.0%} smaller)")
+    if not mongo:
+        return
+    from db import db
+    print("MongoDB (collStats; storage is compressed):")
+    for name, docs, index in (('legacy', rides, 'driver'), ('compact', compact, 'u')):
+        collection = db[f'event_schema_measure_{name}']
+        collection.drop()
+        for start in range(0, count, 50_000):
+            collection.insert_many(docs[start:start + 50_000], ordered=False)
+        collection.create_index([(index, ASCENDING), ('_id', ASCENDING)])
+        stats = db.command('collStats', collection.name)
+        print(f"  {name:<8} avgObjSize {stats['avgObjSize']:6.0f} B  storage {stats['storageSize'] / 2**20:7.1f} MiB"
+              f"  indexes {stats['totalIndexSize'] / 2**20:6.1f} MiB")
+        collection.drop()
+
+
+def migrate(batch_size=5000):
+    """Rewrite rides stored in the older format, keeping their _id."""
+    from pymongo import ReplaceOne
+    from db import driver_codes, ensure_indexes, rides_col
+    ensure_indexes()
+    converted = 0
+    while True:
+        batch = list(rides_col.find({'e': {'$exists': False}, 'event_type': {'$in': list(EVENT_CODES)}}).limit(batch_size))
+        if not batch:
+            # The full (driver, _id) index of earlier versions is replaced by a partial one
+            if 'driver_id' in rides_col.index_information():
+                rides_col.drop_index('driver_id')
+            return converted
+        rides_col.bulk_write([ReplaceOne({'_id': doc['_id']}, encode(doc, driver_codes)) for doc in batch], ordered=False)
+        converted += len(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--measure", type=int, metavar="N", help="compare both formats on N synthetic rides")
+    parser.add_argument("--mongo", action="store_true", help="with --measure, also load both into MongoDB")
+    parser.add_argument("--migrate", action="store_true", help="convert stored rides to the compact format")
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        measure(args.measure, args.mongo)
+    if args.migrate:
+        started = time.perf_counter()
+        print(f"Converted {migrate():,} rides in {time.perf_counter() - started:.1f}s")
+    if not args.measure and not args.migrate:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
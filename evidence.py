@@ -0,0 +1,216 @@
+"""
+Short video clips around alerts, kept as evidence for the fleet manager.
+
+The monitoring loop hands every frame to EvidenceRecorder.add(); a few times
+a second it is downscaled and JPEG-encoded into a ring buffer bounded both
+by duration and by bytes. When an alert fires, trigger() returns a clip
+reference straight away (to be stored on the event) and the clip is
+completed with the following seconds of frames. Assembling and storing the
+video happens on a background thread, and at most max_pending clips are in
+progress at once, so memory stays bounded and the loop never waits on disk
+or the database.
+
+    DMS_EVIDENCE=evidence/    # clips as files in this directory
+    DMS_EVIDENCE=gridfs       # clips in the database's 'evidence' GridFS bucket
+"""
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+import cv2
+import numpy as np
+
+EVIDENCE_TYPES = ('drowsiness', 'phone')
+GRIDFS_PREFIX = "gridfs:"
+
+
+class LocalClipStore:
+    """Clips as files in a directory; the reference is the file path."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def reference(self, name):
+        return os.path.join(self.directory, name)
+
+    def put(self, ref, data, metadata):
+        tmp = f"{ref}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, ref)
+
+    def get(self, ref):
+        with open(ref, "rb") as f:
+            return f.read()
+
+
+class GridFSClipStore:
+    """Clips in a GridFS bucket; the reference is 'gridfs:<file id>'."""
+
+    def __init__(self, database=None, bucket="evidence"):
+        import gridfs
+        if database is None:
+            from db import db as database
+        self.fs = gridfs.GridFS(database, collection=bucket)
+
+    def reference(self, name):
+        from bson import ObjectId
+        return f"{GRIDFS_PREFIX}{ObjectId()}"
+
+    def put(self, ref, data, metadata):
+        from bson import ObjectId
+        self.fs.put(data, _id=ObjectId(ref[len(GRIDFS_PREFIX):]), filename=metadata['filename'], metadata=metadata)
+
+    def get(self, ref):
+        from bson import ObjectId
+        return self.fs.get(ObjectId(ref[len(GRIDFS_PREFIX):])).read()
+
+
+def make_clip_store(spec):
+    """'gridfs' for the database, anything else is a directory."""
+    return GridFSClipStore() if spec == "gridfs" else LocalClipStore(spec)
+
+
+def read_clip(ref, store=None):
+    """Bytes of the clip behind an event's 'evidence' reference."""
+    if store is None:
+        store = GridFSClipStore() if ref.startswith(GRIDFS_PREFIX) else LocalClipStore(os.path.dirname(ref) or ".")
+    return store.get(ref)
+
+
+def encode_clip(frames, fps, fourcc="MJPG", suffix=".avi"):
+    """Decode (timestamp, jpeg) frames and write them as one video; returns the file's bytes."""
+    first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+    h, w = first.shape[:2]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, (w, h))
+        if not writer.isOpened():
+            raise RuntimeError(f"no {fourcc} encoder available")
+        writer.write(first)
+        for _, jpeg in frames[1:]:
+            writer.write(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+        writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+class _Clip:
+    def __init__(self, ref, alert_type, metadata, frames, until):
+        self.ref = ref
+        self.alert_type = alert_type
+        self.metadata = metadata
+        self.frames = frames
+        self.until = until
+
+
+class EvidenceRecorder:
+    """
+    Ring buffer of JPEG frames plus a background clip writer. pre_seconds of
+    frames before the trigger and post_seconds after it go into each clip.
+    """
+
+    def __init__(self, store, pre_seconds=5.0, post_seconds=3.0, fps=5.0, width=320, quality=60,
+                 max_buffer_bytes=4 << 20, max_pending=2, alert_types=EVIDENCE_TYPES, metrics=None):
+        self.store = store
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.width = width
+        self.quality = quality
+        self.max_buffer_bytes = max_buffer_bytes
+        self.alert_types = alert_types
+        self.metrics = metrics
+        self.buffer = deque()
+        self.buffer_bytes = 0
+        self.collecting = []
+        self._next = 0.0
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="evidence-writer", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, metrics=None):
+        """Recorder for DMS_EVIDENCE, or None when evidence clips are off."""
+        spec = os.environ.get("DMS_EVIDENCE")
+        return cls(make_clip_store(spec), metrics=metrics) if spec else None
+
+    def add(self, frame, now=None):
+        """Offer one BGR frame; only every 1/fps seconds is one encoded and kept."""
+        now = time.time() if now is None else now
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        h, w = frame.shape[:2]
+        if w > self.width:
+            frame = cv2.resize(frame, (self.width, round(h * self.width / w)), interpolation=cv2.INTER_AREA
+                               if w >= 2 * self.width else cv2.INTER_LINEAR)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        item = (now, jpeg.tobytes())
+        self.buffer.append(item)
+        self.buffer_bytes += len(item[1])
+        while self.buffer and (self.buffer_bytes > self.max_buffer_bytes or self.buffer[0][0] < now - self.pre_seconds):
+            self.buffer_bytes -= len(self.buffer.popleft()[1])
+        # Clips share the encoded bytes with the buffer, so this costs a reference per frame
+        for clip in list(self.collecting):
+            clip.frames.append(item)
+            if now >= clip.until:
+                self.collecting.remove(clip)
+                self._queue.put(clip)
+
+    def trigger(self, alert_type, driver=None, trip_id=None, now=None):
+        """
+        Start a clip for an alert that just fired. Returns the reference to
+        store on the event, or None if the type isn't recorded or too many
+        clips are already in progress.
+        """
+        if alert_type not in self.alert_types or not self.buffer:
+            return None
+        if not self._slots.acquire(blocking=False):
+            if self.metrics:
+                self.metrics.increment('evidence_dropped')
+            return None
+        now = time.time() if now is None else now
+        name = f"{driver or 'driver'}_{alert_type}_{int(now)}_{uuid.uuid4().hex[:6]}.avi"
+        metadata = {'filename': name, 'alert_type': alert_type, 'driver': driver, 'trip_id': trip_id,
+                    'triggered_at': now}
+        clip = _Clip(self.store.reference(name), alert_type, metadata, list(self.buffer), now + self.post_seconds)
+        self.collecting.append(clip)
+        return clip.ref
+
+    def _run(self):
+        for clip in iter(self._queue.get, None):
+            try:
+                data = encode_clip(clip.frames, self.fps)
+                clip.metadata['frames'] = len(clip.frames)
+                self.store.put(clip.ref, data, clip.metadata)
+                if self.metrics:
+                    self.metrics.increment('evidence_clips')
+                    self.metrics.increment('evidence_bytes', len(data))
+            except Exception as e:
+                print(f"Evidence clip {clip.ref} failed: {e}")
+                if self.metrics:
+                    self.metrics.increment('evidence_failed')
+            finally:
+                clip.frames = None
+                self._slots.release()
+
+    def close(self):
+        """Write clips still collecting with what they have, then stop the writer."""
+        for clip in self.collecting:
+            self._queue.put(clip)
+        self.collecting = []
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,63 @@
+"""
+State behind the fleet manager's live board.
+
+Each manager session keeps a FleetBoard in st.session_state. A refresh
+reads the active trips (a partial index holds only running trips) and only
+the rides it hasn't seen since a short overlap before its _id watermark
+(db.RidePoller), so its cost follows the number of new events, not the size
+of the history. Change streams would
+avoid the polling but need a replica set, which a default mongod isn't.
+"""
+from collections import Counter
+
+from db import RidePoller, get_active_trips, get_latest_rides
+
+SEED_EVENTS = 50
+PAGE_SIZE = 1000
+
+
+class FleetBoard:
+    def __init__(self, drivers):
+        self.drivers = list(drivers)
+        self.poller = RidePoller(self.drivers, PAGE_SIZE)
+        self.active = {}
+        self.counts = {}  # (driver, trip_id) -> Counter of event types seen since the board opened
+        self.last_event = {}  # driver -> most recent ride
+
+    def refresh(self):
+        """Poll for changes; returns how many new rides were read."""
+        self.active = {trip['driver']: trip for trip in get_active_trips(self.drivers)}
+        if self.poller.watermark is None:
+            rides = get_latest_rides(self.drivers, SEED_EVENTS)
+            self.poller.mark_seen(rides)
+            self._apply(rides)
+            return len(rides)
+        seen = 0
+        for rides in self.poller.pages():
+            self._apply(rides)
+            seen += len(rides)
+        return seen
+
+    def _apply(self, rides):
+        for ride in rides:
+            driver = ride.get('driver')
+            self.counts.setdefault((driver, ride.get('trip_id')), Counter())[ride.get('event_type')] += 1
+            # A late ride from another writer mustn't replace a newer last event
+            last = self.last_event.get(driver)
+            if last is None or (ride.get('timestamp') or '') >= (last.get('timestamp') or ''):
+                self.last_event[driver] = ride
+
+    def tiles(self):
+        """One dict per driver on an active trip, most recently active first."""
+        tiles = []
+        for driver, trip in self.active.items():
+            last = self.last_event.get(driver)
+            tiles.append({
+                'driver': driver,
+                'route': f"{trip.get('start_point', '')} → {trip.get('destination', '')}",
+                'start_time': trip.get('start_time'),
+                'counts': dict(self.counts.get((driver, str(trip['_id'])), {})),
+                'last_event': last['event_type'] if last else None,
+                'last_time': last['timestamp'] if last else None,
+            })
+        return sorted(tiles, key=lambda t: t['last_time'] or '', reverse=True)
@@ -1,38 +1,13 @@
-import numpy as np
 import wave
-import struct
 
-def generate_alarm_sound(filename="alert.wav", duration=3, sample_rate=44100):
+from tones import SAMPLE_RATE, synthesize
+
+def generate_alarm_sound(filename="alert.wav", duration=3, sample_rate=SAMPLE_RATE, pattern='siren', severity=0):
     """
-    Generate a 3-second alarm sound with alternating high and low frequency tones
+    Generate an alarm sound file. The default is the 3-second siren
+    alternating between 800 Hz and 1200 Hz every 0.5 seconds.
     """
-    # Create time array
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    
-    # Create alternating frequency pattern (like a siren)
-    frequency1 = 800  # Hz
-    frequency2 = 1200  # Hz
-    
-    # Create the waveform - alternating between two frequencies every 0.5 seconds
-    wave_data = np.zeros_like(t)
-    
-    for i, time_val in enumerate(t):
-        # Alternate frequency every 0.5 seconds
-        if int(time_val * 2) % 2 == 0:
-            wave_data[i] = np.sin(2 * np.pi * frequency1 * time_val)
-        else:
-            wave_data[i] = np.sin(2 * np.pi * frequency2 * time_val)
-    
-    # Apply envelope to prevent clicking
-    envelope = np.ones_like(wave_data)
-    fade_samples = int(0.1 * sample_rate)  # 0.1 second fade
-    envelope[:fade_samples] = np.linspace(0, 1, fade_samples)
-    envelope[-fade_samples:] = np.linspace(1, 0, fade_samples)
-    
-    wave_data *= envelope
-    
-    # Normalize and convert to 16-bit integers
-    wave_data = np.int16(wave_data * 32767 * 0.5)  # 50% volume
+    wave_data = synthesize(pattern, severity, duration, sample_rate)
     
     # Save as WAV file
     with wave.open(filename, 'w') as wav_file:
@@ -44,4 +19,4 @@ def generate_alarm_sound(filename="alert.wav", duration=3, sample_rate=44100):
     print(f"Alarm sound saved as {filename}")
 
 if __name__ == "__main__":
-    generate_alarm_sound()
\ No newline at end of file
+    generate_alarm_sound()
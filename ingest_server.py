@@ -0,0 +1,284 @@
+"""
+Frame ingestion API for remote vehicles.
+
+    DMS_INGEST_TOKEN=<secret> python ingest_server.py --port 8600 --events mongo
+    python ingest_server.py --host 0.0.0.0 --vehicle-keys keys.json --events events.jsonl --face-workers 4
+
+Vehicles POST JPEG frames to /frames?vehicle=<id>&driver=<username>&trip_id=<id>
+with an "Authorization: Bearer <key>" header (and optionally X-Frame-Time
+carrying the capture time in unix seconds). The key is either the shared
+token (--token / DMS_INGEST_TOKEN) or the vehicle's own key from a
+--vehicle-keys JSON file of {"<vehicle id>": "<key>"}. The server listens on
+127.0.0.1 unless --host says otherwise. Frames from every vehicle share one InferenceServer, so face mesh
+runs on a worker pool and phone detection is micro-batched across vehicles.
+The response carries the frame's detections and any alarms that should sound
+in the cab; events are buffered and written in bulk through db.py.
+
+GET /health returns queue depths and the connected vehicles.
+"""
+import argparse
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import CancelledError
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from batch_analyze import make_writer
+from detector.alerts import ALERT_TYPES, AlertTimers
+from detector.inference_server import InferenceServer
+from detector.pipeline import build_events
+from metrics import registry as metrics_registry, start_exporters
+
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+VEHICLE_IDLE_SECONDS = 300
+
+
+class EventSink:
+    """Buffers events from all vehicles and writes them in batches from one thread."""
+
+    def __init__(self, writer, flush_interval=1.0, max_batch=500):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._events = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+        self._thread.start()
+
+    def add(self, events):
+        if not events:
+            return
+        with self._cond:
+            self._events.extend(events)
+            if len(self._events) >= self.max_batch:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._events) >= self.max_batch, self.flush_interval)
+                batch, self._events = self._events, []
+                closed = self._closed
+            if batch:
+                try:
+                    self.writer.write(batch)
+                except Exception as e:
+                    print(f"Failed to write {len(batch)} events: {e}")
+            if closed:
+                return
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.writer.close()
+
+
+class Vehicle:
+    def __init__(self, vehicle_id, driver, trip_id):
+        self.vehicle_id = vehicle_id
+        self.driver = driver
+        self.trip_id = trip_id
+        self.alerts = AlertTimers()
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+        self.metrics = metrics_registry.session(vehicle_id, driver=driver)
+
+
+class IngestService:
+    def __init__(self, inference, sink, detailed_yawn=False, token=None, vehicle_keys=None):
+        self.inference = inference
+        self.sink = sink
+        self.detailed_yawn = detailed_yawn
+        self.token = token
+        self.vehicle_keys = vehicle_keys or {}
+        self.vehicles = {}
+        self._lock = threading.Lock()
+
+    def authorized(self, vehicle_id, authorization):
+        """Whether an Authorization header carries the shared token or this vehicle's key."""
+        scheme, _, key = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not key:
+            return False
+        expected = [k for k in (self.token, self.vehicle_keys.get(vehicle_id)) if k]
+        return any(hmac.compare_digest(key.encode(), k.encode()) for k in expected)
+
+    def vehicle(self, vehicle_id, driver, trip_id):
+        with self._lock:
+            vehicle = self.vehicles.get(vehicle_id)
+            if vehicle is None or (vehicle.driver, vehicle.trip_id) != (driver, trip_id):
+                vehicle = self.vehicles[vehicle_id] = Vehicle(vehicle_id, driver, trip_id)
+            elif time.monotonic() - vehicle.last_seen > self.inference.idle_seconds:
+                metrics_registry.register(vehicle.metrics)  # the inference server evicted it meanwhile
+            vehicle.last_seen = time.monotonic()
+            return vehicle
+
+    def prune(self):
+        cutoff = time.monotonic() - VEHICLE_IDLE_SECONDS
+        with self._lock:
+            idle = [v for v in self.vehicles.values() if v.last_seen < cutoff]
+            for vehicle in idle:
+                del self.vehicles[vehicle.vehicle_id]
+        for vehicle in idle:
+            self.inference.release(vehicle.vehicle_id)
+            metrics_registry.close_session(vehicle.vehicle_id)
+
+    def process(self, vehicle, jpeg, frame_time=None):
+        """Decode, detect and update alerts for one frame. Returns the response dict, or None if dropped."""
+        vehicle.metrics.increment('frames')
+        with vehicle.metrics.span('decode'):
+            frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("frame is not a decodable image")
+        with vehicle.metrics.span('inference'):
+            try:
+                result = self.inference.submit(vehicle.vehicle_id, frame).result()
+            except CancelledError:
+                return None
+
+        now = frame_time if frame_time is not None else time.time()
+        detected = {'drowsiness': result.drowsy, 'yawning': result.yawning, 'phone': result.phone}
+        with vehicle.lock:
+            alarms = [t for t in ALERT_TYPES if vehicle.alerts.update(t, detected[t], now)]
+        timestamp = datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+        self.sink.add(build_events(result, vehicle.driver, vehicle.trip_id, timestamp, detailed_yawn=self.detailed_yawn))
+        return {
+            'has_face': result.has_face,
+            'ear': round(float(result.ear), 3) if result.ear is not None else None,
+            'mouth_ratio': round(float(result.mouth_ratio), 3),
+            'drowsy': bool(result.drowsy),
+            'yawning': bool(result.yawning),
+            'phone': bool(result.phone),
+            'alarms': alarms,
+        }
+
+    def health(self):
+        return {'vehicles': len(self.vehicles), 'queues': self.inference.queue_depths()}
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: one connection per vehicle
+    service: IngestService = None
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/frames":
+            self._send(404, {'error': 'not found'})
+            return
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        driver = params.get('driver')
+        vehicle_id = params.get('vehicle', driver)
+        # Rejections below leave the body unread, which would corrupt the next request on this connection
+        if not self.service.authorized(vehicle_id, self.headers.get("Authorization")):
+            self.close_connection = True
+            self._send(401, {'error': 'missing or invalid key'})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_FRAME_BYTES:
+            self.close_connection = True
+            self._send(413 if length > MAX_FRAME_BYTES else 400, {'error': 'missing, malformed or oversized frame'})
+            return
+        jpeg = self.rfile.read(length)
+        if not driver:
+            self._send(400, {'error': 'driver is required'})
+            return
+        vehicle = self.service.vehicle(vehicle_id, driver, params.get('trip_id'))
+        try:
+            frame_time = self.headers.get("X-Frame-Time")
+            body = self.service.process(vehicle, jpeg, float(frame_time) if frame_time else None)
+        except ValueError as e:
+            self._send(400, {'error': str(e)})
+            return
+        except Exception as e:
+            # A face or phone worker failure re-raised from its future; answer so the vehicle keeps its connection
+            print(f"Frame from {vehicle.vehicle_id} failed: {e!r}", file=sys.stderr)
+            self._send(500, {'error': 'frame analysis failed'})
+            return
+        if body is None:
+            # Superseded by a newer frame from the same vehicle
+            self._send(200, {'dropped': True})
+            return
+        self._send(200, body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            self._send(200, self.service.health())
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (0.0.0.0 for every interface)")
+    parser.add_argument("--token", default=os.environ.get("DMS_INGEST_TOKEN"),
+                        help="shared key every vehicle may use (default DMS_INGEST_TOKEN)")
+    parser.add_argument("--vehicle-keys", help="JSON file mapping vehicle ids to their own keys")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--events", default="mongo", help="'mongo', or a .jsonl/.parquet path")
+    parser.add_argument("--face-workers", type=int, default=2)
+    parser.add_argument("--phone-batch", type=int, default=8, help="maximum frames per YOLO batch")
+    parser.add_argument("--batch-wait-ms", type=float, default=4.0, help="how long to wait to fill a phone batch")
+    parser.add_argument("--no-phone", action="store_true", help="skip phone detection")
+    parser.add_argument("--detailed-yawn", action="store_true", help="store mouth ratio details on yawn events")
+    parser.add_argument("--metrics-port", type=int, default=None, help="serve /metrics (default DMS_METRICS_PORT)")
+    args = parser.parse_args(argv)
+    vehicle_keys = {}
+    if args.vehicle_keys:
+        with open(args.vehicle_keys) as f:
+            vehicle_keys = json.load(f)
+    if not args.token and not vehicle_keys:
+        parser.error("set --token (or DMS_INGEST_TOKEN) or --vehicle-keys; frames are only accepted with a key")
+
+    start_exporters(port=args.metrics_port)
+    inference = InferenceServer(face_workers=args.face_workers, max_batch=args.phone_batch,
+                                batch_wait=args.batch_wait_ms / 1000, detect_phones=not args.no_phone)
+    sink = EventSink(make_writer(args.events))
+    IngestHandler.service = IngestService(inference, sink, detailed_yawn=args.detailed_yawn,
+                                          token=args.token, vehicle_keys=vehicle_keys)
+    server = ThreadingHTTPServer((args.host, args.port), IngestHandler)
+    server.daemon_threads = True
+
+    def prune_loop():
+        while True:
+            time.sleep(60)
+            IngestHandler.service.prune()
+    threading.Thread(target=prune_loop, name="vehicle-prune", daemon=True).start()
+
+    print(f"Accepting frames on http://{args.host}:{args.port}/frames")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        inference.close()
+        sink.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
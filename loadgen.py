@@ -0,0 +1,186 @@
+"""
+Load generator for ingest_server.py: replays local videos as simulated vehicles.
+
+    DMS_INGEST_TOKEN=<secret> python loadgen.py recordings/ --vehicles 8 --fps 10 --duration 30
+    python loadgen.py recordings/ --ramp 1:64 --fps 10     # find the sustained vehicle count
+
+Frames are JPEG-encoded once up front so the generator itself costs little
+CPU. Each vehicle holds one keep-alive connection and sends at --fps, waiting
+for each response like a real cab unit would. A vehicle count is "sustained"
+when every vehicle achieves at least 95% of the target rate and the p99
+round trip stays under --max-latency-ms.
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+import cv2
+
+from batch_analyze import find_videos
+from metrics import LatencyHistogram
+
+
+def load_frames(paths, max_frames, width, quality):
+    """JPEG-encode up to max_frames frames from the given videos, resized to width."""
+    frames = []
+    for path in find_videos(paths):
+        cap = cv2.VideoCapture(path)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if width and frame.shape[1] != width:
+                frame = cv2.resize(frame, (width, frame.shape[0] * width // frame.shape[1]))
+            ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                frames.append(jpeg.tobytes())
+        cap.release()
+        if len(frames) >= max_frames:
+            break
+    return frames
+
+
+class SimulatedVehicle(threading.Thread):
+    def __init__(self, index, url, frames, fps, deadline, token=None):
+        super().__init__(name=f"vehicle-{index}", daemon=True)
+        self.vehicle_id = f"sim-{index:03d}"
+        self.url = url
+        self.headers = {'Content-Type': 'image/jpeg'}
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+        # Stagger start positions so vehicles are not sending identical frames
+        self.frames = frames[index * 7 % len(frames):] + frames[:index * 7 % len(frames)]
+        self.interval = 1.0 / fps
+        self.deadline = deadline
+        self.latency = LatencyHistogram()
+        self.sent = self.dropped = self.errors = 0
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=10)
+        query = urlencode({'vehicle': self.vehicle_id, 'driver': self.vehicle_id, 'trip_id': f"loadgen-{self.vehicle_id}"})
+        next_send = time.monotonic()
+        i = 0
+        while time.monotonic() < self.deadline:
+            started = time.perf_counter_ns()
+            try:
+                conn.request("POST", f"/frames?{query}", body=self.frames[i % len(self.frames)],
+                             headers=dict(self.headers, **{'X-Frame-Time': str(time.time())}))
+                response = conn.getresponse()
+                body = json.loads(response.read())
+                if response.status != 200:
+                    self.errors += 1
+                elif body.get('dropped'):
+                    self.dropped += 1
+            except (OSError, http.client.HTTPException, ValueError):
+                self.errors += 1
+                conn.close()
+            self.latency.record_ns(time.perf_counter_ns() - started)
+            self.sent += 1
+            i += 1
+            next_send += self.interval
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_send = time.monotonic()  # fell behind: don't burst to catch up
+        conn.close()
+
+
+def run_load(url, frames, vehicles, fps, duration, token=None):
+    deadline = time.monotonic() + duration
+    sims = [SimulatedVehicle(i, url, frames, fps, deadline, token) for i in range(vehicles)]
+    started = time.monotonic()
+    for sim in sims:
+        sim.start()
+    for sim in sims:
+        sim.join()
+    elapsed = time.monotonic() - started
+
+    latency = LatencyHistogram()
+    for sim in sims:
+        latency.merge(sim.latency)
+    rates = [(sim.sent - sim.dropped - sim.errors) / elapsed for sim in sims]
+    return {
+        'vehicles': vehicles,
+        'target_fps': fps,
+        'min_fps': round(min(rates), 2),
+        'mean_fps': round(sum(rates) / len(rates), 2),
+        'frames': sum(sim.sent for sim in sims),
+        'dropped': sum(sim.dropped for sim in sims),
+        'errors': sum(sim.errors for sim in sims),
+        'latency_ms': latency.summary(),
+    }
+
+
+def sustained(result, max_latency_ms):
+    return (result['min_fps'] >= 0.95 * result['target_fps'] and not result['errors']
+            and result['latency_ms']['p99'] <= max_latency_ms)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files or directories to replay")
+    parser.add_argument("--url", default="http://localhost:8600")
+    parser.add_argument("--token", default=os.environ.get("DMS_INGEST_TOKEN"),
+                        help="ingest server key (default DMS_INGEST_TOKEN)")
+    parser.add_argument("--vehicles", type=int, default=4)
+    parser.add_argument("--ramp", help="min:max vehicle counts, doubling each step")
+    parser.add_argument("--fps", type=float, default=10.0, help="frames per second per vehicle")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--max-latency-ms", type=float, default=500.0)
+    parser.add_argument("--max-frames", type=int, default=300, help="frames to preload and loop over")
+    parser.add_argument("--width", type=int, default=640, help="resize frames to this width (0 keeps the source size)")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality")
+    parser.add_argument("--server-cores", type=int, default=os.cpu_count(),
+                        help="cores available to the server, for the vehicles-per-core figure")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.inputs, args.max_frames, args.width, args.quality)
+    if not frames:
+        print("No frames could be read from the inputs.")
+        return 1
+    url = urlparse(args.url)
+
+    if args.ramp:
+        low, high = (int(x) for x in args.ramp.split(":"))
+        counts = []
+        n = max(1, low)
+        while n <= high:
+            counts.append(n)
+            n *= 2
+    else:
+        counts = [args.vehicles]
+
+    results = []
+    best = 0
+    for n in counts:
+        result = run_load(url, frames, n, args.fps, args.duration, args.token)
+        result['sustained'] = sustained(result, args.max_latency_ms)
+        results.append(result)
+        if not args.json:
+            lat = result['latency_ms']
+            print(f"{n:>4} vehicles: {result['mean_fps']:.1f} fps/vehicle (min {result['min_fps']:.1f}), "
+                  f"p50 {lat['p50']:.0f} ms, p99 {lat['p99']:.0f} ms, dropped {result['dropped']}, "
+                  f"errors {result['errors']}{'' if result['sustained'] else '  NOT SUSTAINED'}")
+        if not result['sustained']:
+            break
+        best = n
+
+    summary = {'steps': results, 'sustained_vehicles': best,
+               'vehicles_per_core': round(best / args.server_cores, 2) if args.server_cores else None}
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"Sustained {best} vehicles at {args.fps:g} fps on {args.server_cores} cores "
+              f"({summary['vehicles_per_core']} vehicles/core)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
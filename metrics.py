@@ -0,0 +1,283 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Histogram layout: values are recorded in microseconds. Below 2**SUB_BITS
+# every value has its own bucket, above that each power of two is split into
+# 2**SUB_BITS linear sub-buckets, giving ~3% relative precision.
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_EXPONENT = 32
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    exponent = min(value.bit_length() - 1, MAX_EXPONENT)
+    sub = (value >> (exponent - SUB_BITS)) & (SUB_BUCKETS - 1)
+    return (exponent - SUB_BITS + 1) * SUB_BUCKETS + sub
+
+
+def _bucket_value(index: int) -> int:
+    """Upper bound (in microseconds) of the values stored in bucket index."""
+    if index < SUB_BUCKETS:
+        return index
+    exponent = index // SUB_BUCKETS + SUB_BITS - 1
+    sub = index % SUB_BUCKETS
+    return ((SUB_BUCKETS + sub + 1) << (exponent - SUB_BITS)) - 1
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of durations with constant-time recording."""
+
+    def __init__(self):
+        self.counts = [0] * ((MAX_EXPONENT - SUB_BITS + 2) * SUB_BUCKETS)
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record_ns(self, duration_ns: int) -> None:
+        us = duration_ns // 1000
+        self.counts[_bucket_index(us)] += 1
+        self.count += 1
+        self.total_us += us
+        if us > self.max_us:
+            self.max_us = us
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, n in enumerate(other.counts):
+            if n:
+                self.counts[index] += n
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, q: float) -> float:
+        """Return the q-quantile (0..1) in seconds."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(_bucket_value(index), self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def summary(self) -> Dict[str, float]:
+        result = {f"p{q * 100:g}": round(self.percentile(q) * 1000, 3) for q in QUANTILES}
+        result['count'] = self.count
+        result['mean'] = round(self.total_us / self.count / 1000, 3) if self.count else 0.0
+        result['max'] = round(self.max_us / 1000, 3)
+        return result
+
+
+class FrameTimer:
+    """Lap timer for one loop iteration: each lap() closes the current stage."""
+
+    __slots__ = ('metrics', 'start', 'last')
+
+    def __init__(self, metrics: "SessionMetrics"):
+        self.metrics = metrics
+        self.start = self.last = time.perf_counter_ns()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter_ns()
+        self.metrics.record(stage, now - self.last)
+        self.last = now
+
+    def done(self) -> float:
+        """Record the whole iteration; returns its duration in seconds."""
+        duration = time.perf_counter_ns() - self.start
+        self.metrics.end_frame(duration)
+        return duration / 1e9
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics: "SessionMetrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.stage, time.perf_counter_ns() - self.start)
+        return False
+
+
+class SessionMetrics:
+    """Per-stage latency histograms, counters and gauges for one monitoring session."""
+
+    def __init__(self, session_id: str, labels: Optional[Dict[str, str]] = None):
+        self.session_id = session_id
+        self.labels = dict(labels or {})
+        self.stages: Dict[str, LatencyHistogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.fps = 0.0
+        self._last_frame_end = None
+        self.updated = time.time()
+
+    def record(self, stage: str, duration_ns: int) -> None:
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = LatencyHistogram()
+        hist.record_ns(duration_ns)
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def start_frame(self) -> FrameTimer:
+        return FrameTimer(self)
+
+    def end_frame(self, duration_ns: int) -> None:
+        self.record('frame', duration_ns)
+        now = time.perf_counter_ns()
+        if self._last_frame_end is not None:
+            interval = (now - self._last_frame_end) / 1e9
+            if interval > 0:
+                # Exponentially weighted FPS over roughly the last 30 frames
+                self.fps += (1.0 / interval - self.fps) * (1 / 30 if self.fps else 1.0)
+        self._last_frame_end = now
+        self.counters['frames'] = self.counters.get('frames', 0) + 1
+        self.updated = time.time()
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            'session': self.session_id,
+            'labels': self.labels,
+            'fps': round(self.fps, 2),
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+            'stages_ms': {name: hist.summary() for name, hist in self.stages.items()},
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._sessions: Dict[str, SessionMetrics] = {}
+        self._lock = threading.Lock()
+
+    def session(self, session_id: str, **labels) -> SessionMetrics:
+        with self._lock:
+            metrics = self._sessions.get(session_id)
+            if metrics is None:
+                metrics = self._sessions[session_id] = SessionMetrics(session_id, labels)
+            return metrics
+
+    def register(self, metrics: SessionMetrics) -> None:
+        """Put a session that is still in use back after close_session, e.g. when an evicted client returns."""
+        with self._lock:
+            self._sessions[metrics.session_id] = metrics
+
+    def close_session(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def render_json(self) -> str:
+        return json.dumps([m.snapshot() for m in self.sessions()])
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE dms_stage_latency_seconds summary",
+            "# TYPE dms_fps gauge",
+            "# TYPE dms_counter_total counter",
+            "# TYPE dms_gauge gauge",
+        ]
+        for m in self.sessions():
+            base = {'session': m.session_id, **m.labels}
+            for stage, hist in list(m.stages.items()):
+                labels = {**base, 'stage': stage}
+                for q in QUANTILES:
+                    lines.append(f"dms_stage_latency_seconds{_labels({**labels, 'quantile': q})} {hist.percentile(q):.6f}")
+                lines.append(f"dms_stage_latency_seconds_sum{_labels(labels)} {hist.total_us / 1e6:.6f}")
+                lines.append(f"dms_stage_latency_seconds_count{_labels(labels)} {hist.count}")
+            lines.append(f"dms_fps{_labels(base)} {m.fps:.3f}")
+            for name, value in list(m.counters.items()):
+                lines.append(f"dms_counter_total{_labels({**base, 'name': name})} {value}")
+            for name, value in list(m.gauges.items()):
+                lines.append(f"dms_gauge{_labels({**base, 'name': name})} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Dict[str, object]) -> str:
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+registry = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = registry.render_json(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = registry.render_prometheus(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(port: Optional[int] = None, log_interval: Optional[float] = None) -> None:
+    """
+    Start the Prometheus endpoint and/or the periodic JSON log, once per process.
+    Defaults come from DMS_METRICS_PORT and DMS_METRICS_LOG_INTERVAL; unset means off.
+    """
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    port = port if port is not None else int(os.environ.get("DMS_METRICS_PORT", 0))
+    log_interval = log_interval if log_interval is not None else float(os.environ.get("DMS_METRICS_LOG_INTERVAL", 0))
+
+    if port:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+
+    if log_interval:
+        def log_loop():
+            while True:
+                time.sleep(log_interval)
+                for m in registry.sessions():
+                    logger.info(json.dumps(m.snapshot()))
+        threading.Thread(target=log_loop, name="metrics-log", daemon=True).start()
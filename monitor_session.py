@@ -0,0 +1,143 @@
+"""
+Camera and inference resources behind the driver dashboard's live monitor.
+
+A MonitorSession lives in st.session_state, so Streamlit reruns (toggling
+the camera, ending a trip, any other widget) reuse the loaded FaceMesh and
+phone detector instead of building them again. Stopping the camera only
+releases the capture device.
+"""
+import os
+import weakref
+from concurrent.futures import CancelledError
+
+import cv2
+
+from detector.inference_server import get_inference_server
+from detector.motion import MotionGate
+from detector.pipeline import MonitoringPipeline
+from detector.preprocess import FramePreprocessor
+from detector.process_pipeline import ProcessPipeline
+from detector.quality import QualityController, QualityLevel
+from detector.resolution import ResolutionPolicy
+from evidence import EvidenceRecorder
+from metrics import registry as metrics_registry
+from db import uses_mongo
+from risk import RiskTracker
+from telemetry import TelemetryRecorder
+
+
+def _release(resources, shared_server, client_id):
+    if resources.get('cap') is not None:
+        resources['cap'].release()
+    for name in ('pipeline', 'face_mesh', 'evidence', 'telemetry', 'risk'):
+        if resources.get(name) is not None:
+            resources[name].close()
+    if shared_server:
+        shared_server.release(client_id)
+    metrics_registry.close_session(client_id)
+
+
+class MonitorSession:
+    """
+    The capture device plus whichever pipeline the environment selects:
+    DMS_INFERENCE_SERVER=1 shares models across sessions, DMS_PROCESS_PIPELINE=1
+    runs them in worker processes, otherwise an in-process MonitoringPipeline.
+    """
+
+    def __init__(self, client_id, metrics, camera=0):
+        self.client_id = client_id
+        self.metrics = metrics
+        self.camera = camera
+        self.cap = None
+        self.pipeline = None
+        self.configured = None
+        self.shared_server = get_inference_server() if os.environ.get("DMS_INFERENCE_SERVER") == "1" else None
+        self.process_pipeline = not self.shared_server and os.environ.get("DMS_PROCESS_PIPELINE") == "1"
+        # DMS_TARGET_FPS: degrade phone rate, inference size and preview rate to hold this frame rate
+        target_fps = float(os.environ.get("DMS_TARGET_FPS", 0))
+        self.quality = QualityController(target_fps, metrics=metrics) if target_fps else None
+        self.preprocess = FramePreprocessor(mirror_display=True)
+        self.evidence = EvidenceRecorder.from_env(metrics=metrics)
+        self._resources = {'evidence': self.evidence}
+        self._finalizer = weakref.finalize(self, _release, self._resources, self.shared_server, client_id)
+
+    def open_camera(self):
+        """The capture device, opened on first use and after release_camera()."""
+        if self.cap is None or not self.cap.isOpened():
+            self.cap = self._resources['cap'] = cv2.VideoCapture(self.camera)
+            # The inference server drops the metrics of clients it evicts while the camera is off
+            metrics_registry.register(self.metrics)
+        # The process pipeline's frame ring is sized from the first frame instead (see analyse)
+        if not self.shared_server and not self.process_pipeline and self.pipeline is None:
+            self._build_pipeline()
+        return self.cap
+
+    def _build_pipeline(self):
+        import mediapipe as mp
+        from detector.phone_detector import detect_phone_scored
+        face_mesh = self._resources['face_mesh'] = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True)
+        # DMS_MOTION_GATE=1: reuse the last result while the scene is still
+        motion_gate = MotionGate(float(os.environ.get("DMS_MOTION_THRESHOLD", 3.0))) if os.environ.get("DMS_MOTION_GATE") == "1" else None
+        self.pipeline = MonitoringPipeline(face_mesh, detect_phone_scored, reuse_landmarks=True,
+                                           resolution=ResolutionPolicy.from_env(), motion_gate=motion_gate)
+        if self.quality:
+            self.configured = QualityLevel('configured', face_width=self.pipeline.resolution.face_width,
+                                           phone_width=self.pipeline.resolution.phone_width)
+            self.quality.apply(self.pipeline, self.configured)
+
+    def _for_trip(self, name, trip_id, factory):
+        # Per-trip helpers are replaced (and closed) when the session moves on to another trip
+        current = self._resources.get(name)
+        if current is None or current.trip_id != trip_id:
+            if current:
+                current.close()
+            current = self._resources[name] = factory()
+        return current
+
+    def telemetry(self, driver, trip_id):
+        """The trip's TelemetryRecorder at DMS_TELEMETRY_HZ (default 2; 0 turns telemetry off)."""
+        rate = float(os.environ.get("DMS_TELEMETRY_HZ", 2))
+        if not rate or not uses_mongo():
+            return None
+        return self._for_trip('telemetry', trip_id, lambda: TelemetryRecorder(driver, trip_id, rate=rate))
+
+    def risk(self, driver, trip_id):
+        """The trip's RiskTracker, or None with DMS_RISK=0 or a storage backend other than MongoDB."""
+        if os.environ.get("DMS_RISK") == "0" or not uses_mongo():
+            return None
+        return self._for_trip('risk', trip_id, lambda: RiskTracker(driver, trip_id))
+
+    def analyse(self, frame, rgb, timer, force=False):
+        """FrameResult for one frame, or None when the shared server superseded it with a newer one."""
+        if self.shared_server:
+            try:
+                result = self.shared_server.submit(self.client_id, frame, rgb).result()
+            except CancelledError:
+                return None
+            timer.lap('inference')
+            return result
+        if self.process_pipeline and (self.pipeline is None or self.pipeline.frame_shape != frame.shape):
+            # Cameras may report 0 or a different size in CAP_PROP_FRAME_*, so size the ring from real frames
+            if self.pipeline is not None:
+                self.pipeline.close()
+            self.pipeline = self._resources['pipeline'] = ProcessPipeline(frame.shape)
+        result = self.pipeline.process(frame, rgb, timer=timer, force=force)
+        if result.reused:
+            self.metrics.increment('reused_frames')
+        return result
+
+    def frame_done(self, frame_seconds):
+        """Feed the frame time to the quality controller and retune the pipeline if the level changed."""
+        if self.quality and self.quality.update(frame_seconds) and self.configured:
+            self.quality.apply(self.pipeline, self.configured)
+
+    def release_camera(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = self._resources['cap'] = None
+        if self.shared_server:
+            self.shared_server.release(self.client_id)
+
+    def close(self):
+        """Release the camera, unload the models and finish evidence clips, telemetry and risk episodes, e.g. when the trip ends."""
+        self._finalizer()
@@ -0,0 +1,101 @@
+"""
+Browser-side rendering of the live monitoring view.
+
+The preview is downscaled and JPEG-encoded here, at its own frame rate, so
+detection can run at full speed while the websocket carries only what a
+person can usefully watch. Alert cards are re-sent only when their state
+changes.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+ALERT_CARDS = {
+    'drowsiness': ("😴 Drowsiness Detected", "Please stay alert!"),
+    'yawning': ("🥱 Yawning Detected", "Take a break if needed!"),
+    'phone': ("📱 Phone Detected", "Focus on driving!"),
+}
+SAFE_CARD = ("✅ Alert", "Stay focused!")
+
+
+def _card_html(css_class, title, message):
+    return f"""
+    <div class="{css_class}">
+        <h3 style="margin: 0;">{title}</h3>
+        <p style="margin: 0.5rem 0; opacity: 0.9;">{message}</p>
+    </div>
+    """
+
+
+class PreviewRenderer:
+    """Throttled, downscaled JPEG preview for an st.empty() placeholder."""
+
+    def __init__(self, placeholder, max_fps=10.0, width=480, quality=70, metrics=None):
+        self.placeholder = placeholder
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.width = width
+        self.quality = quality
+        self.metrics = metrics
+        self._next = 0.0
+        self._buffer = None
+
+    @classmethod
+    def from_env(cls, placeholder, metrics=None):
+        """DMS_PREVIEW_FPS, DMS_PREVIEW_WIDTH and DMS_PREVIEW_QUALITY, defaulting to 10 fps, 480 px, 70."""
+        return cls(placeholder,
+                   max_fps=float(os.environ.get("DMS_PREVIEW_FPS", 10)),
+                   width=int(os.environ.get("DMS_PREVIEW_WIDTH", 480)),
+                   quality=int(os.environ.get("DMS_PREVIEW_QUALITY", 70)),
+                   metrics=metrics)
+
+    def due(self, now=None) -> bool:
+        """Whether the next show() would be sent; lets callers skip drawing for frames that won't be shown."""
+        now = time.monotonic() if now is None else now
+        return now >= self._next
+
+    def show(self, frame, now=None) -> bool:
+        """Encode and send a BGR frame if the frame-rate cap allows; returns True when sent."""
+        now = time.monotonic() if now is None else now
+        if now < self._next:
+            return False
+        # Stay on the cadence rather than drifting by however late this frame was
+        self._next = max(self._next + self.interval, now) if self._next else now + self.interval
+        h, w = frame.shape[:2]
+        if self.width and w > self.width:
+            size = (self.width, round(h * self.width / w))
+            if self._buffer is None or self._buffer.shape[:2] != (size[1], size[0]):
+                self._buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            # INTER_AREA is several times slower for mild, non-integer ratios where linear looks the same
+            interpolation = cv2.INTER_AREA if w >= 2 * self.width else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, size, dst=self._buffer, interpolation=interpolation)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        data = jpeg.tobytes()
+        self.placeholder.image(data, output_format="JPEG")
+        if self.metrics:
+            self.metrics.increment('preview_frames')
+            self.metrics.increment('preview_bytes', len(data))
+        return True
+
+
+class AlertCards:
+    """The three alert placeholders; update() only re-renders cards whose state changed."""
+
+    def __init__(self, placeholders):
+        self.placeholders = placeholders
+        self.state = {}
+
+    def update(self, **detected):
+        for alert_type, is_detected in detected.items():
+            is_detected = bool(is_detected)
+            if self.state.get(alert_type) == is_detected:
+                continue
+            self.state[alert_type] = is_detected
+            if is_detected:
+                html = _card_html("alert-card", *ALERT_CARDS[alert_type])
+            else:
+                html = _card_html("safe-card", *SAFE_CARD)
+            self.placeholders[alert_type].markdown(html, unsafe_allow_html=True)
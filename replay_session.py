@@ -0,0 +1,156 @@
+"""
+Replay recorded landmark sessions through the detector and alert logic.
+
+    python replay_session.py session.lmk                      # replay and compare to the recording
+    python replay_session.py session.lmk --check              # exit 1 if outputs drifted
+    python replay_session.py session.lmk --sweep-ear 0.15:0.30:0.01
+
+Recordings are produced by the live app (DMS_RECORD_DIR) or by
+batch_analyze.py --record-dir.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from detector.alerts import ALERT_TYPES, AlertTimers
+from detector.drowsiness import get_ear_batch
+from detector.landmarks import LEFT_EYE, RIGHT_EYE
+from detector.pipeline import EAR_THRESHOLD, FrameResult, MonitoringPipeline
+from detector.recording import FLAG_DROWSY, FLAG_PHONE, FLAG_YAWN, LandmarkSession
+from detector.yawn import YAWN_THRESHOLD, mouth_ratio_batch
+
+CHUNK_FRAMES = 4096
+
+
+def replay(session, ear_threshold=EAR_THRESHOLD, yawn_threshold=YAWN_THRESHOLD):
+    """
+    Feed every recorded frame through MonitoringPipeline.score_landmarks and the
+    alert timers, using the recorded timestamps. Phone detections cannot be
+    recomputed without video, so the recorded phone flags are reused.
+    """
+    pipeline = MonitoringPipeline(None, ear_threshold=ear_threshold, yawn_threshold=yawn_threshold, detect_phones=False)
+    alerts = AlertTimers()
+    n = len(session)
+    drowsy = np.zeros(n, dtype=bool)
+    yawning = np.zeros(n, dtype=bool)
+    alarms = dict.fromkeys(ALERT_TYPES, 0)
+    timestamps = session.timestamps
+    has_face = session.has_face
+    phone = (session.flags & FLAG_PHONE) != 0
+
+    for start in range(0, n, CHUNK_FRAMES):
+        landmarks = session.landmarks(start, start + CHUNK_FRAMES)
+        for j in range(len(landmarks)):
+            i = start + j
+            result = pipeline.score_landmarks(landmarks[j]) if has_face[i] else FrameResult()
+            drowsy[i], yawning[i] = result.drowsy, result.yawning
+            for alert_type, detected in (('drowsiness', result.drowsy), ('yawning', result.yawning), ('phone', phone[i])):
+                if alerts.update(alert_type, detected, timestamps[i]):
+                    alarms[alert_type] += 1
+    return {'drowsy': drowsy, 'yawning': yawning, 'phone': phone, 'alarms': alarms}
+
+
+def count_alarms(flags, timestamps):
+    alerts = AlertTimers(alert_types=('alert',))
+    return sum(alerts.update('alert', bool(f), t) for f, t in zip(flags, timestamps))
+
+
+def sweep(session, ear_thresholds=(), yawn_thresholds=()):
+    """
+    Detection and alarm counts per threshold. EAR and mouth ratio are computed
+    once for the whole session with vectorised kernels, so each extra threshold
+    only costs a comparison and an alert-timer pass.
+    """
+    timestamps = session.timestamps
+    has_face = session.has_face
+    rows = []
+    ear = np.full(len(session), np.inf)
+    ratio = np.zeros(len(session))
+    for start in range(0, len(session), CHUNK_FRAMES):
+        landmarks = session.landmarks(start, start + CHUNK_FRAMES)
+        face = has_face[start:start + len(landmarks)]
+        with np.errstate(divide='ignore', invalid='ignore'):  # frames without a face are all zeros
+            chunk_ear = (get_ear_batch(landmarks[:, LEFT_EYE]) + get_ear_batch(landmarks[:, RIGHT_EYE])) / 2.0
+        ear[start:start + len(landmarks)] = np.where(face, chunk_ear, np.inf)
+        ratio[start:start + len(landmarks)] = np.where(face, mouth_ratio_batch(landmarks), 0.0)
+    for threshold in ear_thresholds:
+        flags = ear < threshold
+        rows.append({'detector': 'drowsiness', 'threshold': round(float(threshold), 4),
+                     'frames': int(flags.sum()), 'alarms': count_alarms(flags, timestamps)})
+    for threshold in yawn_thresholds:
+        flags = ratio > threshold
+        rows.append({'detector': 'yawning', 'threshold': round(float(threshold), 4),
+                     'frames': int(flags.sum()), 'alarms': count_alarms(flags, timestamps)})
+    return rows
+
+
+def _range(spec):
+    start, stop, step = (float(x) for x in spec.split(":"))
+    return np.arange(start, stop + step / 2, step)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+")
+    parser.add_argument("--ear-threshold", type=float, default=EAR_THRESHOLD)
+    parser.add_argument("--yawn-threshold", type=float, default=YAWN_THRESHOLD)
+    parser.add_argument("--sweep-ear", help="start:stop:step")
+    parser.add_argument("--sweep-yawn", help="start:stop:step")
+    parser.add_argument("--check", action="store_true", help="fail if replayed detections differ from the recording")
+    parser.add_argument("--max-mismatch", type=float, default=0.005,
+                        help="tolerated fraction of differing frames (float16 rounding at the threshold)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    failed = False
+    report = []
+    for path in args.recordings:
+        session = LandmarkSession(path)
+        if args.sweep_ear or args.sweep_yawn:
+            rows = sweep(session,
+                         _range(args.sweep_ear) if args.sweep_ear else (),
+                         _range(args.sweep_yawn) if args.sweep_yawn else ())
+            report.append({'recording': path, 'sweep': rows})
+            if not args.json:
+                print(path)
+                for row in rows:
+                    print(f"  {row['detector']:<10} threshold={row['threshold']:<6} frames={row['frames']:<7} alarms={row['alarms']}")
+            continue
+
+        started = time.perf_counter()
+        out = replay(session, args.ear_threshold, args.yawn_threshold)
+        elapsed = time.perf_counter() - started
+        flags = session.flags
+        mismatches = {
+            'drowsiness': int((out['drowsy'] != ((flags & FLAG_DROWSY) != 0)).sum()),
+            'yawning': int((out['yawning'] != ((flags & FLAG_YAWN) != 0)).sum()),
+        }
+        n = len(session)
+        drifted = n and max(mismatches.values()) / n > args.max_mismatch
+        failed = failed or (args.check and drifted)
+        entry = {
+            'recording': path,
+            'frames': n,
+            'replay_fps': round(n / elapsed, 1) if elapsed else None,
+            'face_frames': int(session.has_face.sum()),
+            'detections': {'drowsiness': int(out['drowsy'].sum()), 'yawning': int(out['yawning'].sum()),
+                           'phone': int(out['phone'].sum())},
+            'alarms': out['alarms'],
+            'mismatches': mismatches,
+        }
+        report.append(entry)
+        if not args.json:
+            print(f"{path}: {n} frames replayed at {entry['replay_fps']} fps")
+            print(f"  detections {entry['detections']}  alarms {entry['alarms']}")
+            print(f"  mismatches vs recording {mismatches}{'  DRIFTED' if drifted else ''}")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+from datetime import datetime
+
+from fpdf import FPDF
+
+def generate_trip_pdf(trip, events):
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Set up colors (RGB values)
+    pdf.set_fill_color(102, 126, 234)  # Primary blue
+    pdf.set_text_color(255, 255, 255)  # White text
+    
+    # Header with gradient-like effect
+    pdf.set_font("Arial", 'B', 20)
+    pdf.cell(0, 15, txt="Driver Monitoring Trip Report", ln=True, align='C', fill=True)
+    
+    # Reset colors for content
+    pdf.set_fill_color(245, 245, 245)  # Light gray background
+    pdf.set_text_color(51, 51, 51)     # Dark gray text
+    
+    # Trip information section with colored background
+    pdf.ln(10)
+    pdf.set_font("Arial", 'B', 14)
+    pdf.set_fill_color(240, 248, 255)  # Alice blue background
+    pdf.cell(0, 10, txt="Trip Information", ln=True, fill=True)
+    pdf.ln(5)
+    
+    # Trip details with alternating row colors
+    pdf.set_font("Arial", '', 11)
+    details = [
+        ("Driver", trip['driver']),
+        ("Start Point", trip['start_point']),
+        ("Destination", trip['destination']),
+        ("Start Time", trip['start_time'])
+    ]
+    
+    if 'end_time' in trip:
+        details.append(("End Time", trip['end_time']))
+    
+    for i, (label, value) in enumerate(details):
+        # Alternate row colors
+        if i % 2 == 0:
+            pdf.set_fill_color(248, 250, 252)  # Very light blue
+        else:
+            pdf.set_fill_color(255, 255, 255)  # White
+        
+        pdf.cell(50, 8, txt=f"{label}:", ln=0, fill=True)
+        pdf.cell(0, 8, txt=value, ln=True, fill=True)
+    
+    # Events section
+    pdf.ln(10)
+    pdf.set_font("Arial", 'B', 14)
+    pdf.set_fill_color(255, 193, 7)  # Warning yellow background
+    pdf.set_text_color(51, 51, 51)   # Dark text
+    pdf.cell(0, 10, txt="Monitoring Events", ln=True, fill=True)
+    pdf.ln(5)
+    
+    if not events:
+        pdf.set_font("Arial", '', 11)
+        pdf.set_fill_color(240, 248, 255)  # Light blue background
+        pdf.cell(0, 8, txt="No events recorded - Safe driving!", ln=True, fill=True)
+    else:
+        # Event type color mapping
+        event_colors = {
+            'Drowsiness': (255, 99, 71),    # Tomato red
+            'Yawning': (255, 165, 0),       # Orange
+            'Phone Usage': (220, 20, 60),   # Crimson
+            'Lane Change': (138, 43, 226),  # Blue violet
+            'Speed': (255, 215, 0)          # Gold
+        }
+        
+        pdf.set_font("Arial", '', 10)
+        
+        for i, event in enumerate(events):
+            event_type = event.get('event_type', 'Unknown')
+            
+            # Get color for event type
+            if event_type in event_colors:
+                r, g, b = event_colors[event_type]
+                pdf.set_fill_color(r, g, b)
+                pdf.set_text_color(255, 255, 255)  # White text for colored backgrounds
+            else:
+                pdf.set_fill_color(200, 200, 200)  # Gray for unknown events
+                pdf.set_text_color(51, 51, 51)     # Dark text
+            
+            # Event header
+            timestamp = event.get('timestamp', '')
+            pdf.cell(0, 8, txt=f"* {event_type} - {timestamp}", ln=True, fill=True)
+            
+            # Event details
+            pdf.set_fill_color(255, 255, 255)  # White background for details
+            pdf.set_text_color(51, 51, 51)     # Dark text
+            
+            details_text = ""
+            if 'details' in event:
+                details_text += f"Details: {event['details']}"
+            if 'ear_value' in event:
+                if details_text:
+                    details_text += " | "
+                details_text += f"EAR: {event['ear_value']}"
+            
+            if details_text:
+                pdf.cell(0, 6, txt=details_text, ln=True, fill=True)
+            
+            pdf.ln(2)  # Small spacing between events
+    
+    # Summary section
+    pdf.ln(10)
+    pdf.set_font("Arial", 'B', 14)
+    pdf.set_fill_color(76, 175, 80)  # Green background
+    pdf.set_text_color(255, 255, 255)  # White text
+    pdf.cell(0, 10, txt="Trip Summary", ln=True, fill=True)
+    pdf.ln(5)
+    
+    pdf.set_font("Arial", '', 11)
+    pdf.set_fill_color(240, 248, 255)  # Light blue background
+    pdf.set_text_color(51, 51, 51)     # Dark text
+    
+    total_events = len(events)
+    event_counts = {}
+    for event in events:
+        event_type = event.get('event_type', 'Unknown')
+        event_counts[event_type] = event_counts.get(event_type, 0) + 1
+    
+    pdf.cell(0, 8, txt=f"Total Events: {total_events}", ln=True, fill=True)
+    
+    for event_type, count in event_counts.items():
+        pdf.cell(0, 8, txt=f"- {event_type}: {count} occurrence(s)", ln=True, fill=True)
+    
+    # Footer
+    pdf.ln(10)
+    pdf.set_font("Arial", '', 8)
+    pdf.set_text_color(128, 128, 128)  # Gray text
+    pdf.cell(0, 5, txt=f"Report generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align='C')
+    pdf.cell(0, 5, txt="Real-Time Driver Monitoring System", ln=True, align='C')
+    
+    return pdf.output(dest='S').encode('latin1')
@@ -0,0 +1,170 @@
+"""
+Accuracy-versus-latency report for face mesh and phone detection input sizes.
+
+    python resolution_report.py recordings/cab_cam_a.mp4 --face-widths full,640,480,320
+    python resolution_report.py recordings/ --phone-widths full,480,320 --stride 5 --json
+
+Every sampled frame is decoded once and run at full resolution (the
+reference) and at each candidate width. For face mesh the report gives the
+landmark error on the detector points in display pixels, the EAR error, and
+how often face/drowsy/yawn decisions agree with the reference; for phone
+detection, how often the decision agrees. Use it per camera model to pick
+DMS_FACE_WIDTH / DMS_PHONE_WIDTH.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from batch_analyze import find_videos
+from detector.pipeline import MonitoringPipeline
+from detector.recording import DETECTOR_LANDMARKS
+from detector.resolution import ResolutionPolicy
+
+
+def _widths(spec):
+    return [None if w in ("full", "0") else int(w) for w in spec.split(",")]
+
+
+def _label(width):
+    return "full" if width is None else str(width)
+
+
+class _Stats:
+    def __init__(self):
+        self.times = []
+        self.frames = 0
+        self.agree = {}
+        self.landmark_err = []
+        self.ear_err = []
+
+    def agreement(self, name, same):
+        hits, total = self.agree.get(name, (0, 0))
+        self.agree[name] = (hits + bool(same), total + 1)
+
+    def row(self, stage, width, reference_ms):
+        times = np.array(self.times) * 1000
+        row = {
+            'stage': stage,
+            'width': _label(width),
+            'frames': self.frames,
+            'median_ms': round(float(np.median(times)), 2) if len(times) else None,
+            'p95_ms': round(float(np.percentile(times, 95)), 2) if len(times) else None,
+        }
+        row['speedup'] = round(reference_ms / row['median_ms'], 2) if reference_ms and row['median_ms'] else None
+        for name, (hits, total) in self.agree.items():
+            row[f'{name}_agreement'] = round(hits / total, 4) if total else None
+        if self.landmark_err:
+            row['landmark_err_px'] = round(float(np.mean(self.landmark_err)), 2)
+            row['landmark_err_p95_px'] = round(float(np.percentile(self.landmark_err, 95)), 2)
+        if self.ear_err:
+            row['ear_abs_err'] = round(float(np.mean(self.ear_err)), 4)
+        return row
+
+
+def run(videos, face_widths, phone_widths, stride, max_frames):
+    import mediapipe as mp
+    if None not in face_widths:
+        face_widths = [None] + face_widths
+    if phone_widths and None not in phone_widths:
+        phone_widths = [None] + phone_widths
+    detect_phone_boxes = None
+    if phone_widths:
+        from detector.phone_detector import detect_phone_boxes
+
+    face_stats = {w: _Stats() for w in face_widths}
+    phone_stats = {w: _Stats() for w in phone_widths}
+    phone_policies = {w: ResolutionPolicy(phone_width=w) for w in phone_widths}
+    sampled = 0
+    for path in videos:
+        # Fresh tracking state per file, one FaceMesh per candidate width
+        face_meshes = {w: mp.solutions.face_mesh.FaceMesh(refine_landmarks=True) for w in face_widths}
+        pipelines = {w: MonitoringPipeline(face_meshes[w], detect_phones=False, resolution=ResolutionPolicy(face_width=w))
+                     for w in face_widths}
+        cap = cv2.VideoCapture(path)
+        index = -1
+        while sampled < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            if index % stride:
+                continue
+            sampled += 1
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            results = {}
+            for width in face_widths:
+                started = time.perf_counter()
+                results[width] = pipelines[width].process(frame, rgb)
+                face_stats[width].times.append(time.perf_counter() - started)
+                face_stats[width].frames += 1
+            reference = results[None]
+            for width in face_widths:
+                result, stats = results[width], face_stats[width]
+                stats.agreement('face', result.has_face == reference.has_face)
+                if not (result.has_face and reference.has_face):
+                    continue
+                stats.agreement('drowsy', result.drowsy == reference.drowsy)
+                stats.agreement('yawn', result.yawning == reference.yawning)
+                diff = result.landmarks[DETECTOR_LANDMARKS] - reference.landmarks[DETECTOR_LANDMARKS]
+                stats.landmark_err.extend(np.hypot(diff[:, 0], diff[:, 1]))
+                stats.ear_err.append(abs(result.ear - reference.ear))
+
+            detections = {}
+            for width in phone_widths:
+                started = time.perf_counter()
+                image, _ = phone_policies[width].phone_input(frame)
+                detections[width] = len(detect_phone_boxes(image)) > 0
+                phone_stats[width].times.append(time.perf_counter() - started)
+                phone_stats[width].frames += 1
+            for width in phone_widths:
+                phone_stats[width].agreement('phone', detections[width] == detections[None])
+        cap.release()
+        for face_mesh in face_meshes.values():
+            face_mesh.close()
+        if sampled >= max_frames:
+            break
+
+    rows = []
+    for stage, stats in (('face_mesh', face_stats), ('phone', phone_stats)):
+        if not stats:
+            continue
+        reference_ms = float(np.median(stats[None].times)) * 1000 if stats[None].times else None
+        rows.extend(stats[w].row(stage, w, reference_ms) for w in stats)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="video files or directories")
+    parser.add_argument("--face-widths", default="full,960,640,480,320")
+    parser.add_argument("--phone-widths", default="full,640,480,320")
+    parser.add_argument("--no-phone", action="store_true", help="only evaluate face mesh sizes")
+    parser.add_argument("--stride", type=int, default=3, help="evaluate every Nth frame")
+    parser.add_argument("--max-frames", type=int, default=600)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No video files found.")
+        return 1
+    rows = run(videos, _widths(args.face_widths), [] if args.no_phone else _widths(args.phone_widths),
+               max(1, args.stride), args.max_frames)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    for row in rows:
+        extras = "  ".join(f"{k}={v}" for k, v in row.items()
+                           if k not in ('stage', 'width', 'frames', 'median_ms', 'p95_ms', 'speedup'))
+        print(f"{row['stage']:<10} {row['width']:>5}  {row['median_ms']:>8} ms (p95 {row['p95_ms']})  "
+              f"x{row['speedup']}  {extras}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Tiered retention for rides.
+
+Rides older than a retention period move out of MongoDB into zstd-compressed
+Parquet files, one directory per month and driver:
+
+    archive/rides/month=2024-01/driver=alice/part-<first _id>-<last _id>.parquet
+
+so the live collection, and every query on it, only covers recent events.
+db.get_rides_for_driver() (which the reports and trip pages use) adds a
+driver's archived rides transparently; trips themselves stay in MongoDB.
+Files are written before the rides are deleted, and the last archived _id is
+recorded in the 'archive_state' collection, so an interrupted run is finished
+by the next one. Rows carry their _id, and duplicates are dropped on read.
+
+Archiving in small batches leaves many small files; compaction merges each
+partition's small files into one.
+
+    python retention.py --archive --days 90      # move rides older than 90 days
+    python retention.py --compact                # merge small files
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from glob import glob
+from urllib.parse import quote
+
+import pandas as pd
+from bson import ObjectId
+
+ARCHIVE_DIR = os.environ.get("DMS_ARCHIVE_DIR", "archive")
+RETENTION_DAYS = float(os.environ.get("DMS_RETENTION_DAYS", 90))
+BATCH_SIZE = 50_000
+SMALL_FILE_BYTES = 8 * 2**20
+COLUMNS = ['_id', 'timestamp', 'event_type', 'driver', 'trip_id', 'ear_value', 'details',
+           'end_time', 'duration', 'frames', 'evidence']
+STATE_ID = 'rides'
+
+
+def _missing(value):
+    return value is None or value is pd.NA or (isinstance(value, float) and value != value)
+
+
+def _partition_dir(root, month, driver):
+    return os.path.join(root, 'rides', f'month={month}', f'driver={quote(str(driver), safe="")}')
+
+
+def _to_frame(rides):
+    """Archive rows: the familiar columns plus any other fields as JSON in 'extra'."""
+    frame = pd.DataFrame(rides)
+    extra = [c for c in frame.columns if c not in COLUMNS]
+    frame = frame.reindex(columns=COLUMNS)
+    frame['_id'] = frame['_id'].astype(str)
+    for column in ('timestamp', 'event_type', 'driver', 'trip_id', 'details', 'end_time', 'evidence'):
+        frame[column] = frame[column].astype('string')
+    for column in ('ear_value', 'duration'):
+        frame[column] = frame[column].astype('float64')
+    frame['frames'] = frame['frames'].astype('Int64')
+    if extra:
+        rows = (pd.DataFrame(rides)[extra]).to_dict('records')
+        fields = [{k: v for k, v in r.items() if not _missing(v)} for r in rows]
+        frame['extra'] = pd.array([json.dumps(f, default=str) if f else None for f in fields], dtype='string')
+    else:
+        frame['extra'] = pd.array([None] * len(frame), dtype='string')
+    return frame
+
+
+def _write(frame, directory, name):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    # Written under a temporary name so readers never see a partial file
+    frame.to_parquet(path + '.tmp', index=False, compression='zstd')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def write_partitions(rides, root=ARCHIVE_DIR):
+    """Write decoded rides into their month/driver partitions; returns the files written."""
+    frame = _to_frame(rides)
+    months = frame['timestamp'].str.slice(0, 7)
+    # Rides without a usable timestamp go by the time in their _id
+    fallback = pd.Series([ObjectId(i).generation_time.strftime('%Y-%m') for i in frame['_id']], index=frame.index)
+    frame['_month'] = months.where(months.str.match(r'^\d{4}-\d{2}$', na=False), fallback)
+    paths = []
+    for (month, driver), part in frame.groupby(['_month', frame['driver'].fillna('unknown')], sort=False):
+        name = f"part-{part['_id'].iloc[0]}-{part['_id'].iloc[-1]}.parquet"
+        paths.append(_write(part.drop(columns='_month'), _partition_dir(root, month, driver), name))
+    return paths
+
+
+def _state_col():
+    from db import db
+    return db["archive_state"]
+
+
+def archive(days=RETENTION_DAYS, root=ARCHIVE_DIR, batch_size=BATCH_SIZE, now=None):
+    """Move rides inserted more than `days` ago into the archive; returns how many moved."""
+    from db import driver_codes, rides_col
+    from event_schema import decode_many
+    state = _state_col()
+    cutoff = ObjectId.from_datetime(datetime.fromtimestamp(time.time() if now is None else now, timezone.utc) - timedelta(days=days))
+    done = state.find_one({'_id': STATE_ID}) or {}
+    if done.get('archived_to'):
+        # Finish an interrupted run: these are already in files
+        rides_col.delete_many({'_id': {'$lte': done['archived_to']}})
+    moved = 0
+    while True:
+        docs = list(rides_col.find({'_id': {'$lt': cutoff}}).sort('_id', 1).limit(batch_size))
+        if not docs:
+            return moved
+        write_partitions(decode_many(docs, driver_codes), root)
+        last = docs[-1]['_id']
+        state.update_one({'_id': STATE_ID}, {'$set': {'archived_to': last}}, upsert=True)
+        rides_col.delete_many({'_id': {'$lte': last}})
+        moved += len(docs)
+
+
+def compact(root=ARCHIVE_DIR, small_bytes=SMALL_FILE_BYTES):
+    """Merge each partition's small files into one; returns how many files were merged away."""
+    removed = 0
+    for directory in sorted(glob(os.path.join(root, 'rides', 'month=*', 'driver=*'))):
+        small = [p for p in sorted(glob(os.path.join(directory, '*.parquet'))) if os.path.getsize(p) < small_bytes]
+        if len(small) < 2:
+            continue
+        frame = pd.concat([pd.read_parquet(p) for p in small], ignore_index=True)
+        frame = frame.drop_duplicates('_id').sort_values('_id', ignore_index=True)
+        _write(frame, directory, f"part-{frame['_id'].iloc[0]}-{frame['_id'].iloc[-1]}-{uuid.uuid4().hex[:8]}.parquet")
+        # Until these are gone a reader sees rows twice, which the _id dedup on read hides
+        for path in small:
+            os.remove(path)
+        removed += len(small) - 1
+    return removed
+
+
+@lru_cache(maxsize=256)
+def _read_file(path, mtime):
+    return pd.read_parquet(path)
+
+
+def _read(path):
+    # Archive files never change once written (compaction writes new ones), so they are cached
+    return _read_file(path, os.path.getmtime(path))
+
+
+def read_archived(driver=None, root=ARCHIVE_DIR):
+    """Archived rides (all, or one driver's), oldest first, in the shape db.py returns."""
+    pattern = os.path.join(root, 'rides', 'month=*', f'driver={quote(driver, safe="")}' if driver else 'driver=*', '*.parquet')
+    paths = sorted(glob(pattern))
+    if not paths:
+        return []
+    frame = pd.concat([_read(p) for p in paths], ignore_index=True)
+    frame = frame.drop_duplicates('_id').sort_values('_id', ignore_index=True)
+    rides = []
+    for row in frame.to_dict('records'):
+        ride = {k: v for k, v in row.items() if k != 'extra' and not _missing(v)}
+        ride['_id'] = ObjectId(ride['_id'])
+        if 'frames' in ride:
+            ride['frames'] = int(ride['frames'])
+        if not _missing(row['extra']):
+            ride.update(json.loads(row['extra']))
+        rides.append(ride)
+    return rides
+
+
+def with_archived(rides, driver=None, root=ARCHIVE_DIR):
+    """Archived rides followed by live ones, leaving out any that are in both."""
+    archived = read_archived(driver, root)
+    if not archived:
+        return rides
+    live = {r['_id'] for r in rides}
+    return [r for r in archived if r['_id'] not in live] + rides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", action="store_true", help="move old rides out of MongoDB")
+    parser.add_argument("--compact", action="store_true", help="merge small archive files")
+    parser.add_argument("--days", type=float, default=RETENTION_DAYS, help="retention period (default: DMS_RETENTION_DAYS or 90)")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="archive root (default: DMS_ARCHIVE_DIR or ./archive)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    if not args.archive and not args.compact:
+        parser.print_help()
+        return 0
+    if args.archive:
+        started = time.perf_counter()
+        moved = archive(args.days, args.dir, args.batch_size)
+        print(f"Archived {moved:,} rides older than {args.days:g} days in {time.perf_counter() - started:.1f}s")
+    if args.compact:
+        print(f"Compaction merged away {compact(args.dir):,} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Driver risk scores.
+
+Every episode adds a severity to its driver's score:
+
+    severity = type weight * (1 + duration / 10 s) * (1.5 at night, 22:00-06:00)
+
+and the score decays exponentially with a configurable half-life, so it
+reflects recent behaviour. A score is kept as (value, as-of time) in the
+'risk_scores' collection and updated in place with one atomic pipeline
+update per episode, so reading a manager's ranking costs one document per
+driver. Live sessions queue their episodes to a background thread, so an
+unreachable database never stalls monitoring. Per-frame ride documents are grouped into episodes the same way the
+agent's EpisodeTracker does.
+
+    python risk.py --backfill              # recompute every score from the rides collection
+    python risk.py --top 10                # print the riskiest drivers
+"""
+import argparse
+import math
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from detector.episodes import EpisodeTracker
+
+EVENT_WEIGHTS = {'Drowsiness': 3.0, 'Phone Usage': 2.0, 'Yawning': 1.0}
+DURATION_SCALE = 10.0  # seconds of episode that double its weight
+NIGHT_HOURS = (22, 6)
+NIGHT_FACTOR = 1.5
+HALF_LIFE_DAYS = 7.0
+EPISODE_GAP = 1.0  # seconds between per-frame rides that still belong to one episode
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+CLOSE_TIMEOUT = 10.0  # seconds close() waits for queued episodes
+
+_indexed = set()  # collections whose driver index this process already created
+_indexed_lock = threading.Lock()
+
+
+def _is_night(hour):
+    start, end = NIGHT_HOURS
+    return hour >= start or hour < end
+
+
+def severity(event_type, duration=0.0, hour=12):
+    """Score contribution of one episode, before decay."""
+    factor = NIGHT_FACTOR if _is_night(hour) else 1.0
+    return EVENT_WEIGHTS.get(event_type, 0.0) * (1.0 + (duration or 0.0) / DURATION_SCALE) * factor
+
+
+def _collection(collection):
+    if collection is not None:
+        return collection
+    from db import db
+    return db["risk_scores"]
+
+
+class RiskStore:
+    """Decayed per-driver scores, updated one episode at a time."""
+
+    def __init__(self, collection=None, half_life_days=HALF_LIFE_DAYS):
+        self.collection = _collection(collection)
+        self.rate = math.log(2) / (half_life_days * 86400)
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_index(self):
+        """Create the unique driver index, once per process and collection."""
+        key = getattr(self.collection, 'full_name', id(self.collection))
+        with _indexed_lock:
+            if key in _indexed:
+                return
+            self.collection.create_index('driver', unique=True)
+            _indexed.add(key)
+
+    def record(self, event):
+        """Add one episode-shaped event (timestamp, event_type, driver, optional duration)."""
+        self.ensure_index()
+        started = time.strptime(event['timestamp'], TIMESTAMP_FORMAT)
+        at = time.mktime(started)
+        value = severity(event['event_type'], event.get('duration', 0.0), started.tm_hour)
+        if not value:
+            return
+        # Bring the stored score and the new contribution to the later of the two times, then add
+        as_of = {'$max': [{'$ifNull': ['$as_of', at]}, at]}
+        self.collection.update_one({'driver': event['driver']}, [
+            {'$set': {'_as_of': as_of}},
+            {'$set': {
+                'score': {'$add': [
+                    {'$multiply': [{'$ifNull': ['$score', 0.0]},
+                                   {'$exp': {'$multiply': [-self.rate, {'$subtract': ['$_as_of', {'$ifNull': ['$as_of', at]}]}]}}]},
+                    {'$multiply': [value, {'$exp': {'$multiply': [-self.rate, {'$subtract': ['$_as_of', at]}]}}]},
+                ]},
+                'as_of': '$_as_of',
+                f"counts.{event['event_type']}": {'$add': [{'$ifNull': [f"$counts.{event['event_type']}", 0]}, 1]},
+            }},
+            {'$unset': '_as_of'},
+        ], upsert=True)
+
+    def record_many(self, events):
+        """Record several episodes; a failure is reported, not raised, so monitoring carries on."""
+        for event in events:
+            try:
+                self.record(event)
+            except Exception as e:
+                print(f"Risk score update for {event.get('driver')} failed (risk.py --backfill repairs it): {e}")
+
+    def record_async(self, events):
+        """Queue episodes for a background thread, so the caller never waits on the database."""
+        if not events:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name="risk-scores", daemon=True)
+                self._thread.start()
+        for event in events:
+            self._queue.put(event)
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            self.record_many([event])
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Write the queued episodes, giving up after timeout seconds."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f"Risk scores for {self._queue.qsize() - 1} episodes not written (risk.py --backfill repairs them)")
+
+    def scores(self, drivers=None, now=None):
+        """Current scores, riskiest first; drivers without a score are left out."""
+        now = time.time() if now is None else now
+        self.ensure_index()
+        query = {'driver': {'$in': list(drivers)}} if drivers is not None else {}
+        ranked = []
+        for doc in self.collection.find(query, {'_id': 0}):
+            ranked.append({
+                'driver': doc['driver'],
+                'score': doc['score'] * math.exp(-self.rate * max(0.0, now - doc['as_of'])),
+                'counts': doc.get('counts', {}),
+            })
+        return sorted(ranked, key=lambda r: r['score'], reverse=True)
+
+
+class RiskTracker:
+    """Feeds a live session's FrameResults into a RiskStore as episodes close."""
+
+    def __init__(self, driver, trip_id, store=None):
+        self.store = store or RiskStore()
+        self.episodes = EpisodeTracker(driver, trip_id, gap_seconds=EPISODE_GAP)
+        self.trip_id = trip_id
+
+    def update(self, result, now=None):
+        self.store.record_async(self.episodes.update(result, time.time() if now is None else now))
+
+    def close(self):
+        self.store.record_async(self.episodes.close())
+        self.store.close()
+
+
+def episodes_frame(rides: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapse rides into one row per episode (driver, event_type, start,
+    duration). Rows that already carry a duration (agent episodes) are kept
+    as they are; per-frame rows are joined while less than EPISODE_GAP apart.
+    """
+    rides = rides[rides['event_type'].isin(list(EVENT_WEIGHTS))]
+    rides = rides.assign(start=pd.to_datetime(rides['timestamp'], format=TIMESTAMP_FORMAT, errors='coerce'))
+    rides = rides.dropna(subset=['start', 'driver'])
+    if 'duration' not in rides:
+        rides = rides.assign(duration=np.nan)
+    episodes = rides[rides['duration'].notna()][['driver', 'event_type', 'start', 'duration']]
+    frames = rides[rides['duration'].isna()].sort_values(['driver', 'event_type', 'start'])
+    if len(frames):
+        gap = frames['start'].diff().dt.total_seconds()
+        new = (gap.isna() | (gap > EPISODE_GAP)
+               | (frames['driver'] != frames['driver'].shift())
+               | (frames['event_type'] != frames['event_type'].shift()))
+        grouped = frames.groupby(new.cumsum()).agg(driver=('driver', 'first'), event_type=('event_type', 'first'),
+                                                   start=('start', 'min'), end=('start', 'max'))
+        grouped['duration'] = (grouped['end'] - grouped['start']).dt.total_seconds()
+        episodes = pd.concat([episodes, grouped[['driver', 'event_type', 'start', 'duration']]], ignore_index=True)
+    return episodes
+
+
+def compute_scores(rides: pd.DataFrame, now=None, half_life_days=HALF_LIFE_DAYS) -> pd.DataFrame:
+    """Per-driver score as of `now` plus episode counts per type, from a rides frame."""
+    now = time.time() if now is None else now
+    episodes = episodes_frame(rides)
+    if episodes.empty:
+        return pd.DataFrame(columns=['driver', 'score', 'counts'])
+    hours = episodes['start'].dt.hour.to_numpy()
+    start, end = NIGHT_HOURS
+    night = (hours >= start) | (hours < end)
+    weights = episodes['event_type'].map(EVENT_WEIGHTS).to_numpy()
+    values = weights * (1.0 + episodes['duration'].to_numpy() / DURATION_SCALE) * np.where(night, NIGHT_FACTOR, 1.0)
+    # Timestamps are local wall-clock time
+    at = (episodes['start'] - pd.Timestamp(0)).dt.total_seconds().to_numpy() - time.localtime(now).tm_gmtoff
+    rate = math.log(2) / (half_life_days * 86400)
+    episodes = episodes.assign(score=values * np.exp(-rate * np.maximum(0.0, now - at)))
+    scores = episodes.groupby('driver')['score'].sum()
+    counts = episodes.groupby(['driver', 'event_type']).size().unstack(fill_value=0)
+    return pd.DataFrame({
+        'driver': scores.index,
+        'score': scores.to_numpy(),
+        'counts': [{k: int(v) for k, v in counts.loc[d].items() if v} for d in scores.index],
+    }).sort_values('score', ascending=False, ignore_index=True)
+
+
+def backfill(store, rides_collection=None, now=None):
+    """Replace every stored score with one recomputed from the full rides history."""
+    from pymongo import ReplaceOne
+    from db import driver_codes
+    from event_schema import decode_many
+    if rides_collection is None:
+        from db import rides_col as rides_collection
+    now = time.time() if now is None else now
+    store.ensure_index()
+    # Fields in both the compact and the older ride format
+    docs = rides_collection.find({}, {'_id': 0, 'driver': 1, 'event_type': 1, 'timestamp': 1, 'duration': 1,
+                                      'u': 1, 'e': 1, 't': 1, 'du': 1})
+    rides = pd.DataFrame(decode_many(docs, driver_codes))
+    if rides.empty:
+        store.collection.delete_many({})
+        return 0
+    half_life_days = math.log(2) / store.rate / 86400
+    scores = compute_scores(rides, now, half_life_days)
+    store.collection.bulk_write([
+        ReplaceOne({'driver': row.driver}, {'driver': row.driver, 'score': float(row.score), 'as_of': now, 'counts': row.counts},
+                   upsert=True)
+        for row in scores.itertuples()
+    ], ordered=False)
+    store.collection.delete_many({'driver': {'$nin': scores['driver'].tolist()}})
+    return len(scores)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", help="recompute all scores from the rides collection")
+    parser.add_argument("--half-life-days", type=float, default=HALF_LIFE_DAYS)
+    parser.add_argument("--top", type=int, default=20, help="how many drivers to print")
+    args = parser.parse_args(argv)
+
+    store = RiskStore(half_life_days=args.half_life_days)
+    if args.backfill:
+        started = time.perf_counter()
+        count = backfill(store)
+        print(f"Backfilled {count} drivers in {time.perf_counter() - started:.1f}s")
+    for rank, row in enumerate(store.scores()[:args.top], 1):
+        print(f"{rank:>3}. {row['driver']:<20} {row['score']:8.2f}  {row['counts']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
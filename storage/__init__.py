@@ -0,0 +1,44 @@
+"""
+Storage backends behind db.py.
+
+Every backend has the same methods, which db.py's functions call:
+
+    get_user(username) / create_user(user) / update_user(username, update)
+    find_users(**equals)                    fields equal to values; None also matches a missing field
+    log_rides(events)                       insert, leaving the given dicts untouched
+    find_rides(drivers=None, after_id=None, limit=0, newest_first=False)
+    rewind(ride_id, seconds)                a watermark to re-read from, for rides logged late with lower ids
+    log_trip(trip) -> str id / update_trip(trip_id, set=None, unset=()) / find_trips(drivers, active=None)
+    close()
+
+Returned documents carry an '_id'. Ride ids only need to grow with insertion
+order, since callers just hand them back as a watermark. MongoDB's ObjectIds
+are made by each writer's client, so a ride from another machine or process
+can get an id below one a poller has already seen; rewind() lets pollers
+re-read a window before their watermark (the other backends number rides
+themselves and return the watermark unchanged).
+
+DMS_STORAGE picks the backend:
+
+    mongo            MongoDB at DMS_MONGO_URI (the default)
+    sqlite[:<path>]  an embedded SQLite file (default dms.sqlite3) in WAL mode
+    memory           process memory, for tests, benchmarks and demos
+
+python -m storage.conformance checks a backend against the shared behaviour.
+"""
+SQLITE_DEFAULT_PATH = "dms.sqlite3"
+
+
+def make_store(spec="mongo"):
+    """Backend for a DMS_STORAGE value."""
+    kind, _, arg = spec.partition(":")
+    if kind == "mongo":
+        from storage.mongo import MongoStore
+        return MongoStore()
+    if kind == "sqlite":
+        from storage.sqlite import SQLiteStore
+        return SQLiteStore(arg or SQLITE_DEFAULT_PATH)
+    if kind == "memory":
+        from storage.memory import MemoryStore
+        return MemoryStore()
+    raise ValueError(f"Unknown storage backend {spec!r}; expected mongo, sqlite[:<path>] or memory")
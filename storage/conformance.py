@@ -0,0 +1,218 @@
+"""
+Behaviour every storage backend has to share, checked against fresh, empty
+stores. MongoDB runs against a throwaway database and is skipped when no
+server answers.
+
+    python -m storage.conformance                   # memory and sqlite
+    python -m storage.conformance memory sqlite mongo
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import traceback
+
+from storage import make_store
+
+CHECKS = []
+
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+
+def expect_equal(actual, expected, what):
+    if actual != expected:
+        raise AssertionError(f"{what}: expected {expected!r}, got {actual!r}")
+
+
+def _without_id(documents):
+    return [{k: v for k, v in d.items() if k != '_id'} for d in documents]
+
+
+def _ride(driver, i, **fields):
+    ride = {'timestamp': f'2024-01-01 08:{i // 60 % 60:02d}:{i % 60:02d}', 'event_type': 'Yawning',
+            'driver': driver, 'trip_id': 'trip-1', 'details': 'Mouth distance exceeded threshold'}
+    ride.update(fields)
+    return ride
+
+
+@check
+def users_round_trip(store):
+    store.create_user({'username': 'alice', 'role': 'driver', 'fleet_manager': None, 'email': 'a@x'})
+    user = store.get_user('alice')
+    expect_equal(_without_id([user]), [{'username': 'alice', 'role': 'driver', 'fleet_manager': None, 'email': 'a@x'}], "user")
+    expect_equal('_id' in user, True, "user has an _id")
+    expect_equal(store.get_user('nobody'), None, "missing user")
+    store.update_user('alice', {'email': 'b@x', 'phone': '1'})
+    expect_equal({k: store.get_user('alice')[k] for k in ('email', 'phone', 'role')},
+                 {'email': 'b@x', 'phone': '1', 'role': 'driver'}, "updated user")
+
+
+@check
+def users_found_by_fields(store):
+    store.create_user({'username': 'm', 'role': 'manager'})
+    store.create_user({'username': 'a', 'role': 'driver', 'fleet_manager': None})
+    store.create_user({'username': 'b', 'role': 'driver'})
+    store.create_user({'username': 'c', 'role': 'driver', 'fleet_manager': 'm'})
+    names = lambda users: sorted(u['username'] for u in users)
+    expect_equal(names(store.find_users(role='driver')), ['a', 'b', 'c'], "drivers")
+    expect_equal(names(store.find_users(role='manager')), ['m'], "managers")
+    # None matches a missing field as well as an explicit null
+    expect_equal(names(store.find_users(role='driver', fleet_manager=None)), ['a', 'b'], "unassigned drivers")
+    store.update_user('a', {'fleet_manager': 'm'})
+    expect_equal(names(store.find_users(role='driver', fleet_manager='m')), ['a', 'c'], "a manager's drivers")
+
+
+@check
+def rides_round_trip(store):
+    rides = [_ride('alice', 0, ear_value=0.153), _ride('alice', 1, details='Mobile phone detected in frame',
+                                                       event_type='Phone Usage', evidence='clips/1.avi'),
+             _ride('alice', 2, duration=1.25, frames=12, end_time='2024-01-01 08:00:04')]
+    given = [dict(r) for r in rides]
+    store.log_rides(rides)
+    expect_equal(rides, given, "logged dicts are left untouched")
+    found = store.find_rides(['alice'])
+    expect_equal(_without_id(found), given, "rides")
+    expect_equal(len({r['_id'] for r in found}), 3, "distinct ride ids")
+
+
+@check
+def rides_filtered_by_driver(store):
+    store.log_rides([_ride(driver, i) for i in range(5) for driver in ('a', 'b', 'c')])
+    expect_equal([r['driver'] for r in store.find_rides(['b'])], ['b'] * 5, "one driver")
+    expect_equal(len(store.find_rides(['a', 'c'])), 10, "two drivers")
+    expect_equal(store.find_rides([]), [], "no drivers")
+    expect_equal(store.find_rides(['nobody']), [], "unknown driver")
+    expect_equal(len(store.find_rides()), 15, "all rides")
+
+
+@check
+def rides_after_watermark(store):
+    for i in range(10):
+        store.log_rides([_ride('a' if i % 2 else 'b', i)])
+    every = store.find_rides()
+    expect_equal([r['timestamp'] for r in every], [_ride('', i)['timestamp'] for i in range(10)], "insertion order")
+    mark = every[3]['_id']
+    expect_equal(_without_id(store.find_rides(after_id=mark)), _without_id(every[4:]), "after a watermark")
+    expect_equal(_without_id(store.find_rides(['a'], after_id=mark)), _without_id(every[5::2]), "a driver after a watermark")
+    expect_equal(_without_id(store.find_rides(after_id=mark, limit=2)), _without_id(every[4:6]), "limit")
+    expect_equal(store.find_rides(after_id=every[-1]['_id']), [], "nothing newer")
+    expect_equal(_without_id(store.find_rides(limit=3, newest_first=True)), _without_id(every[:-4:-1]), "newest first")
+
+
+@check
+def rides_after_rewound_watermark(store):
+    store.log_rides([_ride('a', i) for i in range(5)])
+    every = store.find_rides()
+    # Rewinding may re-read older rides, but never skips a newer one
+    reread = [r['_id'] for r in store.find_rides(after_id=store.rewind(every[3]['_id'], 30))]
+    expect_equal(reread[-1:], [every[4]['_id']], "rides after a rewound watermark")
+
+
+@check
+def trips_lifecycle(store):
+    first = store.log_trip({'driver': 'alice', 'start_point': 'Depot', 'destination': 'Port', 'active': True})
+    store.log_trip({'driver': 'bob', 'start_point': 'Depot', 'destination': 'Mill', 'active': True})
+    expect_equal(isinstance(first, str), True, "trip ids are strings")
+    trips = store.find_trips(['alice'])
+    expect_equal([str(t['_id']) for t in trips], [first], "a driver's trips")
+    expect_equal(trips[0]['destination'], 'Port', "trip fields")
+    expect_equal(sorted(t['driver'] for t in store.find_trips(['alice', 'bob'], active=True)), ['alice', 'bob'], "active trips")
+    store.update_trip(first, set={'end_time': '2024-01-01 10:00:00'}, unset=('active',))
+    expect_equal([t['driver'] for t in store.find_trips(['alice', 'bob'], active=True)], ['bob'], "ended trip is inactive")
+    ended = store.find_trips(['alice'])[0]
+    expect_equal((ended['end_time'], 'active' in ended), ('2024-01-01 10:00:00', False), "ended trip")
+    expect_equal(store.find_trips([]), [], "no drivers")
+
+
+@check
+def concurrent_writers(store):
+    def write(n):
+        for i in range(50):
+            store.log_rides([_ride(f'driver-{n}', i)])
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    rides = store.find_rides()
+    expect_equal(len(rides), 200, "rides from four threads")
+    expect_equal(len({r['_id'] for r in rides}), 200, "distinct ids")
+
+
+def fresh_store(kind, workdir):
+    """An empty store of this kind, and a function that disposes of it; raises LookupError if unavailable."""
+    if kind == 'memory':
+        store = make_store('memory')
+        return store, store.close
+    if kind == 'sqlite':
+        fd, path = tempfile.mkstemp(suffix='.sqlite3', dir=workdir)
+        os.close(fd)
+        store = make_store(f'sqlite:{path}')
+        return store, store.close
+    if kind == 'mongo':
+        from pymongo.errors import PyMongoError
+        from storage.mongo import MONGO_URI, MongoStore
+        store = MongoStore(MONGO_URI, 'IDP_conformance', serverSelectionTimeoutMS=1000)
+        try:
+            store.client.admin.command('ping')
+        except PyMongoError:
+            store.close()
+            raise LookupError(f"no MongoDB at {MONGO_URI}")
+        store.client.drop_database(store.db_name)
+
+        def dispose():
+            store.client.drop_database(store.db_name)
+            store.close()
+        return store, dispose
+    raise ValueError(f"Unknown backend {kind!r}")
+
+
+def run(kind, verbose=False):
+    """Run every check on fresh stores of one kind; returns (passed, failed), or None when skipped."""
+    passed = failed = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        for fn in CHECKS:
+            try:
+                store, dispose = fresh_store(kind, workdir)
+            except LookupError as e:
+                print(f"{kind:<7} skipped: {e}")
+                return None
+            try:
+                fn(store)
+                passed += 1
+                if verbose:
+                    print(f"{kind:<7} ok    {fn.__name__}")
+            except Exception:
+                failed += 1
+                print(f"{kind:<7} FAIL  {fn.__name__}")
+                traceback.print_exc()
+            finally:
+                dispose()
+    return passed, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("backends", nargs="*", metavar="backend", help="memory, sqlite or mongo (default: memory sqlite)")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    args.backends = args.backends or ["memory", "sqlite"]
+    for kind in args.backends:
+        if kind not in ("memory", "sqlite", "mongo"):
+            parser.error(f"unknown backend {kind!r}")
+
+    failures = 0
+    for kind in args.backends:
+        result = run(kind, args.verbose)
+        if result:
+            print(f"{kind:<7} {result[0]} passed, {result[1]} failed")
+            failures += result[1]
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
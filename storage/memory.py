@@ -0,0 +1,97 @@
+"""In-process backend: plain lists and dicts behind a lock. Nothing outlives the process."""
+import copy
+import itertools
+import threading
+from bisect import bisect_right
+
+
+def _matches(document, equals):
+    return all(document.get(field) == value for field, value in equals.items())
+
+
+class MemoryStore:
+    kind = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.users = {}
+        self.rides = []  # in insertion order, so ids are sorted
+        self.rides_by_driver = {}
+        self.trips = {}
+
+    # --- USERS ---
+    def get_user(self, username):
+        with self._lock:
+            user = self.users.get(username)
+            return copy.deepcopy(user) if user is not None else None
+
+    def create_user(self, user):
+        with self._lock:
+            self.users[user["username"]] = dict(copy.deepcopy(user), _id=next(self._ids))
+
+    def update_user(self, username, update):
+        with self._lock:
+            if username in self.users:
+                self.users[username].update(copy.deepcopy(update))
+
+    def find_users(self, **equals):
+        with self._lock:
+            return [copy.deepcopy(u) for u in self.users.values() if _matches(u, equals)]
+
+    # --- RIDES ---
+    def log_rides(self, events):
+        with self._lock:
+            for event in events:
+                ride = dict(event, _id=next(self._ids))
+                self.rides.append(ride)
+                self.rides_by_driver.setdefault(ride.get("driver"), []).append(ride)
+
+    def find_rides(self, drivers=None, after_id=None, limit=0, newest_first=False):
+        with self._lock:
+            if drivers is None:
+                rides = self._after(self.rides, after_id)
+            else:
+                # Each driver's list is in id order too, so sorting only merges presorted runs
+                rides = sorted(itertools.chain.from_iterable(
+                    self._after(self.rides_by_driver.get(d, []), after_id) for d in set(drivers)), key=lambda r: r["_id"])
+            if newest_first:
+                rides = (rides[-limit:] if limit else rides)[::-1]
+            elif limit:
+                rides = rides[:limit]
+            return [dict(r) for r in rides]
+
+    @staticmethod
+    def _after(rides, after_id):
+        if after_id is None:
+            return rides
+        return rides[bisect_right(rides, after_id, key=lambda r: r["_id"]):]
+
+    def rewind(self, ride_id, seconds):
+        # Ids are handed out by this store in commit order, so nothing can appear below a watermark
+        return ride_id
+
+    # --- TRIPS ---
+    def log_trip(self, trip):
+        with self._lock:
+            trip_id = next(self._ids)
+            self.trips[trip_id] = dict(copy.deepcopy(trip), _id=trip_id)
+            return str(trip_id)
+
+    def update_trip(self, trip_id, set=None, unset=()):
+        with self._lock:
+            trip = self.trips.get(int(trip_id))
+            if trip is None:
+                return
+            trip.update(copy.deepcopy(set or {}))
+            for field in unset:
+                trip.pop(field, None)
+
+    def find_trips(self, drivers, active=None):
+        drivers = set(drivers)
+        with self._lock:
+            return [copy.deepcopy(t) for t in self.trips.values()
+                    if t.get("driver") in drivers and (not active or t.get("active") is True)]
+
+    def close(self):
+        pass
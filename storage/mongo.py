@@ -0,0 +1,99 @@
+"""MongoDB backend: rides in the compact format of event_schema.py."""
+import os
+from datetime import timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient
+
+from event_schema import DriverCodes, decode_many, driver_filter, encode
+
+# Use the provided MongoDB URI (overridable for benchmarks and other deployments)
+MONGO_URI = os.environ.get("DMS_MONGO_URI", "mongodb://localhost:27017/IDP")
+DB_NAME = os.environ.get("DMS_DB_NAME", "IDP")
+
+
+class MongoStore:
+    kind = "mongo"
+
+    def __init__(self, uri=MONGO_URI, db_name=DB_NAME, **client_options):
+        self.uri = uri
+        self.db_name = db_name
+        # MongoClient connects lazily, so nothing here needs a server yet
+        self.client = MongoClient(uri, **client_options)
+        self.db = self.client[db_name]
+        self.users_col = self.db["users"]
+        self.rides_col = self.db["rides"]
+        self.trips_col = self.db["trips"]
+        # Drivers appear in compact rides as integer codes from this collection
+        self.driver_codes = DriverCodes(self.db["driver_codes"])
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        """Create the live-view indexes once per process (a no-op on the server if they exist)."""
+        if self._indexes_ready:
+            return
+        self.trips_col.create_index([("active", ASCENDING), ("driver", ASCENDING)], name="active_trips",
+                                    partialFilterExpression={"active": True})
+        self.rides_col.create_index([("u", ASCENDING), ("_id", ASCENDING)], name="driver_code_id")
+        # Rides from before the compact format; partial, so it stays small once they're migrated
+        self.rides_col.create_index([("driver", ASCENDING), ("_id", ASCENDING)], name="driver_legacy_id",
+                                    partialFilterExpression={"driver": {"$exists": True}})
+        self._indexes_ready = True
+
+    # --- USERS ---
+    def get_user(self, username):
+        return self.users_col.find_one({"username": username})
+
+    def create_user(self, user):
+        self.users_col.insert_one(dict(user))
+
+    def update_user(self, username, update):
+        self.users_col.update_one({"username": username}, {"$set": update})
+
+    def find_users(self, **equals):
+        return list(self.users_col.find(equals))
+
+    # --- RIDES ---
+    def log_rides(self, events):
+        documents = [encode(e, self.driver_codes) for e in events]
+        if len(documents) == 1:
+            self.rides_col.insert_one(documents[0])
+        elif documents:
+            self.rides_col.insert_many(documents, ordered=False)
+
+    def find_rides(self, drivers=None, after_id=None, limit=0, newest_first=False):
+        self.ensure_indexes()
+        query = {} if drivers is None else driver_filter(self.driver_codes, drivers)
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        cursor = self.rides_col.find(query).sort("_id", DESCENDING if newest_first else ASCENDING).limit(limit)
+        return decode_many(cursor, self.driver_codes)
+
+    def rewind(self, ride_id, seconds):
+        if not isinstance(ride_id, ObjectId):
+            return ride_id
+        # The smallest ObjectId a client could have made `seconds` before this one
+        return ObjectId.from_datetime(ride_id.generation_time - timedelta(seconds=seconds))
+
+    # --- TRIPS ---
+    def log_trip(self, trip):
+        return str(self.trips_col.insert_one(dict(trip)).inserted_id)
+
+    def update_trip(self, trip_id, set=None, unset=()):
+        update = {}
+        if set:
+            update["$set"] = set
+        if unset:
+            update["$unset"] = {field: "" for field in unset}
+        if update:
+            self.trips_col.update_one({"_id": ObjectId(trip_id)}, update)
+
+    def find_trips(self, drivers, active=None):
+        query = {"driver": {"$in": list(drivers)}}
+        if active:
+            self.ensure_indexes()
+            query["active"] = True
+        return list(self.trips_col.find(query))
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,194 @@
+"""
+Embedded SQLite backend for edge boxes and single-machine deployments.
+
+Documents are stored as JSON, with the fields that queries filter on copied
+into indexed columns. The database runs in WAL mode, so Streamlit sessions,
+the agent and the fleet board can read while another thread writes. Each
+thread gets its own connection.
+"""
+import json
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    role TEXT,
+    fleet_manager TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_role_manager ON users (role, fleet_manager);
+
+CREATE TABLE IF NOT EXISTS rides (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rides_driver_id ON rides (driver, id);
+
+CREATE TABLE IF NOT EXISTS trips (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver TEXT,
+    active INTEGER,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trips_driver ON trips (driver);
+CREATE INDEX IF NOT EXISTS trips_active ON trips (driver) WHERE active = 1;
+"""
+USER_COLUMNS = ('username', 'role', 'fleet_manager')
+_FIELD = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _default(value):
+    # NumPy scalars from the detectors
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _dumps(document):
+    return json.dumps({k: v for k, v in document.items() if k != '_id'}, default=_default)
+
+
+def _load(row_id, doc):
+    document = json.loads(doc)
+    document['_id'] = row_id
+    return document
+
+
+class SQLiteStore:
+    kind = "sqlite"
+
+    def __init__(self, path):
+        if path == ":memory:":
+            raise ValueError("Each thread would get its own empty database; use DMS_STORAGE=memory instead")
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.conn.executescript(SCHEMA)
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; writes open their own transactions in _write()
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # --- USERS ---
+    def get_user(self, username):
+        row = self.conn.execute("SELECT id, doc FROM users WHERE username = ?", (username,)).fetchone()
+        return _load(*row) if row else None
+
+    def create_user(self, user):
+        with self._write() as conn:
+            conn.execute("INSERT INTO users (username, role, fleet_manager, doc) VALUES (?, ?, ?, ?)",
+                         (*(user.get(c) for c in USER_COLUMNS), _dumps(user)))
+
+    def update_user(self, username, update):
+        with self._write() as conn:
+            row = conn.execute("SELECT id, doc FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return
+            user = _load(*row)
+            user.update(update)
+            conn.execute("UPDATE users SET username = ?, role = ?, fleet_manager = ?, doc = ? WHERE id = ?",
+                         (*(user.get(c) for c in USER_COLUMNS), _dumps(user), row[0]))
+
+    def find_users(self, **equals):
+        clauses, params = [], []
+        for field, value in equals.items():
+            if not _FIELD.match(field):
+                raise ValueError(f"Unsupported field name {field!r}")
+            column = field if field in USER_COLUMNS else f"json_extract(doc, '$.{field}')"
+            if value is None:
+                clauses.append(f"{column} IS NULL")
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [_load(*row) for row in self.conn.execute(f"SELECT id, doc FROM users{where} ORDER BY id", params)]
+
+    # --- RIDES ---
+    def log_rides(self, events):
+        if not events:
+            return
+        with self._write() as conn:
+            conn.executemany("INSERT INTO rides (driver, doc) VALUES (?, ?)",
+                             [(e.get('driver'), _dumps(e)) for e in events])
+
+    def find_rides(self, drivers=None, after_id=None, limit=0, newest_first=False):
+        clauses, params = [], []
+        if drivers is not None:
+            drivers = list(drivers)
+            if not drivers:
+                return []
+            clauses.append(f"driver IN ({', '.join('?' * len(drivers))})")
+            params.extend(drivers)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "DESC" if newest_first else "ASC"
+        sql = f"SELECT id, doc FROM rides{where} ORDER BY id {order}" + (" LIMIT ?" if limit else "")
+        return [_load(*row) for row in self.conn.execute(sql, params + ([limit] if limit else []))]
+
+    def rewind(self, ride_id, seconds):
+        # Ids are handed out by this store in commit order, so nothing can appear below a watermark
+        return ride_id
+
+    # --- TRIPS ---
+    def log_trip(self, trip):
+        with self._write() as conn:
+            cursor = conn.execute("INSERT INTO trips (driver, active, doc) VALUES (?, ?, ?)",
+                                  (trip.get('driver'), 1 if trip.get('active') is True else None, _dumps(trip)))
+            return str(cursor.lastrowid)
+
+    def update_trip(self, trip_id, set=None, unset=()):
+        with self._write() as conn:
+            row = conn.execute("SELECT id, doc FROM trips WHERE id = ?", (int(trip_id),)).fetchone()
+            if row is None:
+                return
+            trip = _load(*row)
+            trip.update(set or {})
+            for field in unset:
+                trip.pop(field, None)
+            conn.execute("UPDATE trips SET driver = ?, active = ?, doc = ? WHERE id = ?",
+                         (trip.get('driver'), 1 if trip.get('active') is True else None, _dumps(trip), row[0]))
+
+    def find_trips(self, drivers, active=None):
+        drivers = list(drivers)
+        if not drivers:
+            return []
+        sql = f"SELECT id, doc FROM trips WHERE driver IN ({', '.join('?' * len(drivers))})"
+        if active:
+            sql += " AND active = 1"
+        return [_load(*row) for row in self.conn.execute(sql + " ORDER BY id", drivers)]
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,162 @@
+"""
+Per-trip time series of EAR, mouth ratio, phone confidence and FPS.
+
+Samples are taken at a fixed rate and packed into one document per trip and
+minute in the 'telemetry' collection: the sample times as uint16 millisecond
+offsets into the minute and each signal as a float16 array, stored as
+binary. At 2 Hz a trip-hour is 60 documents of about 1.3 KB. Missing values
+(no face, no phone detector) are NaN. Full batches are written from a
+background thread, so a slow or unreachable database never holds up a frame.
+
+    {'trip_id': ..., 'driver': ..., 'minute': <epoch seconds>, 'n': 120,
+     't': <uint16 bytes>, 'ear': <float16 bytes>, 'mouth_ratio': ..., 'phone_confidence': ..., 'fps': ...}
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from pymongo.errors import BulkWriteError
+
+FIELDS = ('ear', 'mouth_ratio', 'phone_confidence', 'fps')
+MAX_PENDING_BUCKETS = 240  # four hours of minutes held back while the database is unreachable
+DUPLICATE_KEY = 11000
+
+
+def _collection(collection):
+    if collection is not None:
+        return collection
+    from db import db
+    return db["telemetry"]
+
+
+def _value(value):
+    return math.nan if value is None else float(value)
+
+
+class TelemetryRecorder:
+    """Samples FrameResults at `rate` Hz into minute buckets, inserted flush_buckets at a time."""
+
+    def __init__(self, driver, trip_id, rate=2.0, collection=None, flush_buckets=5):
+        self.driver = driver
+        self.trip_id = trip_id
+        self.interval = 1.0 / rate
+        self.collection = _collection(collection)
+        self.flush_buckets = flush_buckets
+        self.minute = None
+        self.samples = []
+        self.pending = []
+        self._next = 0.0
+        self._indexed = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def add(self, result, fps, now=None):
+        """Offer one frame's result; kept only when the next sample is due."""
+        now = time.time() if now is None else now
+        if now < self._next:
+            return
+        self._next = now + self.interval
+        minute = int(now // 60) * 60
+        if minute != self.minute:
+            self._seal()
+            self.minute = minute
+        self.samples.append((round((now - minute) * 1000), _value(result.ear) if result.has_face else math.nan,
+                             _value(result.mouth_ratio) if result.has_face else math.nan,
+                             _value(result.phone_confidence), _value(fps)))
+
+    def _seal(self):
+        if not self.samples:
+            return
+        columns = list(zip(*self.samples))
+        document = {'trip_id': self.trip_id, 'driver': self.driver, 'minute': self.minute, 'n': len(self.samples),
+                    't': np.array(columns[0], dtype='<u2').tobytes()}
+        for name, values in zip(FIELDS, columns[1:]):
+            document[name] = np.array(values, dtype='<f2').tobytes()
+        self.samples = []
+        with self._lock:
+            self.pending.append(document)
+            del self.pending[:-MAX_PENDING_BUCKETS]
+            if len(self.pending) >= self.flush_buckets:
+                self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                return
+            self.flush()
+
+    def flush(self):
+        """Insert the sealed buckets; on failure they are kept for the next flush."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return True
+            failed = batch
+            try:
+                if not self._indexed:
+                    self.collection.create_index([('trip_id', 1), ('minute', 1)])
+                    self._indexed = True
+                self.collection.insert_many(batch, ordered=False)
+                failed = []
+            except BulkWriteError as e:
+                # insert_many gave every bucket an _id; the ones that went in, or went in on an
+                # earlier attempt (duplicate key), must not be sent again
+                indices = {err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != DUPLICATE_KEY}
+                failed = [doc for i, doc in enumerate(batch) if i in indices]
+                if failed:
+                    print(f"Telemetry write of {len(failed)} buckets failed, will retry: {e}")
+            except Exception as e:
+                print(f"Telemetry write of {len(batch)} buckets failed, will retry: {e}")
+            if failed:
+                with self._lock:
+                    self.pending[:0] = failed
+                    del self.pending[:-MAX_PENDING_BUCKETS]
+            return not failed
+
+    def close(self):
+        """Seal the current minute, stop the writer thread and write everything still pending."""
+        self._seal()
+        self.minute = None
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        return self.flush()
+
+
+def read_telemetry(trip_id, start=None, end=None, collection=None):
+    """
+    A trip's samples between start and end (epoch seconds, inclusive) as a
+    dict of NumPy arrays: 'time' (float64 epoch seconds) and each field as
+    float32, all of the same length.
+    """
+    query = {'trip_id': trip_id}
+    if start is not None or end is not None:
+        query['minute'] = {}
+        if start is not None:
+            query['minute']['$gte'] = int(start // 60) * 60
+        if end is not None:
+            query['minute']['$lte'] = end
+    times, columns = [], {name: [] for name in FIELDS}
+    for document in _collection(collection).find(query, {'_id': 0}).sort('minute', 1):
+        times.append(document['minute'] + np.frombuffer(document['t'], dtype='<u2') / 1000.0)
+        for name in FIELDS:
+            columns[name].append(np.frombuffer(document[name], dtype='<f2'))
+    series = {'time': np.concatenate(times) if times else np.empty(0)}
+    for name in FIELDS:
+        series[name] = np.concatenate(columns[name]).astype(np.float32) if times else np.empty(0, dtype=np.float32)
+    if start is not None or end is not None:
+        keep = np.ones(len(series['time']), dtype=bool)
+        if start is not None:
+            keep &= series['time'] >= start
+        if end is not None:
+            keep &= series['time'] <= end
+        series = {name: values[keep] for name, values in series.items()}
+    return series
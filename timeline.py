@@ -0,0 +1,74 @@
+"""
+Trip timeline charts: EAR and mouth ratio from telemetry with the trip's
+events as markers. Everything is downsampled here, so the browser gets a
+few thousand points however long the trip was.
+"""
+import time
+
+import pandas as pd
+
+from db import uses_mongo
+from downsample import downsample
+from telemetry import read_telemetry
+
+SIGNALS = {'ear': 'EAR', 'mouth_ratio': 'Mouth ratio'}
+EVENT_COLORS = {'Drowsiness': '#ef4444', 'Yawning': '#f59e0b', 'Phone Usage': '#8b5cf6'}
+
+
+def _local_times(epoch_seconds):
+    # Ride timestamps are local wall-clock strings, so telemetry is shown in local time too
+    offset = time.localtime(float(epoch_seconds[0])).tm_gmtoff if len(epoch_seconds) else 0
+    return pd.to_datetime(epoch_seconds + offset, unit='s')
+
+
+def signal_frame(series, points=2000, method="minmax"):
+    """Long-form (time, signal, value) frame with each signal downsampled to about `points`."""
+    frames = []
+    for field, label in SIGNALS.items():
+        x, y = downsample(series['time'], series[field], points, method)
+        frames.append(pd.DataFrame({'time': _local_times(x), 'signal': label, 'value': y}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def event_frame(events, start=None, end=None, points=2000):
+    """
+    One row per event type and time slot for the markers. Per-frame ride
+    documents are collapsed to at most `points` slots across the trip.
+    """
+    if not events:
+        return pd.DataFrame(columns=['time', 'event_type'])
+    frame = pd.DataFrame({'time': pd.to_datetime([e['timestamp'] for e in events], format='%Y-%m-%d %H:%M:%S'),
+                          'event_type': [e['event_type'] for e in events]})
+    start = frame['time'].min() if start is None else start
+    end = frame['time'].max() if end is None else end
+    slot = max((end - start) / points, pd.Timedelta(seconds=1))
+    frame['time'] = start + ((frame['time'] - start) // slot) * slot
+    return frame.drop_duplicates(ignore_index=True)
+
+
+def trip_timeline(trip_id, events, points=2000, method="minmax"):
+    """Altair chart for a trip, or None when it has neither telemetry nor events."""
+    import altair as alt
+    # Telemetry is only recorded with the MongoDB storage backend
+    series = read_telemetry(trip_id) if uses_mongo() else {'time': []}
+    if not len(series['time']) and not events:
+        return None
+    layers = []
+    start = end = None
+    if len(series['time']):
+        signals = signal_frame(series, points, method)
+        start, end = signals['time'].min(), signals['time'].max()
+        layers.append(alt.Chart(signals).mark_line(strokeWidth=1).encode(
+            x=alt.X('time:T', title=None),
+            y=alt.Y('value:Q', title=None),
+            color=alt.Color('signal:N', title=None),
+        ))
+    markers = event_frame(events, start, end, points)
+    if len(markers):
+        layers.append(alt.Chart(markers).mark_rule(opacity=0.5).encode(
+            x='time:T',
+            color=alt.Color('event_type:N', title='Event',
+                            scale=alt.Scale(domain=list(EVENT_COLORS), range=list(EVENT_COLORS.values()))),
+        ))
+    return alt.layer(*layers).resolve_scale(color='independent').properties(height=260)
+
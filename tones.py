@@ -0,0 +1,99 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+FADE_SECONDS = 0.1
+
+# Severity scales loudness and how fast the pattern repeats. Level 0 is the
+# original alert.wav siren (half-second alternation at half volume).
+SEVERITY_LEVELS = {
+    0: {'volume': 0.5, 'rate': 1.0},
+    1: {'volume': 0.3, 'rate': 1.0},
+    2: {'volume': 0.5, 'rate': 1.5},
+    3: {'volume': 0.7, 'rate': 2.0},
+}
+
+# Pattern and severity used for each alert type.
+ALERT_TONES = {
+    'drowsiness': ('siren', 3),
+    'yawning': ('beep', 1),
+    'phone': ('sweep', 2),
+}
+
+
+def _siren(t, rate, sample_rate):
+    # Alternate 800 Hz / 1200 Hz every half period, keeping the phase continuous
+    freq = np.where((t * 2 * rate).astype(np.int64) % 2 == 0, 800.0, 1200.0)
+    return np.sin(2 * np.pi * np.cumsum(freq) / sample_rate)
+
+
+def _beep(t, rate, sample_rate):
+    # 1 kHz tone gated on for the first 60% of each cycle
+    gate = (t * 2 * rate) % 1.0 < 0.6
+    return np.sin(2 * np.pi * 1000.0 * t) * gate
+
+
+def _sweep(t, rate, sample_rate):
+    # Rising 600 -> 1400 Hz sweep, restarted every cycle
+    freq = 600.0 + 800.0 * ((t * rate) % 1.0)
+    return np.sin(2 * np.pi * np.cumsum(freq) / sample_rate)
+
+
+PATTERNS = {
+    'siren': _siren,
+    'beep': _beep,
+    'sweep': _sweep,
+}
+
+
+def _render(pattern: str, severity: int, duration: float, sample_rate: int) -> np.ndarray:
+    if pattern not in PATTERNS:
+        raise ValueError(f"Unknown tone pattern: {pattern}")
+    level = SEVERITY_LEVELS[severity]
+    n = int(sample_rate * duration)
+    t = np.arange(n, dtype=np.float64) / sample_rate
+    wave_data = PATTERNS[pattern](t, level['rate'], sample_rate)
+
+    # Apply envelope to prevent clicking
+    fade = min(int(FADE_SECONDS * sample_rate), n // 2)
+    if fade:
+        ramp = np.linspace(0.0, 1.0, fade)
+        wave_data[:fade] *= ramp
+        wave_data[-fade:] *= ramp[::-1]
+
+    return (wave_data * (32767 * level['volume'])).astype(np.int16)
+
+
+def _cache_path(cache_dir: str, key: tuple) -> str:
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"tone_{digest}.npy")
+
+
+@lru_cache(maxsize=32)
+def synthesize(pattern: str = 'siren', severity: int = 2, duration: float = 3.0,
+               sample_rate: int = SAMPLE_RATE, cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Return a mono int16 PCM buffer for the given tone parameters.
+    Results are memoised in memory and, when cache_dir is set, on disk.
+    """
+    cache_dir = cache_dir or os.environ.get("DMS_TONE_CACHE")
+    key = (pattern, severity, float(duration), sample_rate)
+    path = _cache_path(cache_dir, key) if cache_dir else None
+    if path and os.path.exists(path):
+        pcm = np.load(path)
+    else:
+        pcm = _render(*key)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, pcm)
+    pcm.setflags(write=False)
+    return pcm
+
+
+def alert_tone(alert_type: str, duration: float = 3.0, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    pattern, severity = ALERT_TONES.get(alert_type, ('siren', 2))
+    return synthesize(pattern, severity, duration, sample_rate)